@@ -1,17 +1,58 @@
-from .data_types import DataField, HPLCSetup, Sample
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+from .data_types import (
+    DataField,
+    ExperimentJob,
+    HPLCSetup,
+    JobOutcome,
+    MethodRecord,
+    MethodResult,
+    Sample,
+    StatusChange,
+    SystemStatus,
+    TagEdit,
+)
 from .empower_api_core import EmpowerConnection
+from .empower_api_core_async import AsyncEmpowerConnection
 from .empower_handler import EmpowerHandler
+from .empower_handler_async import AsyncEmpowerHandler
 from .empower_instrument_method import EmpowerInstrumentMethod
 from .empower_module_method import EmpowerModuleMethod
+from .experiment_run import ExperimentRun
+from .metadata_cache import MetadataCache
+from .method_catalogue import MethodCatalogue
+from .rate_limiter import RateLimiter, configure_rate_limit
+from .retry_policy import RetryPolicy
+from .status_watcher import StatusPoller, StatusWatcher
+from .token_cache import TokenCache
 
 __version__ = "2.5.0"
 
 __all__ = [
+    "AsyncEmpowerConnection",
+    "AsyncEmpowerHandler",
+    "CircuitBreaker",
+    "CircuitOpenError",
     "DataField",
     "EmpowerConnection",
     "EmpowerHandler",
     "EmpowerInstrumentMethod",
     "EmpowerModuleMethod",
+    "ExperimentJob",
+    "ExperimentRun",
     "HPLCSetup",
+    "JobOutcome",
+    "MetadataCache",
+    "MethodCatalogue",
+    "MethodRecord",
+    "MethodResult",
+    "RateLimiter",
+    "RetryPolicy",
     "Sample",
+    "StatusChange",
+    "StatusPoller",
+    "StatusWatcher",
+    "SystemStatus",
+    "TagEdit",
+    "TokenCache",
+    "configure_rate_limit",
 ]
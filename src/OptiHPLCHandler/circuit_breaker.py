@@ -0,0 +1,211 @@
+import logging
+import threading
+import time
+from typing import Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """
+    Raised instead of making a request, when the endpoint family has failed too often.
+
+    :ivar family: The endpoint family that is failing.
+    :ivar retry_after: Seconds until a request to the endpoint family is tried again.
+    """
+
+    def __init__(self, family: str, retry_after: float) -> None:
+        self.family = family
+        self.retry_after = retry_after
+        super().__init__(
+            f"Requests to {family} are failing, not trying again for "
+            f"{retry_after:.0f} seconds"
+        )
+
+
+class _Circuit:
+    """The state of the circuit of one endpoint family."""
+
+    def __init__(self) -> None:
+        self.state = CLOSED
+        self.failure_count = 0
+        self.changed = time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the requests to Empower, so that requests to a part of Empower
+    that is down fail at once, instead of waiting for their timeout.
+
+    The endpoints are grouped in families by the longest matching prefix in `families`,
+    e.g. `acquisition/chromatographic-system-status` is in the family `acquisition`.
+    Requests for a node to a family in `node_families` are also grouped by the node,
+    e.g. `acquisition:node1`, so a node that is down doesn't stop the requests to other
+    nodes.
+    Each family has its own circuit:
+
+    - The circuit is closed at first, and requests are made as normal.
+    - After `failure_threshold` failed requests in a row, i.e. requests that timed out,
+      failed to connect or got a status code of 500 or more after all retries, the
+      circuit opens. Requests then fail at once with a `CircuitOpenError`.
+    - After `reset_timeout` seconds, the circuit is half-open, and one request is made
+      as a probe. If it succeeds, the circuit closes, otherwise it opens again.
+
+    :ivar failure_threshold: The number of failures in a row that opens the circuit.
+    :ivar reset_timeout: Seconds the circuit stays open before a probe is made.
+    :ivar families: The endpoint prefixes the endpoints are grouped by. Endpoints that
+        don't match any prefix are grouped by their first path segment.
+    :ivar node_families: The families that are also grouped by node.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30,
+        families: Iterable[str] = (
+            "acquisition",
+            "authentication",
+            "project/methods",
+            "project",
+        ),
+        node_families: Iterable[str] = ("acquisition",),
+    ) -> None:
+        """
+        Initialize the CircuitBreaker.
+
+        :param failure_threshold: The number of failures in a row that opens the
+            circuit of an endpoint family.
+        :param reset_timeout: Seconds the circuit stays open before a probe is made.
+        :param families: The endpoint prefixes the endpoints are grouped by, e.g.
+            `"project/methods"`. The longest matching prefix is used. Endpoints that
+            don't match any prefix are grouped by their first path segment.
+        :param node_families: The families that are also grouped by the node of the
+            request, given by the `nodeName` in the query or the body.
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.families = sorted(
+            (family.strip("/") for family in families), key=len, reverse=True
+        )
+        self.node_families = {family.strip("/") for family in node_families}
+        self._circuits: Dict[str, _Circuit] = {}
+        self._lock = threading.Lock()
+
+    def family(self, endpoint: str, node: Optional[str] = None) -> str:
+        """
+        The endpoint family of an endpoint.
+
+        :param endpoint: The endpoint, without the address.
+        :param node: The node of the request, if it is not in the query of the endpoint,
+            e.g. because it is in the body.
+        """
+        path, query = urlsplit(endpoint.lstrip("/"))[2:4]
+        family = next(
+            (
+                family
+                for family in self.families
+                if path == family or path.startswith(family + "/")
+            ),
+            path.split("/")[0],
+        )
+        if family in self.node_families:
+            node = node or parse_qs(query).get("nodeName", [None])[0]
+            if node:
+                return f"{family}:{node}"
+        return family
+
+    def state(self, endpoint: str, node: Optional[str] = None) -> str:
+        """
+        The state of the circuit of an endpoint, `"closed"`, `"open"` or `"half-open"`.
+
+        :param endpoint: The endpoint, or its family.
+        :param node: The node of the request, see `family`.
+        """
+        with self._lock:
+            circuit = self._circuits.get(self.family(endpoint, node))
+            return CLOSED if circuit is None else circuit.state
+
+    def before_request(self, endpoint: str, node: Optional[str] = None) -> None:
+        """
+        Check that a request to the endpoint may be made.
+
+        :param endpoint: The endpoint, without the address.
+        :param node: The node of the request, see `family`.
+
+        :raises CircuitOpenError: If the circuit of the endpoint family is open, or a
+            probe is already being made.
+        """
+        family = self.family(endpoint, node)
+        with self._lock:
+            circuit = self._circuits.get(family)
+            if circuit is None or circuit.state == CLOSED:
+                return
+            waited = time.monotonic() - circuit.changed
+            if waited < self.reset_timeout:
+                raise CircuitOpenError(family, self.reset_timeout - waited)
+            # The circuit has been open long enough, or the probe has not reported
+            # back in time, so making a new probe.
+            logger.info("Probing %s after %.0f seconds", family, waited)
+            circuit.state = HALF_OPEN
+            circuit.changed = time.monotonic()
+
+    def record_success(self, endpoint: str, node: Optional[str] = None) -> None:
+        """
+        Record that a request to the endpoint succeeded, closing its circuit.
+
+        :param endpoint: The endpoint, without the address.
+        :param node: The node of the request, see `family`.
+        """
+        family = self.family(endpoint, node)
+        with self._lock:
+            circuit = self._circuits.pop(family, None)
+        if circuit is not None and circuit.state != CLOSED:
+            logger.info("Requests to %s are succeeding again", family)
+
+    def record_failure(self, endpoint: str, node: Optional[str] = None) -> None:
+        """
+        Record that a request to the endpoint failed, after any retries, opening its
+        circuit if it has failed too often.
+
+        :param endpoint: The endpoint, without the address.
+        :param node: The node of the request, see `family`.
+        """
+        family = self.family(endpoint, node)
+        with self._lock:
+            circuit = self._circuits.setdefault(family, _Circuit())
+            circuit.failure_count += 1
+            if circuit.state == HALF_OPEN or (
+                circuit.state == CLOSED
+                and circuit.failure_count >= self.failure_threshold
+            ):
+                circuit.state = OPEN
+                circuit.changed = time.monotonic()
+                logger.warning(
+                    "Requests to %s failed %s times in a row, failing fast for %s "
+                    "seconds",
+                    family,
+                    circuit.failure_count,
+                    self.reset_timeout,
+                )
+
+    def reset(self, endpoint: Optional[str] = None) -> None:
+        """
+        Close circuits.
+
+        :param endpoint: Close the circuit of this endpoint. If None, all circuits are
+            closed.
+        """
+        with self._lock:
+            if endpoint is None:
+                self._circuits.clear()
+            else:
+                self._circuits.pop(self.family(endpoint), None)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from enum import Enum
-from typing import Any, List, NamedTuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 
 class Eluent(NamedTuple):
@@ -70,6 +70,111 @@ class HplcResult(NamedTuple):
     """Reference to where the sdata can be found"""
 
 
+class SystemStatus(NamedTuple):
+    """Class for the status of one chromatographic system, or the error getting it"""
+
+    Node: str
+    """Name of the node the system is on"""
+    System: Optional[str]
+    """Name of the system. None if the systems of the node could not be listed"""
+    Status: Optional[Dict[str, str]]
+    """The status of the system, as returned by `GetStatus`. None if there was an
+    error"""
+    Error: Optional[Exception]
+    """The error getting the status. None if the status was retrieved"""
+    Latency: float
+    """Seconds it took to get the status or the error"""
+
+
+class StatusChange(NamedTuple):
+    """Class for a change of the status of a chromatographic system"""
+
+    Node: str
+    """Name of the node the system is on"""
+    System: str
+    """Name of the system"""
+    Time: datetime
+    """When the change was seen"""
+    Status: Dict[str, str]
+    """The whole status of the system after the change"""
+    Changes: Dict[str, Tuple[Optional[str], Optional[str]]]
+    """The old and new value of each changed entry of the status. The old value is None
+    for new entries, the new value is None for removed entries"""
+    Error: Optional[Exception] = None
+    """The error getting the status, if getting it failed. The status is then the last
+    known status"""
+
+
+class MethodRecord(NamedTuple):
+    """Class for a method in the list of methods of a project"""
+
+    Name: str
+    """Name of the method"""
+    Type: str
+    """Type of the method, e.g. `"MethodSetMethod"`"""
+    Date: Optional[str]
+    """When the method was last saved, as given by Empower. None if not given"""
+    Version: Optional[str]
+    """Version of the method, as given by Empower. None if not given"""
+    Fields: Dict[str, Any]
+    """All fields of the method in the list, by name"""
+
+
+class MethodResult(NamedTuple):
+    """Class for a method retrieved from Empower, or the error retrieving it"""
+
+    Name: str
+    """Name of the method"""
+    Method: Optional[Any]
+    """The method, e.g. an `EmpowerInstrumentMethod`. None if there was an error"""
+    Error: Optional[Exception]
+    """The error retrieving the method. None if the method was retrieved"""
+    Latency: float
+    """Seconds it took to retrieve the method or the error"""
+
+
+class ExperimentJob(NamedTuple):
+    """Class for a sample set to post and run on a chromatographic system"""
+
+    SampleSetName: str
+    """Name of the sample set method to create and run"""
+    SampleList: Any
+    """The samples of the sample set, as for `EmpowerHandler.PostExperiment`"""
+    Plates: Dict[str, str]
+    """The plate type of each plate position, as for `EmpowerHandler.PostExperiment`"""
+    Node: str
+    """Name of the node the system is on"""
+    System: str
+    """Name of the system to run the sample set on"""
+    AuditTrailMessage: Optional[str] = None
+    """Message to add to the audit trail of the sample set method"""
+
+
+class JobOutcome(NamedTuple):
+    """Class for the outcome of posting and running an `ExperimentJob`"""
+
+    Job: ExperimentJob
+    """The job"""
+    Run: Optional[Any]
+    """The `ExperimentRun` of the started sample set. None if there was an error"""
+    Error: Optional[Exception]
+    """The error posting or running the sample set. None if it was started"""
+    PostTime: float
+    """Seconds it took to post the sample set method"""
+    RunTime: Optional[float]
+    """Seconds it took to start the run. None if the sample set method could not be
+    posted"""
+
+
+class TagEdit(NamedTuple):
+    """Class for setting the value of a tag in the xml of a module method"""
+
+    Key: str
+    """Name of the tag"""
+    Value: str
+    """The new value of the tag"""
+
+
 class DataField(NamedTuple):
     """Class for data field"""
 
@@ -1,14 +1,51 @@
+import base64
 import getpass
+import json
 import logging
+import threading
+import time
 import warnings
-from typing import Optional, Tuple
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 import keyring
 import requests
+import requests.adapters
 from keyring.errors import NoKeyringError
 
+from .circuit_breaker import CircuitBreaker
+from .rate_limiter import RateLimiter, get_rate_limiter
+from .retry_policy import RetryPolicy, RetryStatistics
+from .token_cache import TokenCache
+
+try:
+    import orjson
+
+    json_loads = orjson.loads
+except ImportError:  # orjson is optional, it only makes decoding large bodies faster
+    json_loads = json.loads
+
 logger = logging.getLogger(__name__)
 
+SERVICE_LIST_TTL = 300
+"""Seconds the list of services of an Empower server is cached."""
+
+ChunkSource = Union[Iterable[bytes], Callable[[], Iterable[bytes]]]
+"""The chunks of a streamed body, or a function producing them each time it is sent."""
+
+_service_list_cache: Dict[str, Tuple[float, List[dict]]] = {}
+# The list of services for each address, with the time it was retrieved.
+_address_locks: Dict[str, threading.Lock] = {}
+# A lock for each address, held while getting its list of services.
+_service_list_lock = threading.Lock()
+# Held while reading or changing the cache and the locks of the addresses.
+
+
+def clear_service_list_cache() -> None:
+    """Clear the cached lists of services, so they are retrieved again when needed."""
+    with _service_list_lock:
+        _service_list_cache.clear()
+
 
 class EmpowerConnection:
     """
@@ -19,7 +56,15 @@ class EmpowerConnection:
 
     The connection is kept open by storing a bearer token provided by Empower.
 
-    If the token expires, the connection is automatically  reestablished.
+    If the token expires, the connection is automatically  reestablished. If the expiry
+    time can be read from the token, the token is renewed shortly before it expires, in
+    the background if the password is in the keyring, otherwise before the next request.
+
+    All requests are sent through one HTTP session, so that the connections to the
+    server are kept alive and reused. Call `close()` when done to release them.
+
+    Requests are limited by the rate limiter of the address, which is shared by all
+    connections in the process, see `configure_rate_limit`.
 
     The password is stored in the keyring if available, otherwise it is asked for every
     time.
@@ -32,6 +77,18 @@ class EmpowerConnection:
     :ivar session_id: The session ID. None if not logged in.
     :ivar default_get_timeout: The default timeout to use for get requests.
     :ivar default_post_timeout: The default timeout to use for post requests.
+    :ivar pool_maxsize: The maximum number of connections kept open to the Empower
+        server.
+    :ivar token_expiry: The time the token expires, as a POSIX timestamp. None if not
+        logged in, or if the expiry time can't be read from the token.
+    :ivar token_renewal_margin: How many seconds before the token expires it is renewed.
+    :ivar token_cache: The cache tokens are shared through with other processes. None
+        if tokens are not cached.
+    :ivar retry_policy: The policy for retrying requests that failed with a transient
+        error.
+    :ivar retry_statistics: Counters for the retries made.
+    :ivar circuit_breaker: The circuit breaker for the endpoint families of Empower, or
+        None if requests are always made.
     """
 
     def __init__(
@@ -39,6 +96,10 @@ class EmpowerConnection:
         address: str,
         project: Optional[str] = None,
         service: Optional[str] = None,
+        pool_maxsize: int = 10,
+        token_cache: Optional[TokenCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
     ) -> None:
         """
         Initialize the EmpowerConnection.
@@ -47,30 +108,99 @@ class EmpowerConnection:
         :param project: The project to use for logging in. If None, the default project
             is used.
         :param service: The service to use for logging in. If None, the first service in
-            the list is used.
+            the list is used. The list is retrieved from Empower when it is first
+            needed, and cached for `SERVICE_LIST_TTL` seconds for all connections to the
+            same address.
+        :param pool_maxsize: The maximum number of connections to keep open to the
+            Empower server. Connections are reused between requests, so this should be
+            at least the number of threads making requests at the same time.
+        :param token_cache: If given, tokens are stored in this cache, and logging in
+            reuses a valid token from the cache instead of logging in again. The session
+            is then not logged out when the connection is deleted, so that other
+            processes can keep using it. Call `logout` to end it.
+        :param retry_policy: The policy for retrying requests that failed with a
+            transient error, e.g. a 503 from an overloaded server. If None, the default
+            `RetryPolicy` is used, which retries GET requests up to 3 times.
+        :param circuit_breaker: If given, this circuit breaker makes requests to
+            failing parts of Empower fail at once. Pass the same circuit breaker to
+            several connections to let them share it.
         """
         self.address = address.rstrip("/")  # Remove trailing slash if present
         self.username = getpass.getuser()
-        if service is None:
+        self.pool_maxsize = pool_maxsize
+        self._session: Optional[requests.Session] = None
+        self._login_lock = threading.Lock()
+        self._service = service
+        self.project = project
+        self.session_id = None
+        self.token = None
+        self.token_expiry: Optional[float] = None
+        self.token_renewal_margin = 60
+        self.token_cache = token_cache
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.retry_statistics = RetryStatistics()
+        self.circuit_breaker = circuit_breaker
+        self._renewal_timer: Optional[threading.Timer] = None
+        self.default_get_timeout = 10
+        self.default_post_timeout = 20
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        """
+        The rate limiter of the Empower server, shared by all connections to the same
+        address in this process. Set the limits with `configure_rate_limit`.
+        """
+        return get_rate_limiter(self.address)
+
+    @property
+    def service(self) -> str:
+        """
+        The service to use for logging in. If it was not given, the first service of the
+        Empower server is used.
+        """
+        if self._service is None:
             logger.debug("No service specified, getting service from Empower")
+            self._service = self.get_service_list()[0]["netServiceName"]
+            # If no service is specified, use the first one in the list
+        return self._service
+
+    @service.setter
+    def service(self, service: str) -> None:
+        self._service = service
+
+    def get_service_list(self) -> List[dict]:
+        """
+        Get the list of services of the Empower server. The list is cached for
+        `SERVICE_LIST_TTL` seconds, shared by all connections to the same address.
+        """
+        with _service_list_lock:
+            address_lock = _address_locks.setdefault(self.address, threading.Lock())
+        with address_lock:
+            # Holding the lock of the address while getting the list, so that
+            # connections created at the same time only get it once, without waiting
+            # for other servers.
+            with _service_list_lock:
+                cached = _service_list_cache.get(self.address)
+            if cached is not None and time.monotonic() - cached[0] < SERVICE_LIST_TTL:
+                logger.debug("Using cached service list for %s", self.address)
+                return cached[1]
             try:
-                response = requests.get(
-                    self.address + "/authentication/db-service-list", timeout=10
-                )
+                with self.rate_limiter:
+                    response = self.session.get(
+                        self.address + "/authentication/db-service-list", timeout=10
+                    )
             except requests.exceptions.Timeout as e:
                 timeout_string = f"Getting service from {self.address} timed out"
                 print(timeout_string)
                 logger.error(timeout_string)
                 raise requests.exceptions.Timeout(timeout_string) from e
-            self.service = response.json()["results"][0]["netServiceName"]
-            # If no service is specified, use the first one in the list
-        else:
-            self.service = service
-        self.project = project
-        self.session_id = None
-        self.token = None
-        self.default_get_timeout = 10
-        self.default_post_timeout = 20
+            self.raise_for_status(response)
+            service_list = self.parse_body(response)["results"]
+            with _service_list_lock:
+                _service_list_cache[self.address] = (time.monotonic(), service_list)
+        return service_list
 
     def login(
         self, username: Optional[str] = None, password: Optional[str] = None
@@ -89,6 +219,8 @@ class EmpowerConnection:
         """
         if username is not None:
             self.username = username
+        if self.token_cache is not None and self._use_cached_token():
+            return
         if password is None:
             password = self.password
         body = {
@@ -101,11 +233,12 @@ class EmpowerConnection:
             body["project"] = self.project
         logger.debug("Logging into Empower")
         try:
-            response = requests.post(
-                self.address + "/authentication/login",
-                json=body,
-                timeout=60,
-            )
+            with self.rate_limiter:
+                response = self.session.post(
+                    self.address + "/authentication/login",
+                    json=body,
+                    timeout=60,
+                )
         except requests.exceptions.Timeout as e:
             timeout_string = (
                 f"Login to {self.address} with username = {self.username} timed out"
@@ -114,32 +247,211 @@ class EmpowerConnection:
             logger.error(timeout_string)
             raise requests.exceptions.Timeout(timeout_string) from e
         self.raise_for_status(response)
-        self.token = response.json()["results"][0]["token"]
-        self.session_id = response.json()["results"][0]["id"]
+        login_result = self.parse_body(response)["results"][0]
+        self.token = login_result["token"]
+        self.session_id = login_result["id"]
+        self.token_expiry = self._read_token_expiry(self.token)
         logger.debug("Login successful, keeping token")
+        if self.token_cache is not None:
+            self.token_cache.set(
+                self.token_cache_key, self.token, self.session_id, self.token_expiry
+            )
+        self._schedule_token_renewal()
+
+    @property
+    def token_cache_key(self) -> str:
+        """The key the token of this connection is stored under in the token cache."""
+        return TokenCache.make_key(
+            self.address, self.service, self.project, self.username
+        )
+
+    def _use_cached_token(self) -> bool:
+        """
+        Use a token from the token cache, if a valid one is cached.
+
+        :return: Whether a cached token is used.
+        """
+        entry = self.token_cache.get(
+            self.token_cache_key, margin=self.token_renewal_margin
+        )
+        if entry is None:
+            return False
+        self.token = entry["token"]
+        self.session_id = entry["session_id"]
+        self.token_expiry = self._read_token_expiry(self.token)
+        logger.debug("Using cached token instead of logging in")
+        self._schedule_token_renewal()
+        return True
 
     def logout(self) -> None:
         """Log out of Empower."""
+        # Holding the login lock, so a token renewal can't log in again meanwhile.
+        with self._login_lock:
+            if self.session_id is None:
+                logger.debug("No session ID, no need to log out")
+                return
+            logger.debug("Logging out of Empower")
+            self._cancel_token_renewal()
+            self.token_expiry = None
+            if self.token_cache is not None:
+                self.token_cache.invalidate(self.token_cache_key, token=self.token)
+            with self.rate_limiter:
+                response = self.session.delete(
+                    self.address
+                    + "/authentication/logout?sessionInfoID="
+                    + self.session_id,
+                    headers=self.authorization_header,
+                    timeout=self.default_post_timeout,
+                )
+            if response.status_code == 404:
+                logger.debug(
+                    "Logout no necessary, session already expired or were logged out."
+                )
+            else:
+                self.raise_for_status(response)
+            self.session_id = None
+        logger.debug("Logout successful")
+
+    def _refresh_token(
+        self,
+        expired_token: Optional[str],
+        password: Optional[str] = None,
+        renewal: bool = False,
+    ) -> None:
+        """
+        Log in again to replace an expired token.
+
+        Only one refresh runs at a time. Requests that find the token expired while a
+        refresh is running wait for it to finish, and then use the new token instead of
+        logging in again.
+
+        :param expired_token: The token that was rejected by Empower, or is about to
+            expire.
+        :param password: The password to log in with. If None, it is found the same way
+            as for `login`.
+        :param renewal: Whether the token is about to expire, rather than rejected. The
+            session of the token is then still open, so it is logged out once the new
+            token is in place, unless it is shared with other processes through the
+            token cache. Nothing is renewed if the connection has logged out.
+        """
+        with self._login_lock:
+            if self.token != expired_token:
+                logger.debug("Token already refreshed by another request")
+                return
+            if renewal and self.session_id is None:
+                logger.debug("Logged out, not renewing the token")
+                return
+            logger.debug("Token expired, logging in again")
+            old_session_id = self.session_id
+            if self.token_cache is not None:
+                self.token_cache.invalidate(self.token_cache_key, token=expired_token)
+            self.login(password=password)
+            # With a token cache, other processes may still use the old session, so
+            # it is left to expire with its token.
+            if (
+                renewal
+                and self.token_cache is None
+                and old_session_id not in (None, self.session_id)
+            ):
+                self._end_session(old_session_id, expired_token)
+
+    def _end_session(self, session_id: str, token: Optional[str]) -> None:
+        """
+        Log out of a session that has been replaced. Failing to log out is only logged,
+        since the session ends when its token expires anyway.
+
+        :param session_id: The ID of the session.
+        :param token: The token of the session.
+        """
+        logger.debug("Logging out of replaced session")
+        try:
+            with self.rate_limiter:
+                response = self.session.delete(
+                    self.address + "/authentication/logout?sessionInfoID=" + session_id,
+                    headers={"Authorization": f"Bearer {token}"},
+                    timeout=self.default_post_timeout,
+                )
+            if response.status_code != 404:
+                self.raise_for_status(response)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Could not log out of replaced session: %s", e)
+
+    @property
+    def token_expires_soon(self) -> bool:
+        """Whether the token expires within `token_renewal_margin` seconds."""
+        if self.token_expiry is None:
+            return False
+        return time.time() >= self.token_expiry - self.token_renewal_margin
+
+    @staticmethod
+    def _read_token_expiry(token: Optional[str]) -> Optional[float]:
+        """
+        Read the expiry time from a bearer token, if it is a JSON web token with an
+        expiry time. Returns None otherwise.
+        """
+        if not isinstance(token, str):
+            return None
+        try:
+            payload = token.split(".")[1]
+            payload += "=" * (-len(payload) % 4)  # Restoring the stripped padding
+            return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+        except (IndexError, KeyError, TypeError, ValueError):
+            logger.debug("Could not read expiry time from token")
+            return None
+
+    def _schedule_token_renewal(self) -> None:
+        """Start a background timer that renews the token shortly before it expires."""
+        self._cancel_token_renewal()
+        if self.token_expiry is None:
+            return
+        delay = self.token_expiry - self.token_renewal_margin - time.time()
+        if delay <= 0:
+            return
+        connection_reference = weakref.ref(self)
+        # The timer only holds a weak reference, so that it doesn't keep the connection
+        # alive, and the connection can still log out when it is deleted.
+
+        def renew_token() -> None:
+            connection = connection_reference()
+            if connection is not None:
+                connection._renew_token()
+
+        logger.debug("Renewing token in %s seconds", delay)
+        self._renewal_timer = threading.Timer(delay, renew_token)
+        self._renewal_timer.daemon = True
+        self._renewal_timer.start()
+
+    def _cancel_token_renewal(self) -> None:
+        if self._renewal_timer is not None:
+            self._renewal_timer.cancel()
+            self._renewal_timer = None
+
+    def _renew_token(self) -> None:
+        """
+        Renew the token in the background. This is only possible if the password is in
+        the keyring, since the user can't be asked for it. Otherwise, the token is
+        renewed before the next request.
+        """
         if self.session_id is None:
-            logger.debug("No session ID, no need to log out")
+            logger.debug("Logged out, not renewing the token")
             return
-        logger.debug("Logging out of Empower")
-        response = requests.delete(
-            self.address + "/authentication/logout?sessionInfoID=" + self.session_id,
-            headers=self.authorization_header,
-            timeout=self.default_post_timeout,
-        )
-        if response.status_code == 404:
-            logger.debug(
-                "Logout no necessary, session already expired or were logged out."
-            )
-        else:
-            self.raise_for_status(response)
-        self.session_id = None
-        logger.debug("Logout successful")
+        password = self._keyring_password()
+        if not password:
+            logger.debug("No password in keyring, renewing token before next request")
+            return
+        try:
+            self._refresh_token(self.token, password=password, renewal=True)
+        except requests.exceptions.RequestException as e:
+            logger.warning("Renewing token in the background failed: %s", e)
 
     def _requests_wrapper(
-        self, method: str, endpoint: str, body: Optional[dict], timeout
+        self,
+        method: str,
+        endpoint: str,
+        body: Optional[dict],
+        timeout,
+        stream: Optional[ChunkSource] = None,
+        retry: bool = True,
     ) -> Tuple[Optional[dict], Optional[str]]:
         """
         Wrapper for requests.
@@ -148,54 +460,181 @@ class EmpowerConnection:
         :param endpoint: The endpoint to use.
         :param body: The body to use.
         :param timeout: The timeout to use.
+        :param stream: If given, the body is sent from these chunks of JSON instead, see
+            `post_stream`.
+        :param retry: Whether to retry transient failures as allowed by the retry
+            policy.
+
+        :raises requests.exceptions.HTTPError: If Empower rejects the token of a
+            streamed request that can't be sent again.
 
         :return: The results and message from the response.
         """
-
-        def _request_with_timeout(method, endpoint, header, body, timeout):
-            try:
-                return requests.request(
-                    method,
-                    endpoint,
-                    json=body,
-                    headers=header,
-                    timeout=timeout,
-                )
-            except requests.exceptions.Timeout as e:
-                timeout_string = f"{method}ing {body} to {endpoint} timed out"
-                print(timeout_string)
-                logger.error(timeout_string)
-                raise requests.exceptions.Timeout(timeout_string) from e
-
         endpoint = endpoint.lstrip("/")  # Remove leading slash if present
         address = self.address + "/" + endpoint
         # Add slash between address and endpoint
         logger.debug("%sing %s to %s", method, body, address)
-        response = _request_with_timeout(
-            method, address, self.authorization_header, body, timeout
+        if self.token_expires_soon:
+            logger.debug("Token is about to expire, renewing it before the request")
+            self._refresh_token(self.token, renewal=True)
+        token = self.token
+        response = self._send(
+            method,
+            endpoint,
+            body,
+            timeout,
+            stream() if callable(stream) else stream,
+            retry=retry,
         )
         if response.status_code == 401:
-            logger.debug("Token expired, logging in again")
-            self.login()
-            response = _request_with_timeout(
-                method, address, self.authorization_header, body, timeout
+            self._refresh_token(token)
+            if stream is not None and not callable(stream):
+                # The chunks have been used up, so they can't be sent again
+                message = (
+                    f"Empower rejected the token while streaming to {address}. The "
+                    "token has been renewed, but the body can't be sent again, so "
+                    "the request must be made again."
+                )
+                logger.error(message)
+                raise requests.exceptions.HTTPError(message, response=response)
+            response = self._send(
+                method, endpoint, body, timeout, stream() if stream else None, retry
             )
-        logger.debug("Got response %s from %s", response.text, address)
-        self.raise_for_status(response)
+        if logger.isEnabledFor(logging.DEBUG):
+            # Only decoding the text for the log message if it will be logged, since
+            # the body can be large.
+            logger.debug("Got response %s from %s", response.text, address)
+        try:
+            response_body = self.parse_body(response)
+        except ValueError:
+            self.raise_for_status(response)  # E.g. an error page that isn't JSON
+            raise
+        self.raise_for_status(response, response_body)
         return (
-            response.json().get("results", None),
-            response.json().get("message", None),
+            response_body.get("results", None),
+            response_body.get("message", None),
         )  # Safely getting the results and message from the response, if they don't
         # exist, return None
 
+    def _send(
+        self,
+        method: str,
+        endpoint: str,
+        body: Optional[dict],
+        timeout,
+        stream: Optional[Iterable[bytes]] = None,
+        retry: bool = True,
+    ) -> requests.Response:
+        """
+        Send a request to Empower, retrying transient failures as allowed by the retry
+        policy. If there is a circuit breaker, and it is open for the endpoint, a
+        `CircuitOpenError` is raised without making the request. A request that still
+        fails after the retries counts as one failure for the circuit breaker.
+
+        :param method: The method to use.
+        :param endpoint: The endpoint to use, without leading slash.
+        :param body: The body to use.
+        :param timeout: The timeout to use.
+        :param stream: If given, the body is sent from these chunks of JSON instead,
+            with chunked transfer encoding. The request is then not retried.
+        :param retry: Whether to retry transient failures. If False, the request is
+            made once.
+
+        :return: The response from Empower.
+        """
+        address = self.address + "/" + endpoint
+        max_attempts = (
+            self.retry_policy.max_attempts_for(method, endpoint) if retry else 1
+        )
+        body_kwargs: Dict[str, Any] = {"json": body}
+        content_headers = {}
+        if stream is not None:
+            max_attempts = 1  # A stream can only be sent once
+            body_kwargs = {"data": stream}
+            content_headers = {"Content-Type": "application/json"}
+        self.retry_statistics.record_request()
+        node = body.get("nodeName") if isinstance(body, dict) else None
+        attempt = 1
+        while True:
+            if self.circuit_breaker is not None:
+                self.circuit_breaker.before_request(endpoint, node)
+            try:
+                with self.rate_limiter:
+                    response = self.session.request(
+                        method,
+                        address,
+                        headers={**self.authorization_header, **content_headers},
+                        timeout=timeout,
+                        **body_kwargs,
+                    )
+            except (
+                requests.exceptions.Timeout,
+                requests.exceptions.ConnectionError,
+            ) as e:
+                if attempt >= max_attempts:
+                    if self.circuit_breaker is not None:
+                        self.circuit_breaker.record_failure(endpoint, node)
+                    if isinstance(e, requests.exceptions.Timeout):
+                        timeout_string = f"{method}ing {body} to {address} timed out"
+                        print(timeout_string)
+                        logger.error(timeout_string)
+                        raise requests.exceptions.Timeout(timeout_string) from e
+                    raise
+                failure = type(e).__name__
+                retry_after = None
+            else:
+                if (
+                    attempt >= max_attempts
+                    or not self.retry_policy.should_retry_status(response.status_code)
+                ):
+                    self._record_outcome(endpoint, node, response.status_code)
+                    return response
+                failure = f"status code {response.status_code}"
+                retry_after = self._read_retry_after(response)
+            wait_time = self.retry_policy.backoff(attempt, retry_after)
+            logger.warning(
+                "%sing to %s failed with %s, making attempt %s of %s in %.1f seconds",
+                method,
+                address,
+                failure,
+                attempt + 1,
+                max_attempts,
+                wait_time,
+            )
+            self.retry_statistics.record_retry(endpoint, wait_time)
+            time.sleep(wait_time)
+            attempt += 1
+
+    def _record_outcome(
+        self, endpoint: str, node: Optional[str], status_code: int
+    ) -> None:
+        """Record the final response to a request in the circuit breaker, if any."""
+        if self.circuit_breaker is None:
+            return
+        if status_code >= 500:
+            self.circuit_breaker.record_failure(endpoint, node)
+        else:
+            self.circuit_breaker.record_success(endpoint, node)
+
+    @staticmethod
+    def _read_retry_after(response: requests.Response) -> Optional[float]:
+        """The wait in seconds requested in the Retry-After header, if any."""
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, TypeError, ValueError):
+            return None  # Missing, or given as a date, which Empower doesn't use
+
     def get(
-        self, endpoint: str, timeout: Optional[int] = None
+        self, endpoint: str, timeout: Optional[int] = None, retry: bool = True
     ) -> Tuple[Optional[dict], Optional[str]]:
         """
         Get data from Empower.
 
         :param endpoint: The endpoint to get data from.
         :param timeout: The timeout to use. If None, the default timeout is used.
+        :param retry: Whether to retry transient failures as allowed by the retry
+            policy. If False, e.g. for requests that are made again soon anyway, the
+            request is made once.
 
         :return: The results and message from the response.
         """
@@ -209,7 +648,7 @@ class EmpowerConnection:
             )
         logger.debug("Getting data from %s with timeout %s", endpoint, timeout)
         response = self._requests_wrapper(
-            method="get", endpoint=endpoint, body=None, timeout=timeout
+            method="get", endpoint=endpoint, body=None, timeout=timeout, retry=retry
         )
         if response[1]:
             logger.debug("Got message from Empower %s", response[1])
@@ -243,16 +682,40 @@ class EmpowerConnection:
             logger.debug("Got message from Empower %s", response[1])
         return response
 
+    def post_stream(
+        self, endpoint: str, chunks: ChunkSource, timeout: Optional[int] = None
+    ) -> Tuple[Optional[dict], Optional[str]]:
+        """
+        Post a JSON body to Empower as it is produced, with chunked transfer encoding,
+        so that the whole body is never held in memory.
+
+        The request is not retried if it fails. If Empower rejects the token, the token
+        is renewed, and the body is only sent again if `chunks` is a function that can
+        produce the chunks again. Otherwise an HTTPError is raised.
+
+        :param endpoint: The endpoint to post data to.
+        :param chunks: The JSON body, in chunks of UTF-8 encoded bytes, or a function
+            returning the chunks, which is called each time the body is sent.
+        :param timeout: The timeout to use. If None, the default timeout is used.
+
+        :return: The results and message from the response.
+        :raises requests.exceptions.HTTPError: If the request fails, or Empower rejects
+            the token and the chunks can't be produced again.
+        """
+        if not timeout:
+            timeout = self.default_post_timeout
+        logger.debug("Streaming data to %s with timeout %s", endpoint, timeout)
+        response = self._requests_wrapper(
+            method="post", endpoint=endpoint, body=None, timeout=timeout, stream=chunks
+        )
+        if response[1]:
+            logger.debug("Got message from Empower %s", response[1])
+        return response
+
     @property
     def password(self):
         """Get the password to use for logging in."""
-        try:
-            password = keyring.get_password("Empower", self.username)
-            logger.debug("Password found in keyring")
-        except NoKeyringError:
-            # If no keyring is available, ask for password. This is the case in Datalab.
-            password = None
-            logger.debug("No keyring found")
+        password = self._keyring_password()
         if not password:
             logger.debug("No password found in keyring, asking user for password")
             if not self.address.startswith("https"):
@@ -262,34 +725,92 @@ class EmpowerConnection:
             )
         return password
 
+    def _keyring_password(self) -> Optional[str]:
+        """Get the password from the keyring. None if it is not available."""
+        try:
+            password = keyring.get_password("Empower", self.username)
+            logger.debug("Password found in keyring")
+        except NoKeyringError:
+            # If no keyring is available, ask for password. This is the case in Datalab.
+            password = None
+            logger.debug("No keyring found")
+        return password
+
+    @property
+    def session(self) -> requests.Session:
+        """
+        The HTTP session used for all requests to Empower. It is created on first use
+        and keeps the connections to the server open, so that repeated requests reuse
+        the same sockets instead of opening a new connection for every request.
+        """
+        if self._session is None:
+            logger.debug("Opening session with pool size %s", self.pool_maxsize)
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.pool_maxsize)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def close(self) -> None:
+        """Close the HTTP session and the connections it keeps open."""
+        self._cancel_token_renewal()
+        if self._session is None:
+            return
+        logger.debug("Closing session")
+        self._session.close()
+        self._session = None
+
     @property
     def authorization_header(self):
         """Get the authorization header to use for requests."""
         return {"Authorization": "Bearer " + self.token}
 
     def __del__(self):
-        if self.session_id is not None:
+        if self.session_id is not None and self.token_cache is None:
+            # With a token cache, the session is kept for other processes to use.
             self.logout()
+        self.close()
+
+    @staticmethod
+    def parse_body(response: requests.Response) -> Any:
+        """
+        Decode the JSON body of a response. An empty body is decoded as an empty dict.
+
+        The body is decoded with orjson if it is installed, otherwise with the json
+        module of the standard library.
+        """
+        if not response.content:
+            return {}
+        return json_loads(response.content)
 
     @staticmethod
-    def raise_for_status(response: requests.Response):
+    def raise_for_status(response: requests.Response, body: Optional[Any] = None):
         """
         Raise an error if the response is not ok. This error includes the message from
         Empower, as opposed to the raise_for_status() method of requests.
+
+        :param response: The response to check.
+        :param body: The already decoded body of the response. If None, the body is
+            decoded if the response is not ok.
         """
         try:
             response.raise_for_status()
         except requests.exceptions.HTTPError as error:
-            body = response.json()
+            if body is None:
+                try:
+                    body = EmpowerConnection.parse_body(response)
+                except ValueError:
+                    body = {}  # The error is raised without a message from Empower
             if "message" in body and "id" in body:
                 error = requests.exceptions.HTTPError(
                     f"HTTP error {response.status_code} "
-                    f"with message '{response.json()['message']}' "
-                    f"and ID {response.json()['id']}"
+                    f"with message '{body['message']}' "
+                    f"and ID {body['id']}"
                 )
             elif "errors" in body:
                 error = requests.exceptions.HTTPError(
                     f"HTTP error {response.status_code} "
-                    f"with errors '{response.json()['errors']}'"
+                    f"with errors '{body['errors']}'"
                 )
             raise error from None
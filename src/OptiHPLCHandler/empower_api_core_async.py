@@ -0,0 +1,178 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple, TypeVar
+
+from .empower_api_core import ChunkSource, EmpowerConnection
+
+logger = logging.getLogger(__name__)
+
+ReturnType = TypeVar("ReturnType")
+
+DEFAULT_MAX_WORKERS = 32
+
+
+class AsyncEmpowerConnection:
+    """
+    Asyncio interface to an EmpowerConnection.
+
+    The requests are made by the wrapped EmpowerConnection in a pool of worker threads,
+    so many requests can be awaited concurrently from one event loop. All requests share
+    the pooled HTTP session and the bearer token of the wrapped connection, and the
+    token is refreshed the same way as for the wrapped connection.
+
+    Each running request takes a worker thread, so at most `max_workers` requests run at
+    the same time, and the rest wait for a free worker, e.g. 100 requests gathered with
+    32 workers run in 4 waves. This limit is separate from the number of connections
+    kept open by the wrapped connection, `pool_maxsize`. If more requests run than
+    there are kept connections, the extra connections are opened for the request and
+    closed after it, so set `pool_maxsize` to `max_workers` to reuse all connections.
+
+    :ivar connection: The wrapped EmpowerConnection.
+    :ivar max_workers: The maximum number of requests running at the same time.
+    """
+
+    def __init__(
+        self, connection: EmpowerConnection, max_workers: Optional[int] = None
+    ) -> None:
+        """
+        Initialize the AsyncEmpowerConnection.
+
+        :param connection: The EmpowerConnection to make the requests with.
+        :param max_workers: The maximum number of requests running at the same time, see
+            above. If None, `DEFAULT_MAX_WORKERS`.
+        """
+        self.connection = connection
+        if max_workers is None:
+            max_workers = DEFAULT_MAX_WORKERS
+        if max_workers > connection.pool_maxsize:
+            logger.debug(
+                "%s requests can run at the same time, but only %s connections are "
+                "kept open",
+                max_workers,
+                connection.pool_maxsize,
+            )
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    @property
+    def address(self) -> str:
+        """The address of the Empower server."""
+        return self.connection.address
+
+    @property
+    def project(self) -> Optional[str]:
+        """The project to log into."""
+        return self.connection.project
+
+    @property
+    def username(self) -> str:
+        """The username to use for logging in."""
+        return self.connection.username
+
+    async def run(
+        self, function: Callable[..., ReturnType], *args, **kwargs
+    ) -> ReturnType:
+        """
+        Run a blocking function in the worker threads of the connection.
+
+        :param function: The function to run.
+        :param args: Positional arguments for the function.
+        :param kwargs: Keyword arguments for the function.
+
+        :return: The return value of the function.
+        """
+        if self._executor is None:
+            logger.debug("Starting %s worker threads", self.max_workers)
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="Empower"
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(function, *args, **kwargs)
+        )
+
+    async def login(
+        self, username: Optional[str] = None, password: Optional[str] = None
+    ) -> None:
+        """
+        Log into Empower.
+
+        :param password: The password to use for logging in. If None, the password is
+            retrieved from the keyring if available, otherwise it is asked for.
+        :param username: The username to use for logging in. If None, the username of
+            the default user is used.
+        """
+        await self.run(self.connection.login, username=username, password=password)
+
+    async def logout(self) -> None:
+        """Log out of Empower."""
+        await self.run(self.connection.logout)
+
+    async def get(
+        self, endpoint: str, timeout: Optional[int] = None
+    ) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Get data from Empower.
+
+        :param endpoint: The endpoint to get data from.
+        :param timeout: The timeout to use. If None, the default timeout is used.
+
+        :return: The results and message from the response.
+        """
+        return await self.run(self.connection.get, endpoint=endpoint, timeout=timeout)
+
+    async def post(
+        self, endpoint: str, body: dict, timeout: Optional[int] = None
+    ) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Post data to Empower.
+
+        :param endpoint: The endpoint to post data to.
+        :param body: The data to post.
+        :param timeout: The timeout to use. If None, the default timeout is used.
+
+        :return: The results and message from the response.
+        """
+        return await self.run(
+            self.connection.post, endpoint=endpoint, body=body, timeout=timeout
+        )
+
+    async def post_stream(
+        self, endpoint: str, chunks: ChunkSource, timeout: Optional[int] = None
+    ) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Post a JSON body to Empower as it is produced, see
+        `EmpowerConnection.post_stream`. The chunks are produced in a worker thread.
+
+        :param endpoint: The endpoint to post data to.
+        :param chunks: The JSON body, in chunks of UTF-8 encoded bytes, or a function
+            returning the chunks.
+        :param timeout: The timeout to use. If None, the default timeout is used.
+
+        :return: The results and message from the response.
+        """
+        return await self.run(
+            self.connection.post_stream,
+            endpoint=endpoint,
+            chunks=chunks,
+            timeout=timeout,
+        )
+
+    async def close(self) -> None:
+        """Stop the worker threads and close the wrapped connection."""
+        if self._executor is not None:
+            logger.debug("Stopping worker threads")
+            executor = self._executor
+            self._executor = None
+            await asyncio.get_running_loop().run_in_executor(
+                None, functools.partial(executor.shutdown, wait=True)
+            )  # Waiting for running requests in a thread, so the loop is not blocked.
+        self.connection.close()
@@ -1,11 +1,51 @@
+import json
 import logging
+import threading
+import time
 import warnings
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Generic, Iterable, List, Mapping, Optional, TypeVar
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-from .data_types import HplcResult, HPLCSetup
+from .circuit_breaker import CircuitBreaker
+from .data_types import (
+    ExperimentJob,
+    HplcResult,
+    HPLCSetup,
+    JobOutcome,
+    MethodResult,
+    SystemStatus,
+)
 from .empower_api_core import EmpowerConnection
 from .empower_instrument_method import EmpowerInstrumentMethod
+from .experiment_run import ExperimentRun
+from .metadata_cache import MetadataCache
+from .method_catalogue import MethodCatalogue
+from .retry_policy import RetryPolicy
+from .scheduler import plan_sample_sets, sample_run_times
+from .status_watcher import StatusPoller, StatusSubscription, StatusWatcher
+from .token_cache import TokenCache
 
 Result = TypeVar("Result")
 
@@ -13,6 +53,26 @@ Setup = TypeVar("Setup")
 
 logger = logging.getLogger(__name__)
 
+SAMPLE_FIELD_ALIASES = {
+    "Method": "MethodSetOrReportMethod",
+    "SamplePos": "Vial",
+    "InjectionVolume": "InjVol",
+}  # Key are "human readable" names, values are the names used in Empower.
+
+STREAM_CHUNK_SIZE = 64 * 1024
+"""Approximate size in bytes of the chunks a streamed sample set is sent in."""
+
+DATA_TYPE_DICT = {
+    str: "String",
+    int: "Double",
+    float: "Double",
+    dict: "Enumerator",
+}  # The Empower data type of fields, by the type of their value.
+
+# A request made by `GetFleetStatus`: the node, the system (None when getting the
+# systems of the node), the position of the result, and the time it was submitted.
+_FleetRequest = Tuple[str, Optional[str], Tuple[int, int], float]
+
 
 class StatefulInstrumentHandler(ABC, Generic[Result, Setup]):
     def __init__(self):
@@ -54,6 +114,11 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
     :ivar project: Name of the project to connect to.
     :ivar address: Address of the Empower server.
     :ivar username: Username to use to connect to Empower.
+    :ivar keep_session: Whether the session is kept when the context manager exits.
+        This is the case when a token cache is used.
+    :ivar metadata_cache: The cache of the results of lookups. None if lookups are not
+        cached.
+    :ivar method_catalogue: The methods of the project, indexed by name, type and date.
     """
 
     def __init__(
@@ -64,6 +129,11 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         username: Optional[str] = None,
         allow_login_without_context_manager: bool = False,
         auto_login: bool = True,
+        pool_maxsize: int = 10,
+        token_cache: Optional[TokenCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        metadata_cache: Optional[MetadataCache] = None,
         **kwargs,
     ):
         """
@@ -81,13 +151,42 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
             you start a context manager. If `False`, you will have to call `login`
             manually. If you are to provide the password, you need to set this to
             `False`.
+        :param pool_maxsize: The maximum number of connections to keep open to the
+            Empower server. The connections are closed when the context manager exits.
+            It is also the number of statuses of systems polled at the same time by the
+            status watchers of the handler.
+        :param token_cache: If given, the token is shared with other processes through
+            this cache, so that they don't need to log in again. The session is then
+            kept when the context manager exits, so it can be reused. Call `logout` to
+            end it.
+        :param retry_policy: The policy for retrying requests that failed with a
+            transient error. If not given, GET requests are retried up to three times.
+        :param circuit_breaker: If given, this circuit breaker makes requests to failing
+            parts of Empower, e.g. a node that is down, fail at once instead of waiting
+            for the timeout. If not given, requests are always made.
+        :param metadata_cache: If given, the results of `GetMethodList`,
+            `GetNodeNames`, `GetSystemNames`, `GetPlateTypeNames` and
+            `GetSampleSetMethods` are cached in it. The cached lists of methods are
+            invalidated when a method is posted with this handler.
         """
         super().__init__(**kwargs)
         self.connection = EmpowerConnection(
             project=project,
             address=address,
             service=service,
+            pool_maxsize=pool_maxsize,
+            token_cache=token_cache,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
         )
+        self.keep_session = token_cache is not None
+        self.metadata_cache = metadata_cache
+        self.method_catalogue = MethodCatalogue(self._load_method_list)
+        self._status_watchers: Dict[Tuple[str, str], StatusWatcher] = {}
+        self._status_watchers_lock = threading.Lock()
+        # The watchers of this handler have their own poller, so systems that are slow
+        # to answer don't hold up the watchers of other handlers.
+        self._status_poller = StatusPoller(max_workers=pool_maxsize)
         self.allow_login_without_context_manager = allow_login_without_context_manager
         self.auto_login = auto_login
         self._has_context = False
@@ -104,7 +203,12 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
     def __exit__(self, exc_type, exc_value, traceback):
         """End the context manager."""
         self._has_context = False
-        self.logout()
+        self.stop_status_watchers()
+        if self.keep_session:
+            logger.debug("Keeping session for other processes using the token cache")
+        else:
+            self.logout()
+        self.connection.close()
 
     @property
     def project(self) -> str:
@@ -181,7 +285,7 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
     def PostExperiment(
         self,
         sample_set_method_name: str,
-        sample_list: Iterable[Mapping[str, Any]],
+        sample_list: Union[Iterable[Mapping[str, Any]], Mapping[str, Sequence[Any]]],
         plates: Dict[str, str],
         audit_trail_message: Optional[str] = None,
     ):
@@ -202,6 +306,20 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
             If the key Function does not exist, the Function is set to "Inject Sample"
             For all fields, the datatype will be autodetermined according the the type
             of the value.
+
+            The samples can also be given as columns, i.e. a dict where each key is a
+            field and each value a list or NumPy array with the value for each
+            sample, or a pandas DataFrame with a column for each field. This is faster
+            for many samples, since the name and data type of each field is only found
+            once.
+
+            If the samples are given as an iterator, e.g. a generator, each sample is
+            converted and sent to Empower as it is produced, so that very large sample
+            lists are never held in memory at once. A sample with a value of unknown
+            data type then raises the ValueError while the samples are sent, which
+            aborts the request, so no sample set method is created. As the samples
+            can't be sent again, an HTTPError is raised if Empower rejects the token,
+            after the token is renewed. Post the samples again in both cases.
         :param plate_list: Dict of plates to use. The keys should be the position of the
             plate, the value should be the plate type.
         :param audit_trail_message: Message to add to the audit trail of the sample set
@@ -217,40 +335,32 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
                 }
             )
         sampleset_object = {"plates": plate_list, "name": sample_set_method_name}
-        empower_sample_list = []
-        for num, sample in enumerate(sample_list):
-            if "Function" not in sample:
-                sample["Function"] = {"member": "Inject Samples"}
-                field_list = [
-                    {"name": "Processing", "value": {"member": "Normal"}},
-                ]
-            else:
-                field_list = []
-            logger.debug(
-                "Adding sampleset line number %s to sample list",
-                num,
-            )
-            alias_dict = {
-                "Method": "MethodSetOrReportMethod",
-                "SamplePos": "Vial",
-                "InjectionVolume": "InjVol",
-            }  # Key are "human readable" names, values are the names used in Empower.
-            for key, value in sample.items():
-                key = alias_dict.get(key, key)
-                logger.debug("Adding field %s with value %s to sample.", key, value)
-                field_list.append({"name": key, "value": value})
-            for field in field_list:
-                self._set_data_type(field)
-            empower_sample_list.append(
-                {"components": [], "id": num, "fields": field_list}
+        stream = None
+        if self._is_columnar(sample_list):
+            empower_sample_list = self._columnar_sample_lines(sample_list)
+            sampleset_object["sampleSetLines"] = empower_sample_list
+        elif isinstance(sample_list, Iterator):
+            # The lines are made and encoded while they are sent, so the whole sample
+            # list is never in memory.
+            stream = self._stream_sample_set(
+                sampleset_object, self._iter_sample_lines(sample_list)
             )
-        sampleset_object["sampleSetLines"] = empower_sample_list
+        else:
+            empower_sample_list = list(self._iter_sample_lines(sample_list))
+            sampleset_object["sampleSetLines"] = empower_sample_list
+
         endpoint = "project/methods/sample-set-method"
         if audit_trail_message:
             logger.debug("Adding audit trail message to endpoint")
             endpoint += f"?auditTrailComment={audit_trail_message}"
 
-        self.connection.post(endpoint=endpoint, body=sampleset_object)
+        try:
+            if stream is None:
+                self.connection.post(endpoint=endpoint, body=sampleset_object)
+            else:
+                self.connection.post_stream(endpoint=endpoint, chunks=stream)
+        finally:
+            self._invalidate_method_lists()
 
     def RunExperiment(
         self,
@@ -258,7 +368,7 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         node: str,
         system: str,  # TODO: Allow for none, in that case, use the only entry
         sample_set_name: Optional[str] = None,
-    ) -> HplcResult:
+    ) -> ExperimentRun:
         """
         Run the experiment on an instrument.
 
@@ -267,6 +377,10 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         :param system: Name of the chromatographic system to run the experiment on.
         :param sample_set_name: Name of the sample set to run. If not given, the name
             of the sample set method will be used.
+
+        :return: The run, followed with the status watcher of the system. Call
+            `wait()` on it, or await it, to wait for the run to finish and get the
+            `HplcResult` with the start and end time.
         """
         parameters = {
             "sampleSetMethodName": sample_set_method,
@@ -283,9 +397,132 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
             "systemName": system,
         }
         logger.debug("Running experiment with parameters %s", parameters)
+        posted_at = datetime.now()
         self.connection.post(
             endpoint="acquisition/run-sample-set-method", body=parameters, timeout=60
         )
+        return ExperimentRun(
+            sample_set_method=sample_set_method,
+            sample_set_name=sample_set_name or sample_set_method,
+            node=node,
+            system=system,
+            watcher=self.status_watcher(node, system),
+            since=posted_at,
+        )
+
+    def RunExperiments(
+        self, jobs: Iterable[ExperimentJob], max_workers: Optional[int] = None
+    ) -> List[JobOutcome]:
+        """
+        Post and run many sample sets, e.g. the same campaign on many systems.
+
+        For each job, the sample set method is posted with `PostExperiment`, and then
+        run with `RunExperiment`. Jobs on different systems are posted and run at the
+        same time. Jobs on the same system are posted and run one after the other, in
+        the order they are given. If a job fails, the error is returned in its
+        outcome, and the other jobs still run.
+
+        :param jobs: The sample sets to post and run.
+        :param max_workers: The maximum number of systems posted to and run on at the
+            same time. If not given, it is equal to the connection pool size of the
+            handler.
+
+        :return: The outcome of each job, in the order of the jobs. The outcome holds
+            the `ExperimentRun` of the job, which can be waited for, or the error.
+        """
+        job_list = list(jobs)
+        if max_workers is None:
+            max_workers = self.connection.pool_maxsize
+        queue_dict: Dict[Tuple[str, str], List[int]] = {}
+        for job_num, job in enumerate(job_list):
+            queue_dict.setdefault((job.Node, job.System), []).append(job_num)
+        outcome_list: List[Optional[JobOutcome]] = [None] * len(job_list)
+
+        def run_queue(job_nums: List[int]) -> None:
+            for job_num in job_nums:
+                outcome_list[job_num] = self._run_job(job_list[job_num])
+
+        with ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="EmpowerJobs"
+        ) as executor:
+            future_list = [
+                executor.submit(run_queue, job_nums) for job_nums in queue_dict.values()
+            ]
+            for future in future_list:
+                future.result()
+        return outcome_list
+
+    def ScheduleExperiment(
+        self,
+        sample_set_method_name: str,
+        sample_list: Union[Iterable[Mapping[str, Any]], Mapping[str, Sequence[Any]]],
+        plates: Dict[str, str],
+        systems: Optional[Iterable[Tuple[str, str]]] = None,
+        busy_time: Optional[float] = None,
+        idle_states: Iterable[str] = ("Idle",),
+        run_time_field: str = "RunTime",
+        audit_trail_message: Optional[str] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[JobOutcome]:
+        """
+        Split the samples in sample sets, and run them on the systems that are free, so
+        that all samples are run as early as possible.
+
+        The status of the systems is found with `GetFleetStatus`. The samples are
+        split in sample sets of consecutive samples, which are assigned to the systems
+        by the estimated run time of their samples, and how long the systems are busy.
+        Each sample set is then posted and run with `RunExperiments`, and named after
+        the sample set method and the system, e.g. `campaign_system_1`.
+
+        :param sample_set_method_name: Name of the sample set methods to create. The
+            name of the system is added to it.
+        :param sample_list: The samples to run, as for `PostExperiment`, either as a
+            list of samples or as columns. Columns are split in samples to be assigned
+            to the systems.
+        :param plates: The plate type of each plate position, as for `PostExperiment`.
+            The plates are used for all sample sets.
+        :param systems: The node and system names of the systems the samples may be
+            run on. If not given, all systems on all nodes may be used.
+        :param busy_time: The estimated time until a busy system is free, in the same
+            unit as the run times. If not given, only idle systems are used.
+        :param idle_states: The values of `SystemState` meaning that a system is idle.
+        :param run_time_field: The field of each sample with its estimated run time.
+            Samples without it are estimated to take the mean run time of the others.
+        :param audit_trail_message: Message to add to the audit trail of the sample set
+            methods.
+        :param max_workers: The maximum number of requests made at the same time. If
+            not given, it is equal to the connection pool size of the handler.
+
+        :return: The outcome of each sample set, as for `RunExperiments`.
+        :raises ValueError: If none of the systems can be used.
+        """
+        if self._is_columnar(sample_list):
+            sample_list = self._sample_rows(sample_list)
+        else:
+            sample_list = list(sample_list)
+        system_list, load_list = self._schedulable_systems(
+            systems, busy_time, frozenset(idle_states), max_workers
+        )
+        if not system_list:
+            raise ValueError("None of the systems are available to run the samples on")
+        run_time_list = sample_run_times(sample_list, run_time_field)
+        assigned_list = plan_sample_sets(run_time_list, load_list)
+        job_list = [
+            ExperimentJob(
+                SampleSetName=f"{sample_set_method_name}_{system}",
+                SampleList=[sample_list[position] for position in assigned],
+                Plates=plates,
+                Node=node,
+                System=system,
+                AuditTrailMessage=audit_trail_message,
+            )
+            for (node, system), assigned in zip(system_list, assigned_list)
+            if assigned
+        ]
+        logger.info(
+            "Scheduled %s samples in %s sample sets", len(sample_list), len(job_list)
+        )
+        return self.RunExperiments(job_list, max_workers=max_workers)
 
     def AddMethod(
         self,
@@ -315,25 +552,22 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         """
         if not method_type.endswith("Method"):
             method_type += "Method"
-        method_list = self.connection.get(
-            endpoint="project/methods?methodTypes=" + method_type
-        )[0]
-        method_name_dict_list = [
-            [name_dict for name_dict in method["fields"] if name_dict["name"] == "Name"]
-            for method in method_list
-        ]
-        if any(len(name_dict) > 1 for name_dict in method_name_dict_list):
-            logger.error("Multiple names found for a method.")
-            raise ValueError("Multiple names found for a method.")
-        if any(len(name_dict) == 0 for name_dict in method_name_dict_list):
-            logger.error("No name found for a method.")
-            raise ValueError("No name found for a method.")
-        method_name_list = [
-            name_dict[0]["value"] for name_dict in method_name_dict_list
-        ]
+        return self._cached_lookup(
+            "GetMethodList", (method_type,), lambda: self._get_method_list(method_type)
+        )
+
+    def _get_method_list(self, method_type: str) -> List[str]:
+        self.method_catalogue.refresh(method_type)
+        method_name_list = self.method_catalogue.names(method_type)
         logger.debug("Found methods %s", method_name_list)
         return method_name_list
 
+    def _load_method_list(self, method_type: str) -> List[Dict[str, Any]]:
+        """Get the list of methods of a type, with all their fields, from Empower."""
+        return self.connection.get(
+            endpoint="project/methods?methodTypes=" + method_type
+        )[0]
+
     def GetInstrumentMethod(
         self, method_name: str, use_sample_manager_oven: bool = False
     ) -> EmpowerInstrumentMethod:
@@ -349,13 +583,59 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         )
         return EmpowerInstrumentMethod(response[0][0], use_sample_manager_oven)
 
+    def GetInstrumentMethods(
+        self,
+        method_names: Iterable[str],
+        use_sample_manager_oven: bool = False,
+        max_workers: Optional[int] = None,
+    ) -> Iterator[MethodResult]:
+        """
+        Get many instrument methods, e.g. all methods of a project.
+
+        The methods are retrieved and parsed in worker threads, many at the same time,
+        and each method is returned as soon as it is ready, so the results are not in
+        the order of the names. If retrieving a method fails, the error is returned in
+        its result, and the other methods are still retrieved.
+
+        :param method_names: Names of the instrument methods to get.
+        :param use_sample_manager_oven: If True, both sample manager oven and column
+            manager oven will be used. If False, only column manager oven will be used.
+        :param max_workers: The maximum number of methods retrieved at the same time.
+            If not given, it is equal to the connection pool size of the handler.
+
+        :return: Iterator of the result of each method, with the
+            `EmpowerInstrumentMethod` or the error.
+        """
+        if max_workers is None:
+            max_workers = self.connection.pool_maxsize
+        executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="EmpowerMethods"
+        )
+        future_list = [
+            executor.submit(
+                self._get_instrument_method_result, method_name, use_sample_manager_oven
+            )
+            for method_name in method_names
+        ]
+        try:
+            for future in as_completed(future_list):
+                yield future.result()
+        finally:
+            # If the iteration is stopped early, the methods not started are skipped
+            for future in future_list:
+                future.cancel()
+            executor.shutdown(wait=False)
+
     def PostInstrumentMethod(self, method: EmpowerInstrumentMethod) -> None:
         """
         Post a method set method to Empower.
 
         :param method: The method set method to post."""
         endpoint = "project/methods/instrument-method?overWriteExisting=false"
-        self.connection.post(endpoint=endpoint, body=method.current_method)
+        try:
+            self.connection.post(endpoint=endpoint, body=method.current_method)
+        finally:
+            self._invalidate_method_lists()
 
     def GetMethodSetMethod(self, method_name: str):
         """
@@ -374,7 +654,10 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
 
         :param method: The method set method to post."""
         endpoint = "project/methods/method-set"
-        self.connection.post(endpoint=endpoint, body=method)
+        try:
+            self.connection.post(endpoint=endpoint, body=method)
+        finally:
+            self._invalidate_method_lists()
 
     def GetSetup(self) -> List[HPLCSetup]:
         """Get the list of HPLC setups."""
@@ -382,7 +665,11 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
 
     def GetNodeNames(self) -> List[str]:
         """Get the list of node names."""
-        return self.connection.get(endpoint="acquisition/nodes")[0]
+        return self._cached_lookup(
+            "GetNodeNames",
+            (),
+            lambda: self.connection.get(endpoint="acquisition/nodes")[0],
+        )
 
     def GetSystemNames(self, node: str) -> List[str]:
         """
@@ -391,11 +678,19 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         :param node: Name of the node to get the systems from.
         """
         endpoint = f"acquisition/chromatographic-systems?nodeName={node}"
-        return self.connection.get(endpoint=endpoint)[0]
+        return self._cached_lookup(
+            "GetSystemNames", (node,), lambda: self.connection.get(endpoint=endpoint)[0]
+        )
 
     def GetSampleSetMethods(self) -> List[str]:
         """Get the list of sample set methods in project."""
-        return self.connection.get(endpoint="project/methods/sample-set-method-list")[0]
+        return self._cached_lookup(
+            "GetSampleSetMethods",
+            (),
+            lambda: self.connection.get(
+                endpoint="project/methods/sample-set-method-list"
+            )[0],
+        )
 
     def GetPlateTypeNames(self, filter_string: Optional[str] = None) -> List[str]:
         """
@@ -407,7 +702,11 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         endpoint = "configuration/plate-types-list"
         if filter_string:
             endpoint += f"?stringFilter={filter_string}"
-        return self.connection.get(endpoint=endpoint)[0]
+        return self._cached_lookup(
+            "GetPlateTypeNames",
+            (filter_string,),
+            lambda: self.connection.get(endpoint=endpoint)[0],
+        )
 
     def GetStatus(self, node: str, system: str):
         endpoint = (
@@ -417,15 +716,495 @@ class EmpowerHandler(StatefulInstrumentHandler[HplcResult, HPLCSetup]):
         result_list = self.connection.get(endpoint=endpoint, timeout=120)[0]
         return {entry["name"]: entry["value"] for entry in result_list}
 
+    def _poll_status(self, node: str, system: str) -> Dict[str, str]:
+        """
+        Get the status of a system for a status watcher. The request has the default
+        timeout and is not retried, since the watcher polls again soon anyway, so a
+        system that doesn't answer doesn't hold up the polls of other systems.
+        """
+        endpoint = (
+            "acquisition/chromatographic-system-status"
+            f"?nodeName={node}&systemName={system}"
+        )
+        result_list = self.connection.get(endpoint=endpoint, retry=False)[0]
+        return {entry["name"]: entry["value"] for entry in result_list}
+
+    def GetFleetStatus(
+        self,
+        nodes: Optional[Sequence[str]] = None,
+        max_workers: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> List[SystemStatus]:
+        """
+        Get the status of all chromatographic systems on all nodes.
+
+        The systems of each node, and the status of each system, are requested at the
+        same time, so a node that is slow to answer doesn't delay the others. If
+        getting the systems of a node or the status of a system fails, the error is
+        returned in place of the status, so the other statuses are still returned.
+
+        :param nodes: Names of the nodes to get the status of the systems on. If not
+            given, all nodes are used.
+        :param max_workers: The maximum number of requests made at the same time. If
+            not given, it is equal to the connection pool size of the handler.
+        :param deadline: Seconds to wait for the statuses in total. The statuses not
+            retrieved by then are returned with a `TimeoutError`. If not given, the
+            requests are waited for until they time out on their own.
+
+        :return: The status of each system, in the order of the nodes and systems.
+        """
+        start_time = time.monotonic()
+        if nodes is None:
+            nodes = self.GetNodeNames()
+        if max_workers is None:
+            max_workers = self.connection.pool_maxsize
+        result_dict: Dict[Tuple[int, int], SystemStatus] = {}
+        pending: Dict[Future, _FleetRequest] = {}
+        executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="EmpowerFleet"
+        )
+        try:
+            for node_num, node in enumerate(nodes):
+                future = executor.submit(self._timed_call, self.GetSystemNames, node)
+                pending[future] = (node, None, (node_num, -1), time.monotonic())
+            self._collect_fleet_status(
+                executor, pending, result_dict, start_time, deadline
+            )
+        finally:
+            for future in pending:
+                future.cancel()
+            # Not waiting for requests still running after the deadline, they finish
+            # in the background.
+            executor.shutdown(wait=False)
+        for node, system, position, submitted in pending.values():
+            logger.warning("Status of %s on %s not retrieved by deadline", system, node)
+            result_dict[position] = SystemStatus(
+                node,
+                system,
+                None,
+                TimeoutError(f"Deadline of {deadline} seconds passed"),
+                time.monotonic() - submitted,
+            )
+        return [result_dict[position] for position in sorted(result_dict)]
+
+    def status_watcher(self, node: str, system: str) -> StatusWatcher:
+        """
+        Get the watcher of the status of a chromatographic system. There is one watcher
+        per system, shared by all calls to `WatchStatus` for the system, so change its
+        polling intervals here to change them for all.
+
+        :param node: Name of the node the system is on.
+        :param system: Name of the chromatographic system.
+        """
+        with self._status_watchers_lock:
+            if (node, system) not in self._status_watchers:
+                self._status_watchers[(node, system)] = StatusWatcher(
+                    self._poll_status, node, system, poller=self._status_poller
+                )
+            return self._status_watchers[(node, system)]
+
+    def WatchStatus(self, node: str, system: str) -> StatusSubscription:
+        """
+        Watch the status of a chromatographic system, e.g. to see when a run finishes.
+
+        The status is polled in the background, every few seconds while the system is
+        running, and less and less often while it is idle. Iterate over the returned
+        subscription to get each change of the status as a `StatusChange`, starting
+        with the current status. The status is only polled once, however many
+        subscriptions there are for the system.
+
+        Close the subscription when done, e.g. by using it as a context manager,
+        `with handler.WatchStatus(node, system) as subscription:...`.
+
+        :param node: Name of the node the system is on.
+        :param system: Name of the chromatographic system.
+        """
+        return self.status_watcher(node, system).subscribe()
+
+    def stop_status_watchers(self) -> None:
+        """
+        Stop watching the status of all systems, closing all subscriptions, and stop
+        the polling threads.
+        """
+        with self._status_watchers_lock:
+            watcher_list = list(self._status_watchers.values())
+        for watcher in watcher_list:
+            watcher.stop()
+        self._status_poller.close()
+
+    def _collect_fleet_status(
+        self,
+        executor: ThreadPoolExecutor,
+        pending: Dict[Future, _FleetRequest],
+        result_dict: Dict[Tuple[int, int], SystemStatus],
+        start_time: float,
+        deadline: Optional[float],
+    ) -> None:
+        """
+        Wait for the requests of `GetFleetStatus` until all are done or the deadline
+        has passed. When the systems of a node are retrieved, their statuses are
+        requested. The requests still running at the deadline are left in `pending`.
+        """
+        while pending:
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - (time.monotonic() - start_time)
+                if timeout <= 0:
+                    return
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                node, system, position, _ = pending.pop(future)
+                result, error, latency = future.result()
+                if system is None and error is None:
+                    for system_num, system_name in enumerate(result):
+                        status_future = executor.submit(
+                            self._timed_call, self.GetStatus, node, system_name
+                        )
+                        pending[status_future] = (
+                            node,
+                            system_name,
+                            (position[0], system_num),
+                            time.monotonic(),
+                        )
+                    continue
+                if error is not None:
+                    logger.warning(
+                        "Getting status of %s on %s failed: %s",
+                        system or "systems",
+                        node,
+                        error,
+                    )
+                result_dict[position] = SystemStatus(
+                    node, system, result, error, latency
+                )
+
+    def _schedulable_systems(
+        self,
+        systems: Optional[Iterable[Tuple[str, str]]],
+        busy_time: Optional[float],
+        idle_states: Iterable[str],
+        max_workers: Optional[int],
+    ) -> Tuple[List[Tuple[str, str]], List[float]]:
+        """
+        Find the systems `ScheduleExperiment` can use, and the time until each is free.
+
+        :return: The node and system names of the systems, and the time until each is
+            free.
+        """
+        nodes = None
+        if systems is not None:
+            systems = set(systems)
+            nodes = sorted({node for node, _ in systems})
+        system_list: List[Tuple[str, str]] = []
+        load_list: List[float] = []
+        for status in self.GetFleetStatus(nodes=nodes, max_workers=max_workers):
+            if status.Error is not None or status.System is None:
+                continue
+            if systems is not None and (status.Node, status.System) not in systems:
+                continue
+            if status.Status.get("SystemState") in idle_states:
+                load = 0.0
+            elif busy_time is not None:
+                load = busy_time
+            else:
+                logger.debug("Not using %s, since it is busy", status.System)
+                continue
+            system_list.append((status.Node, status.System))
+            load_list.append(load)
+        return system_list, load_list
+
+    def _get_instrument_method_result(
+        self, method_name: str, use_sample_manager_oven: bool
+    ) -> MethodResult:
+        """Get an instrument method for `GetInstrumentMethods`, catching any error."""
+        method, error, latency = self._timed_call(
+            self.GetInstrumentMethod, method_name, use_sample_manager_oven
+        )
+        if error is not None:
+            logger.warning(
+                "Getting instrument method %s failed: %s", method_name, error
+            )
+        return MethodResult(method_name, method, error, latency)
+
+    def _run_job(self, job: ExperimentJob) -> JobOutcome:
+        """Post and run the sample set of a job of `RunExperiments`."""
+        post_start = time.monotonic()
+        try:
+            self.PostExperiment(
+                sample_set_method_name=job.SampleSetName,
+                sample_list=job.SampleList,
+                plates=job.Plates,
+                audit_trail_message=job.AuditTrailMessage,
+            )
+        except Exception as e:
+            logger.warning("Posting sample set %s failed: %s", job.SampleSetName, e)
+            return JobOutcome(job, None, e, time.monotonic() - post_start, None)
+        post_time = time.monotonic() - post_start
+        run_start = time.monotonic()
+        run, error = None, None
+        try:
+            run = self.RunExperiment(
+                sample_set_method=job.SampleSetName, node=job.Node, system=job.System
+            )
+        except Exception as e:
+            logger.warning(
+                "Running sample set %s on %s failed: %s",
+                job.SampleSetName,
+                job.System,
+                e,
+            )
+            error = e
+        return JobOutcome(job, run, error, post_time, time.monotonic() - run_start)
+
+    @staticmethod
+    def _timed_call(
+        function: Callable[..., Any], *args
+    ) -> Tuple[Any, Optional[Exception], float]:
+        """
+        Call a function, catching any error.
+
+        :return: The result of the function, the error, and the seconds the call took.
+        """
+        call_start = time.monotonic()
+        try:
+            result, error = function(*args), None
+        except Exception as e:
+            result, error = None, e
+        return result, error, time.monotonic() - call_start
+
+    def _cached_lookup(
+        self, lookup: str, arguments: tuple, loader: Callable[[], List[str]]
+    ) -> List[str]:
+        """
+        Get the result of a lookup from the metadata cache, if there is one, otherwise
+        from Empower.
+
+        :param lookup: The name of the lookup, e.g. `"GetNodeNames"`.
+        :param arguments: The arguments of the lookup.
+        :param loader: Function getting the result from Empower.
+        """
+        if self.metadata_cache is None:
+            return loader()
+        # The address and project are part of the key, since a cache can be shared by
+        # handlers for different projects.
+        key = (self.address, self.project) + arguments
+        return self.metadata_cache.get_or_load(lookup, key, loader)
+
+    def _invalidate_method_lists(self) -> None:
+        """Remove the cached lists of methods, after posting a method."""
+        self.method_catalogue.invalidate()
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate("GetMethodList")
+            self.metadata_cache.invalidate("GetSampleSetMethods")
+
+    def _iter_sample_lines(
+        self, sample_list: Iterable[Mapping[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """Make the sample set lines from a list of samples, one at a time."""
+        for num, sample in enumerate(sample_list):
+            # Not changing the sample, as the same samples may be posted again
+            has_function = "Function" in sample
+            if has_function:
+                field_list = []
+            else:
+                field_list = [
+                    {"name": "Processing", "value": {"member": "Normal"}},
+                ]
+            logger.debug(
+                "Adding sampleset line number %s to sample list",
+                num,
+            )
+            for key, value in sample.items():
+                key = SAMPLE_FIELD_ALIASES.get(key, key)
+                logger.debug("Adding field %s with value %s to sample.", key, value)
+                field_list.append({"name": key, "value": value})
+            if not has_function:
+                field_list.append(
+                    {"name": "Function", "value": {"member": "Inject Samples"}}
+                )
+            for field in field_list:
+                self._set_data_type(field)
+            yield {"components": [], "id": num, "fields": field_list}
+
+    @staticmethod
+    def _stream_sample_set(
+        sampleset_object: Dict[str, Any], sample_lines: Iterable[Dict[str, Any]]
+    ) -> Iterator[bytes]:
+        """
+        Encode a sample set as JSON, in chunks of about `STREAM_CHUNK_SIZE` bytes. Each
+        line is encoded when it is needed, so only one chunk is held in memory.
+
+        :param sampleset_object: The sample set, without the sample set lines.
+        :param sample_lines: The sample set lines.
+        """
+        head = json.dumps(sampleset_object)
+        # Opening the list of lines in place of the closing brace of the object
+        buffer = [head[:-1] + ', "sampleSetLines": [']
+        size = len(buffer[0])
+        for num, line in enumerate(sample_lines):
+            encoded_line = json.dumps(line)
+            if num > 0:
+                encoded_line = ", " + encoded_line
+            buffer.append(encoded_line)
+            size += len(encoded_line)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer).encode("utf-8")
+                buffer, size = [], 0
+        buffer.append("]}")
+        yield "".join(buffer).encode("utf-8")
+
+    @staticmethod
+    def _is_columnar(sample_list: Any) -> bool:
+        """
+        Whether the samples are given as columns, i.e. a dict of sequences or a pandas
+        DataFrame, rather than a list of samples.
+        """
+        return isinstance(sample_list, Mapping) or (
+            hasattr(sample_list, "columns") and hasattr(sample_list, "__getitem__")
+        )
+
+    def _columnar_sample_lines(self, sample_columns: Any) -> List[Dict[str, Any]]:
+        """
+        Make the sample set lines from samples given as columns. The name and data type
+        of each field are found once per column, instead of once per sample.
+
+        :param sample_columns: A dict of sequences, e.g. lists or NumPy arrays, or a
+            pandas DataFrame. Each key or column name is a field, and each row a sample.
+
+        :raises ValueError: If a column is not a sequence of values, e.g. a string, or
+            the columns have different lengths.
+        """
+        column_dict, line_count = self._sample_columns(sample_columns)
+        logger.debug("Adding %s sampleset lines from columns", line_count)
+        column_list = [
+            (
+                SAMPLE_FIELD_ALIASES.get(name, name),
+                values,
+                self._column_data_type(SAMPLE_FIELD_ALIASES.get(name, name), values),
+            )
+            for name, values in column_dict.items()
+        ]
+        add_defaults = "Function" not in column_dict
+        line_list = []
+        for num in range(line_count):
+            # New fields for each line, so changing a line doesn't change the others.
+            field_list = [
+                {
+                    "name": name,
+                    "value": values[num],
+                    "dataType": data_type or self._data_type(name, values[num]),
+                }
+                for name, values, data_type in column_list
+            ]
+            if add_defaults:
+                # The same defaults as for a list of samples, in the same place.
+                field_list.insert(
+                    0,
+                    {
+                        "name": "Processing",
+                        "value": {"member": "Normal"},
+                        "dataType": "Enumerator",
+                    },
+                )
+                field_list.append(
+                    {
+                        "name": "Function",
+                        "value": {"member": "Inject Samples"},
+                        "dataType": "Enumerator",
+                    }
+                )
+            line_list.append({"components": [], "id": num, "fields": field_list})
+        return line_list
+
+    def _sample_rows(self, sample_columns: Any) -> List[Dict[str, Any]]:
+        """
+        Turn samples given as columns into a list of samples.
+
+        :param sample_columns: The samples, as for `_columnar_sample_lines`.
+        """
+        column_dict, line_count = self._sample_columns(sample_columns)
+        return [
+            {name: values[num] for name, values in column_dict.items()}
+            for num in range(line_count)
+        ]
+
+    def _sample_columns(self, sample_columns: Any) -> Tuple[Dict[str, List[Any]], int]:
+        """
+        Get the values of each column of samples given as columns.
+
+        :param sample_columns: The samples, as for `_columnar_sample_lines`.
+
+        :return: The values of each column, by name, and the number of samples.
+        :raises ValueError: If a column is not a sequence of values, e.g. a string, or
+            the columns have different lengths.
+        """
+        column_dict = {
+            str(name): self._column_values(str(name), sample_columns[name])
+            for name in (
+                sample_columns.columns
+                if hasattr(sample_columns, "columns")
+                else sample_columns.keys()
+            )
+        }
+        length_set = {len(values) for values in column_dict.values()}
+        if len(length_set) > 1:
+            message = f"Columns of samples have different lengths: {sorted(length_set)}"
+            logger.error(message)
+            raise ValueError(message)
+        return column_dict, length_set.pop() if length_set else 0
+
+    @staticmethod
+    def _column_values(name: str, column: Any) -> List[Any]:
+        """
+        Get the values of a column as a list of Python values. NumPy arrays and pandas
+        Series are converted with `tolist`, which also turns NumPy numbers into Python
+        numbers.
+
+        :raises ValueError: If the column is not a sequence of values, e.g. a string.
+        """
+        if isinstance(column, list):
+            return column
+        values = None
+        if not isinstance(column, (str, bytes, Mapping)):
+            if hasattr(column, "tolist"):
+                values = column.tolist()
+            elif isinstance(column, Iterable):
+                values = list(column)
+        if not isinstance(values, list):
+            message = (
+                f"Column {name} of samples must be a sequence of values, "
+                f"not {type(column).__name__}"
+            )
+            logger.error(message)
+            raise ValueError(message)
+        return values
+
+    def _column_data_type(self, name: str, values: List[Any]) -> Optional[str]:
+        """
+        Find the data type of a column. None if the values have different types, so
+        the data type must be found for each value.
+        """
+        type_set = {type(value) for value in values}
+        if len(type_set) != 1:
+            return None
+        return self._data_type(name, values[0])
+
+    @staticmethod
+    def _data_type(name: str, value: Any) -> str:
+        """Find the data type of a field, based on the type of its value"""
+        data_type = None
+        for key, type_name in DATA_TYPE_DICT.items():
+            if isinstance(value, key):
+                data_type = type_name
+        if data_type is None:
+            message = f"No data type found for field {name} with value {value}."
+            logger.error(message)
+            raise ValueError(message)
+        return data_type
+
     def _set_data_type(self, field: Mapping[str, Any]):
         """Find and set the data type of the field, based on the type of `value`"""
-        data_type_dict = {
-            str: "String",
-            int: "Double",
-            float: "Double",
-            dict: "Enumerator",
-        }
-        for key, value in data_type_dict.items():
+        for key, value in DATA_TYPE_DICT.items():
             if isinstance(field["value"], key):
                 logger.debug(
                     "Setting data type of field %s to %s.", field["name"], value
@@ -0,0 +1,357 @@
+import asyncio
+import logging
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .circuit_breaker import CircuitBreaker
+from .data_types import ExperimentJob, JobOutcome, MethodResult, SystemStatus
+from .empower_api_core_async import AsyncEmpowerConnection
+from .empower_handler import EmpowerHandler
+from .empower_instrument_method import EmpowerInstrumentMethod
+from .experiment_run import ExperimentRun
+from .metadata_cache import MetadataCache
+from .retry_policy import RetryPolicy
+from .status_watcher import AsyncStatusSubscription
+from .token_cache import TokenCache
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncEmpowerHandler:
+    """
+    Asyncio version of EmpowerHandler. It has the same methods as EmpowerHandler, but
+    they are coroutines, so many calls can be awaited concurrently, e.g. with
+    `asyncio.gather`.
+
+    The handler must be used as an asynchronous context manager, e.g.
+    `async with AsyncEmpowerHandler(...) as handler:...`.
+
+    :ivar connection: The AsyncEmpowerConnection used to make the requests.
+    """
+
+    def __init__(
+        self,
+        project: str,
+        address: str,
+        service: str = None,
+        username: Optional[str] = None,
+        auto_login: bool = True,
+        pool_maxsize: int = 10,
+        max_workers: Optional[int] = None,
+        token_cache: Optional[TokenCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+        metadata_cache: Optional[MetadataCache] = None,
+    ):
+        """
+        Create an asynchronous handler for Empower.
+
+        :param project: Name of the project to connect to.
+        :param address: Address of the Empower server.
+        :param service: Name of the service to use to connect to Empower. If not given,
+            the first service in the list of services will be used.
+        :param username: Username to use to connect to Empower. If not given, the
+            username of the user running the script is used.
+        :param auto_login: If True (default), the handler will log in automatically when
+            you start a context manager. If `False`, you will have to call `login`
+            manually inside the context manager.
+        :param pool_maxsize: The maximum number of connections to keep open to the
+            Empower server.
+        :param max_workers: The maximum number of requests running at the same time,
+            see `AsyncEmpowerConnection`. If not given, 32. It is separate from
+            `pool_maxsize`, set both to reuse a connection for every running request.
+        :param token_cache: If given, the token is shared with other processes through
+            this cache, and the session is kept when the context manager exits.
+        :param retry_policy: The policy for retrying requests that failed with a
+            transient error, see `EmpowerHandler`.
+        :param circuit_breaker: If given, this circuit breaker makes requests to failing
+            parts of Empower fail at once, see `EmpowerHandler`.
+        :param metadata_cache: If given, the results of lookups are cached in it, see
+            `EmpowerHandler`.
+        """
+        self._handler = EmpowerHandler(
+            project=project,
+            address=address,
+            service=service,
+            username=username,
+            auto_login=auto_login,
+            pool_maxsize=pool_maxsize,
+            token_cache=token_cache,
+            retry_policy=retry_policy,
+            circuit_breaker=circuit_breaker,
+            metadata_cache=metadata_cache,
+        )
+        self.connection = AsyncEmpowerConnection(
+            self._handler.connection, max_workers=max_workers
+        )
+
+    async def __aenter__(self):
+        """Start the context manager."""
+        if self.auto_login:
+            await self.connection.run(self._handler.login, has_context=True)
+        self._handler._has_context = True
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """End the context manager."""
+        self._handler._has_context = False
+        self._handler.stop_status_watchers()
+        if not self._handler.keep_session:
+            await self.logout()
+        await self.connection.close()
+
+    @property
+    def project(self) -> str:
+        """Get the Empower project name."""
+        return self._handler.project
+
+    @property
+    def address(self) -> str:
+        """Get the URL for the Empower Web API to connect to."""
+        return self._handler.address
+
+    @property
+    def username(self) -> str:
+        return self._handler.username
+
+    @property
+    def auto_login(self) -> bool:
+        """Whether the handler logs in automatically when the context manager starts."""
+        return self._handler.auto_login
+
+    @auto_login.setter
+    def auto_login(self, auto_login: bool) -> None:
+        self._handler.auto_login = auto_login
+
+    async def login(
+        self, username: Optional[str] = None, password: Optional[str] = None
+    ) -> None:
+        """
+        Log into Empower. This is only allowed inside the context manager.
+
+        :param password: The password to use for logging in. If None, the password is
+            retrieved from the keyring if available, otherwise it is asked for.
+        :param username: The username to use for logging in. If None, the username of
+            the default user is used.
+        """
+        await self.connection.run(
+            self._handler.login,
+            username=username,
+            password=password,
+            has_context=self._handler._has_context,
+        )
+
+    async def logout(self) -> None:
+        """Log out of Empower."""
+        await self.connection.run(self._handler.logout)
+
+    async def PostExperiment(
+        self,
+        sample_set_method_name: str,
+        sample_list: Union[Iterable[Mapping[str, Any]], Mapping[str, Sequence[Any]]],
+        plates: Dict[str, str],
+        audit_trail_message: Optional[str] = None,
+    ):
+        """Post the experiment to the HPLC, see `EmpowerHandler.PostExperiment`."""
+        return await self.connection.run(
+            self._handler.PostExperiment,
+            sample_set_method_name=sample_set_method_name,
+            sample_list=sample_list,
+            plates=plates,
+            audit_trail_message=audit_trail_message,
+        )
+
+    async def RunExperiment(
+        self,
+        sample_set_method: str,
+        node: str,
+        system: str,
+        sample_set_name: Optional[str] = None,
+    ) -> ExperimentRun:
+        """
+        Run the experiment on an instrument, see `EmpowerHandler.RunExperiment`. Await
+        the returned run to wait for it to finish.
+        """
+        return await self.connection.run(
+            self._handler.RunExperiment,
+            sample_set_method=sample_set_method,
+            node=node,
+            system=system,
+            sample_set_name=sample_set_name,
+        )
+
+    async def RunExperiments(
+        self, jobs: Iterable[ExperimentJob], max_workers: Optional[int] = None
+    ) -> List[JobOutcome]:
+        """
+        Post and run many sample sets, e.g. the same campaign on many systems, see
+        `EmpowerHandler.RunExperiments`.
+        """
+        return await self.connection.run(
+            self._handler.RunExperiments, jobs=jobs, max_workers=max_workers
+        )
+
+    async def ScheduleExperiment(
+        self,
+        sample_set_method_name: str,
+        sample_list: Iterable[Mapping[str, Any]],
+        plates: Dict[str, str],
+        systems: Optional[Iterable[Tuple[str, str]]] = None,
+        busy_time: Optional[float] = None,
+        idle_states: Iterable[str] = ("Idle",),
+        run_time_field: str = "RunTime",
+        audit_trail_message: Optional[str] = None,
+        max_workers: Optional[int] = None,
+    ) -> List[JobOutcome]:
+        """
+        Split the samples in sample sets, and run them on the systems that are free,
+        see `EmpowerHandler.ScheduleExperiment`.
+        """
+        return await self.connection.run(
+            self._handler.ScheduleExperiment,
+            sample_set_method_name=sample_set_method_name,
+            sample_list=sample_list,
+            plates=plates,
+            systems=systems,
+            busy_time=busy_time,
+            idle_states=idle_states,
+            run_time_field=run_time_field,
+            audit_trail_message=audit_trail_message,
+            max_workers=max_workers,
+        )
+
+    async def GetMethodList(self, method_type: str = "MethodSetMethod") -> List[str]:
+        """Get the list of methods, see `EmpowerHandler.GetMethodList`."""
+        return await self.connection.run(
+            self._handler.GetMethodList, method_type=method_type
+        )
+
+    async def GetInstrumentMethod(
+        self, method_name: str, use_sample_manager_oven: bool = False
+    ) -> EmpowerInstrumentMethod:
+        """Get an instrument method, see `EmpowerHandler.GetInstrumentMethod`."""
+        return await self.connection.run(
+            self._handler.GetInstrumentMethod,
+            method_name=method_name,
+            use_sample_manager_oven=use_sample_manager_oven,
+        )
+
+    async def GetInstrumentMethods(
+        self,
+        method_names: Iterable[str],
+        use_sample_manager_oven: bool = False,
+    ) -> AsyncIterator[MethodResult]:
+        """
+        Get many instrument methods, see `EmpowerHandler.GetInstrumentMethods`. Iterate
+        over the results with `async for`, as each method is ready. The number of
+        methods retrieved at the same time is limited by the worker threads of the
+        connection.
+        """
+        task_list = [
+            asyncio.ensure_future(
+                self.connection.run(
+                    self._handler._get_instrument_method_result,
+                    method_name,
+                    use_sample_manager_oven,
+                )
+            )
+            for method_name in method_names
+        ]
+        try:
+            for task in asyncio.as_completed(task_list):
+                yield await task
+        finally:
+            for task in task_list:
+                task.cancel()
+
+    async def PostInstrumentMethod(self, method: EmpowerInstrumentMethod) -> None:
+        """Post an instrument method, see `EmpowerHandler.PostInstrumentMethod`."""
+        await self.connection.run(self._handler.PostInstrumentMethod, method=method)
+
+    async def GetMethodSetMethod(self, method_name: str):
+        """Get a method set method, see `EmpowerHandler.GetMethodSetMethod`."""
+        return await self.connection.run(
+            self._handler.GetMethodSetMethod, method_name=method_name
+        )
+
+    async def PostMethodSetMethod(self, method: Mapping[str, Any]) -> None:
+        """Post a method set method, see `EmpowerHandler.PostMethodSetMethod`."""
+        await self.connection.run(self._handler.PostMethodSetMethod, method=method)
+
+    async def GetNodeNames(self) -> List[str]:
+        """Get the list of node names."""
+        return await self.connection.run(self._handler.GetNodeNames)
+
+    async def GetSystemNames(self, node: str) -> List[str]:
+        """
+        Get the list of names of chromatographic systems on a node.
+
+        :param node: Name of the node to get the systems from.
+        """
+        return await self.connection.run(self._handler.GetSystemNames, node=node)
+
+    async def GetSampleSetMethods(self) -> List[str]:
+        """Get the list of sample set methods in project."""
+        return await self.connection.run(self._handler.GetSampleSetMethods)
+
+    async def GetPlateTypeNames(self, filter_string: Optional[str] = None) -> List[str]:
+        """
+        Get the list of names of available plate types
+
+        :param filter_string: String to filter the list of plate types on. Only plate
+            types whose name contains this string will be returned.
+        """
+        return await self.connection.run(
+            self._handler.GetPlateTypeNames, filter_string=filter_string
+        )
+
+    async def GetStatus(self, node: str, system: str) -> Dict[str, str]:
+        """
+        Get the status of a chromatographic system.
+
+        :param node: Name of the node the system is on.
+        :param system: Name of the chromatographic system.
+        """
+        return await self.connection.run(
+            self._handler.GetStatus, node=node, system=system
+        )
+
+    async def GetFleetStatus(
+        self,
+        nodes: Optional[Sequence[str]] = None,
+        max_workers: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> List[SystemStatus]:
+        """
+        Get the status of all chromatographic systems on all nodes, see
+        `EmpowerHandler.GetFleetStatus`.
+        """
+        return await self.connection.run(
+            self._handler.GetFleetStatus,
+            nodes=nodes,
+            max_workers=max_workers,
+            deadline=deadline,
+        )
+
+    def WatchStatus(self, node: str, system: str) -> AsyncStatusSubscription:
+        """
+        Watch the status of a chromatographic system, see `EmpowerHandler.WatchStatus`.
+        Iterate over the returned subscription with `async for`.
+
+        :param node: Name of the node the system is on.
+        :param system: Name of the chromatographic system.
+        """
+        return self._handler.status_watcher(node, system).subscribe_async()
+
+    def __str__(self):
+        return f"AsyncEmpowerHandler for project {self.project}, user {self.username}"
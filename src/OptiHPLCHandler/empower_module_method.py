@@ -1,13 +1,149 @@
+import bisect
 import logging
 import re
 import warnings
-from typing import Dict, List, Mapping, Tuple, Union
+from collections import deque
+from typing import Deque, Dict, FrozenSet, List, Mapping, Optional, Set, Tuple, Union
 from xml.etree import ElementTree as ET
 
 from OptiHPLCHandler.data_types import EmpowerModuleMethodModel as DataModel
+from OptiHPLCHandler.data_types import TagEdit
 
 logger = logging.getLogger(__name__)
 
+_TAG_PATTERN = re.compile(r"<(/?)([^<>/\s]+)>")
+"""Opening and closing tags without attributes, e.g. `<Flow>` and `</Flow>`."""
+
+
+class _GradientEdit:
+    """
+    Setting the gradient table of a solvent manager method. The rows are kept, so the
+    table can be read back without parsing the xml, and the xml of the rows is only made
+    when the edit is applied to the method.
+    """
+
+    Key = "GradientTable"
+
+    def __init__(self, row_list: List[Dict[str, str]]) -> None:
+        self.row_list = row_list
+        self.tags = {"GradientRow"}.union(*row_list)
+        self._value: Optional[str] = None
+
+    @property
+    def Value(self) -> str:
+        """The xml of the rows."""
+        if self._value is None:
+            xml = ET.Element("GradientTable")
+            for row in self.row_list:
+                row_xml = ET.SubElement(xml, "GradientRow")
+                for tag, value in row.items():
+                    ET.SubElement(row_xml, tag).text = value
+            self._value = ET.tostring(xml, encoding="unicode")[
+                len("<GradientTable>") : -len("</GradientTable>")
+            ]  # Stripping root tag, as it is the tag being set
+        return self._value
+
+    def __repr__(self) -> str:
+        return f"_GradientEdit({len(self.row_list)} rows)"
+
+
+_TAG_EDITS = (TagEdit, _GradientEdit)
+"""The changes setting the value of a tag."""
+
+Change = Union[TagEdit, _GradientEdit, Tuple[str, str]]
+"""A change of a module method, either setting the value of a tag, e.g. to the rows of
+a gradient table, or replacing all instances of a string in the xml."""
+
+
+def _has_tag(change: Union[TagEdit, _GradientEdit], key: str) -> bool:
+    """Whether the new value of a tag edit contains a tag."""
+    if isinstance(change, _GradientEdit):
+        return key in change.tags
+    return f"<{key}>" in change.Value
+
+
+def _tags(change: Union[TagEdit, _GradientEdit]) -> FrozenSet[str]:
+    """The names of the tags in the new value of a tag edit."""
+    if isinstance(change, _GradientEdit):
+        return frozenset(change.tags)
+    return frozenset(key for _, key in _TAG_PATTERN.findall(change.Value))
+
+
+class _TagIndex:
+    """
+    Positions of the opening and closing tags in an xml, by tag name, so that the value
+    of a tag can be found without searching the xml.
+    """
+
+    def __init__(self, xml: str) -> None:
+        """Index the tags of an xml, in one pass over the xml."""
+        self.opening: Dict[str, List[int]] = {}
+        self.closing: Dict[str, List[int]] = {}
+        self._add(xml, 0)
+
+    def _add(self, xml: str, offset: int) -> None:
+        for match in _TAG_PATTERN.finditer(xml):
+            position_dict = self.closing if match.group(1) else self.opening
+            position_list = position_dict.setdefault(match.group(2), [])
+            bisect.insort(position_list, match.start() + offset)
+
+    def span(self, key: str) -> Tuple[int, int]:
+        """
+        Find the value of a tag, in the same way as `EmpowerModuleMethod.find_value`.
+
+        :param key: The name of the tag.
+
+        :return: The start and end of the value in the xml.
+        :raises KeyError: If the tag is not found.
+        :raises ValueError: If the tag is found more than once.
+        """
+        opening_list = self.opening.get(key)
+        closing_list = self.closing.get(key)
+        start = opening_list[0] + len(key) + 2 if opening_list else None
+        if start is None or not closing_list or closing_list[-1] < start:
+            raise KeyError(f"Could not find key {key}")
+        end = closing_list[-1]
+        # Like the greedy search of `find_value`, the value goes from the first opening
+        # tag to the last closing tag, so a second opening tag before it is a duplicate
+        if len(opening_list) > 1 and opening_list[1] < end:
+            raise ValueError(f"Found more than one match for key {key}")
+        return start, end
+
+    def update(self, span_list: List[Tuple[int, int, str]]) -> None:
+        """
+        Update the index after replacing parts of the xml. Each part must either start
+        and end with a whole tag, like `<Flow>0.1</Flow>`, or be the whole value of a
+        tag, so that no tag is partly replaced.
+
+        :param span_list: The start and end of each replaced part in the old xml, and
+            the new part, sorted by the start. The parts must not overlap.
+        """
+        start_list = [start for start, _, _ in span_list]
+        # The shift of the positions after each part, from all parts up to it
+        shift_list = []
+        shift = 0
+        for start, end, new_xml in span_list:
+            shift += len(new_xml) - (end - start)
+            shift_list.append(shift)
+        for position_dict in (self.opening, self.closing):
+            for key in list(position_dict):
+                position_list = []
+                for position in position_dict[key]:
+                    span_num = bisect.bisect_right(start_list, position) - 1
+                    if span_num < 0:
+                        position_list.append(position)
+                    elif position >= span_list[span_num][1]:
+                        position_list.append(position + shift_list[span_num])
+                    # Tags in the replaced parts are removed
+                if position_list:
+                    position_dict[key] = position_list
+                else:
+                    del position_dict[key]
+        shift = 0
+        for (start, end, new_xml), next_shift in zip(span_list, shift_list):
+            self._add(new_xml, start + shift)
+            shift = next_shift
+
 
 class EmpowerModuleMethod:
     """
@@ -27,11 +163,18 @@ class EmpowerModuleMethod:
     If no xml key is present in the method definition, no changes can be made to the
     method, but the original method definition can still be retrieved.
 
+    Setting the same key again replaces the earlier change, so setting a value many
+    times, e.g. in an optimisation loop, doesn't make the method slower. The last
+    `undo_limit` changes can be undone.
+
     :ivar original_method: The original method definition.
     :ivar current_method: The current method definition, including the changes that
         have been made.
+    :ivar undo_limit: The number of changes that can be undone.
     """
 
+    undo_limit: int = 100
+
     def __init__(self, method_definition: Mapping[str, str]):
         """
         Initialize the EmpowerModuleMethod.
@@ -42,7 +185,22 @@ class EmpowerModuleMethod:
             extracted.
         """
         self.original_method = DataModel(method_definition, mutable=False)
-        self._change_list: List[Tuple[str, str]] = []
+        self._change_list: List[Change] = []
+        # For each change, the tags in the value replaced by it, if it is a tag edit,
+        # and the tags are known. Only tag edits with known tags are merged.
+        self._removed_tags: List[Optional[FrozenSet[str]]] = []
+        # How to undo each change: the position, the earlier change it replaced and the
+        # tags removed by that change, or None if it was added to the end of the change
+        # list.
+        self._undo_stack: Deque[
+            Optional[Tuple[int, Change, Optional[FrozenSet[str]]]]
+        ] = deque(maxlen=self.undo_limit)
+        # The xml with the first `_applied_count` changes applied, so that each change
+        # is only applied once. None if it has to be made again from the original xml.
+        self._current_xml: Optional[str] = None
+        self._applied_count = 0
+        # The tags of the current xml. None if the xml has to be indexed again.
+        self._tag_index: Optional[_TagIndex] = None
 
     def replace(self, original: str, new: str) -> None:
         """
@@ -51,41 +209,322 @@ class EmpowerModuleMethod:
         :param original: The string to replace.
         :param new: The string to replace it with.
         """
-        if re.search(r"\.\d{8}", new):
-            warning_text = (
-                f"The value {new} seems to contain a numerical value with more than 7 "
-                "digits after the decimal point. Empower might interpret that wrong."
-            )
-            logger.warning(warning_text)
-            warnings.warn(warning_text)
+        self._check_decimals(new)
         self._change_list.append((original, new))
+        self._removed_tags.append(None)
+        self._undo_stack.append(None)
 
     def undo(self) -> None:
-        """Undo the last change made to the method."""
+        """
+        Undo the last change made to the method.
+
+        :raises IndexError: If there are no changes to undo, or the last `undo_limit`
+            changes have already been undone.
+        """
+        if not self._undo_stack:
+            raise IndexError("No changes to undo")
+        replaced = self._undo_stack.pop()
         self._change_list.pop()
+        self._removed_tags.pop()
+        if replaced is not None:
+            position, change, removed_tags = replaced
+            self._change_list.insert(position, change)
+            self._removed_tags.insert(position, removed_tags)
+        # The change can't be taken back out of the xml, so the xml is made again from
+        # the original xml when it is next needed.
+        self._current_xml = None
+        self._tag_index = None
 
-    # If this property method is called often, there could be performance issues. In
-    # that case, consider cahcing the result with `@functools.lru_cahce(maxsize=1)`. You
-    # also need to implement a `__hash__` method and an `__eq__` method for this to
-    # work.
     @property
     def current_method(self) -> DataModel:
         """The current method definition, including the changes that have been made."""
-        logger.debug(
-            "Applying changes to method of type %s to create current method", type(self)
-        )
-        return self.alter_method(self.original_method, self._change_list)
+        method = DataModel(self.original_method)
+        xml = self._get_current_xml()
+        if xml is not None:
+            method["nativeXml"] = xml
+        return method
 
     def __getitem__(self, key: str) -> str:
-        try:
-            xml = self.current_method["nativeXml"]
-        except KeyError as ex:
-            raise KeyError("No xml found in method definition") from ex
-        return self.find_value(xml, key)
+        span = self._unchanged_span(key)
+        if span is not None:
+            # The pending changes don't touch the value, so they can wait
+            return self._current_xml[span[0] : span[1]]
+        xml = self._get_current_xml()
+        if xml is None:
+            raise KeyError("No xml found in method definition")
+        start, end = self._get_tag_index().span(key)
+        return xml[start:end]
 
     def __setitem__(self, key: str, value: str) -> None:
-        current_value = self[key]
-        self.replace(f"<{key}>{current_value}</{key}>", f"<{key}>{value}</{key}>")
+        self._check_key(key)
+        self._check_decimals(str(value))
+        self._add_tag_edit(TagEdit(key, str(value)))
+
+    def _check_key(self, key: str) -> None:
+        """
+        Check that a tag is found once in the current xml.
+
+        :raises KeyError: If the tag is not found.
+        :raises ValueError: If the tag is found more than once.
+        """
+        if self._unchanged_span(key, value_changes=True) is None:
+            self[key]
+
+    def _unchanged_span(
+        self, key: str, value_changes: bool = False
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Find the value of a tag in the current xml without applying the pending
+        changes, if they don't touch the tag.
+
+        :param key: The name of the tag.
+        :param value_changes: Whether pending changes to the value of the tag itself are
+            allowed, e.g. when only checking that the tag is there.
+
+        :return: The start and end of the value in the current xml, or None if the
+            pending changes have to be applied first.
+        """
+        if self._tag_index is None or self._current_xml is None:
+            return None
+        try:
+            start, end = self._tag_index.span(key)
+        except (KeyError, ValueError):
+            return None  # The error is raised after applying the changes
+        for change in self._change_list[self._applied_count :]:
+            if not isinstance(change, _TAG_EDITS) or _has_tag(change, key):
+                return None
+            if change.Key == key:
+                if value_changes:
+                    continue
+                return None
+            if self._overlaps(change.Key, start, end):
+                return None
+        return start, end
+
+    def _overlaps(self, key: str, start: int, end: int) -> bool:
+        """Whether the value of a tag is inside a span of the xml, or the other way."""
+        try:
+            key_start, key_end = self._tag_index.span(key)
+        except (KeyError, ValueError):
+            return True
+        return key_start <= end and start <= key_end
+
+    def _add_tag_edit(self, tag_edit: Union[TagEdit, _GradientEdit]) -> None:
+        """
+        Add a tag edit to the change list. If the tag has been set before, and the
+        changes since then don't affect the tag, the earlier edit is removed, so that
+        the change list doesn't grow when the same tags are set again and again.
+        """
+        removed_tags = self._value_tags(tag_edit.Key)
+        for position in range(len(self._change_list) - 1, -1, -1):
+            change = self._change_list[position]
+            if not isinstance(change, _TAG_EDITS):
+                break
+            if change.Key == tag_edit.Key:
+                if self._commutes(position, tag_edit):
+                    earlier_removed_tags = self._removed_tags.pop(position)
+                    del self._change_list[position]
+                    if position < self._applied_count:
+                        # The earlier value is overwritten when the edit is applied
+                        self._applied_count -= 1
+                    # The new edit now replaces the value from before the earlier edit
+                    self._change_list.append(tag_edit)
+                    self._removed_tags.append(earlier_removed_tags)
+                    self._undo_stack.append((position, change, earlier_removed_tags))
+                    return
+                break
+            if _has_tag(change, tag_edit.Key):
+                # The tag that is set is inside this value
+                break
+        self._change_list.append(tag_edit)
+        self._removed_tags.append(removed_tags)
+        self._undo_stack.append(None)
+
+    def _commutes(self, position: int, tag_edit: Union[TagEdit, _GradientEdit]) -> bool:
+        """
+        Whether the tag edits after `position` don't change any tag inside the value
+        replaced by the earlier edit at `position`, or inside the earlier or the new
+        value of the tag, so the earlier edit can be replaced by the new one.
+        """
+        change = self._change_list[position]
+        removed_tags = self._removed_tags[position]
+        if removed_tags is None:
+            return False
+        for later_change in self._change_list[position + 1 :]:
+            if (
+                later_change.Key in removed_tags
+                or _has_tag(change, later_change.Key)
+                or _has_tag(tag_edit, later_change.Key)
+            ):
+                return False
+        return True
+
+    def _value_tags(self, key: str) -> Optional[FrozenSet[str]]:
+        """
+        Find the tags in the current value of a tag, without applying the pending
+        changes.
+
+        :return: The names of the tags, or None if they are not known without applying
+            the pending changes.
+        """
+        if self._tag_index is None or self._current_xml is None:
+            return None
+        try:
+            start, end = self._tag_index.span(key)
+        except (KeyError, ValueError):
+            return None
+        for change in reversed(self._change_list[self._applied_count :]):
+            if not isinstance(change, _TAG_EDITS) or _has_tag(change, key):
+                return None
+            if change.Key == key:
+                # The latest value of the tag
+                return _tags(change)
+            if self._overlaps(change.Key, start, end):
+                return None
+        return frozenset(
+            tag for _, tag in _TAG_PATTERN.findall(self._current_xml[start:end])
+        )
+
+    @staticmethod
+    def _check_decimals(new: str) -> None:
+        if re.search(r"\.\d{8}", new):
+            warning_text = (
+                f"The value {new} seems to contain a numerical value with more than 7 "
+                "digits after the decimal point. Empower might interpret that wrong."
+            )
+            logger.warning(warning_text)
+            warnings.warn(warning_text)
+
+    def _get_tag_index(self) -> _TagIndex:
+        if self._tag_index is None:
+            self._tag_index = _TagIndex(self._current_xml)
+        return self._tag_index
+
+    def _get_current_xml(self) -> Optional[str]:
+        """
+        Get the xml of the current method, applying the changes made since it was last
+        needed.
+
+        :return: The xml, or None if there is no xml in the method definition.
+        :raises ValueError: If changes have been made, but there is no xml.
+        """
+        if "nativeXml" not in self.original_method:
+            if len(self._change_list) > 0:
+                raise ValueError(
+                    "Cannot apply changes to method, no xml key in method definition."
+                )
+            return None
+        if self._current_xml is None or self._applied_count > len(self._change_list):
+            logger.debug(
+                "Applying changes to method of type %s to create current method",
+                type(self),
+            )
+            self._current_xml = self.original_method["nativeXml"]
+            self._applied_count = 0
+            self._tag_index = None
+        if self._applied_count < len(self._change_list):
+            self._apply_changes(self._change_list[self._applied_count :])
+            self._applied_count = len(self._change_list)
+        return self._current_xml
+
+    def _apply_changes(self, change_list: List[Change]) -> None:
+        """
+        Apply changes to the current xml. Consecutive tag edits are written in one pass
+        over the xml, at the positions of their values in the tag index.
+        """
+        pending_list: List[Tuple[int, int, str]] = []
+        for change in change_list:
+            if not isinstance(change, _TAG_EDITS):
+                self._write_spans(pending_list)
+                self._apply_indexed_change(*change)
+                continue
+            span = self._pending_span(change.Key, pending_list)
+            if span is None and pending_list:
+                # The tag may only be found after writing the pending values
+                self._write_spans(pending_list)
+                span = self._pending_span(change.Key, pending_list)
+            if span is None:
+                continue
+            span_num = bisect.bisect_left(pending_list, (span[0],))
+            pending_list.insert(span_num, (*span, change.Value))
+        self._write_spans(pending_list)
+
+    def _pending_span(
+        self, key: str, pending_list: List[Tuple[int, int, str]]
+    ) -> Optional[Tuple[int, int]]:
+        """
+        Find the value of a tag to write in the same pass as the pending values.
+
+        :param key: The name of the tag.
+        :param pending_list: The values waiting to be written, see `_write_spans`.
+
+        :return: The start and end of the value in the current xml, or None if it can't
+            be written in this pass. If nothing is pending, the tag is not found, or
+            found more than once, and the change is skipped, like with `replace`.
+        """
+        try:
+            start, end = self._get_tag_index().span(key)
+        except (KeyError, ValueError) as ex:
+            if not pending_list:
+                logger.warning("Could not set %s, no changes made: %s", key, ex)
+            return None
+        # A value can only be written once in a pass, and not inside or next to
+        # another value being written, since the positions are from before the pass.
+        # A pending value with the tag in it also changes where the tag is.
+        span_num = bisect.bisect_left(pending_list, (start,))
+        if (
+            (span_num > 0 and pending_list[span_num - 1][1] >= start)
+            or (span_num < len(pending_list) and pending_list[span_num][0] <= end)
+            or any(f"<{key}>" in new_xml for _, _, new_xml in pending_list)
+        ):
+            return None
+        return start, end
+
+    def _write_spans(self, span_list: List[Tuple[int, int, str]]) -> None:
+        """
+        Replace parts of the current xml in one pass, and update the tag index. The
+        list is emptied.
+
+        :param span_list: The start and end of each part, and the new part, sorted by
+            the start.
+        """
+        if not span_list:
+            return
+        xml = self._current_xml
+        part_list = []
+        position = 0
+        for start, end, new_xml in span_list:
+            part_list.append(xml[position:start])
+            part_list.append(new_xml)
+            position = end
+        part_list.append(xml[position:])
+        self._current_xml = "".join(part_list)
+        self._tag_index.update(span_list)
+        logger.debug("Wrote %s values to the method", len(span_list))
+        span_list.clear()
+
+    def _apply_indexed_change(self, original: str, new: str) -> None:
+        """
+        Apply a change to the current xml, and update the tag index. If the change
+        replaces one whole element, e.g. `<Flow>0.1</Flow>`, only that part of the index
+        is updated, otherwise the xml is indexed again when it is next needed.
+        """
+        xml = self._current_xml
+        if (
+            self._tag_index is not None
+            and original.startswith("<")
+            and original.endswith(">")
+            and new.startswith("<")
+            and new.endswith(">")
+            and xml.count(original) == 1
+        ):
+            start = xml.find(original)
+            self._current_xml = xml[:start] + new + xml[start + len(original) :]
+            self._tag_index.update([(start, start + len(original), new)])
+            logger.debug("Replaced 1 instances of %s with %s", original, new)
+            return
+        self._current_xml = self._apply_change(xml, original, new)
+        self._tag_index = None
 
     @staticmethod
     def find_value(xml: str, key: str) -> str:
@@ -106,7 +545,7 @@ class EmpowerModuleMethod:
 
     @staticmethod
     def alter_method(
-        original_method: Mapping[str, str], change_list: List[Tuple[str, str]]
+        original_method: Mapping[str, str], change_list: List[Change]
     ) -> DataModel:
         """
         Alter the a method definition by applying the changes in the change list.
@@ -123,21 +562,28 @@ class EmpowerModuleMethod:
                 # If there is no xml key, we can't do anything with the method. But if
                 # there are no changes to apply, we can just return the original method.
                 return method
-        for original, new in change_list:
-            num_replaced = xml.count(original)
-            if num_replaced == 0:
-                logger.warning(
-                    f"Could not find {original} in {method}, no changes made to method."
-                )  # Consider trying to replace `<` with `&lt` and `>` with `&gt;` and
-                # then trying again.
+        for change in change_list:
+            if isinstance(change, _TAG_EDITS):
+                start, end = _TagIndex(xml).span(change.Key)
+                xml = xml[:start] + change.Value + xml[end:]
             else:
-                xml = xml.replace(original, new)
-                logger.debug(
-                    "Replaced %s instances of %s with %s", num_replaced, original, new
-                )
+                xml = EmpowerModuleMethod._apply_change(xml, *change)
         method["nativeXml"] = xml
         return method
 
+    @staticmethod
+    def _apply_change(xml: str, original: str, new: str) -> str:
+        """Replace all instances of a string in an xml."""
+        num_replaced = xml.count(original)
+        if num_replaced == 0:
+            logger.warning(
+                f"Could not find {original} in {xml}, no changes made to method."
+            )  # Consider trying to replace `<` with `&lt` and `>` with `&gt;` and
+            # then trying again.
+            return xml
+        logger.debug("Replaced %s instances of %s with %s", num_replaced, original, new)
+        return xml.replace(original, new)
+
     @staticmethod
     def _round(value: Union[str, float], decimal_digits: int = 3) -> str:
         if isinstance(value, float):
@@ -208,6 +654,11 @@ class SolventManagerMethod(EmpowerModuleMethod):
     valve_tag_suffix: str
     solvent_lines: List[str]
 
+    def __init__(self, method_definition: Mapping[str, str]):
+        super().__init__(method_definition)
+        # The last gradient table parsed from the xml, and its rows
+        self._parsed_gradient: Optional[Tuple[str, List[Dict[str, str]]]] = None
+
     @property
     def valve_position(self) -> List[str]:
         """
@@ -259,9 +710,30 @@ class SolventManagerMethod(EmpowerModuleMethod):
         When setting, values can be strings or numbers. Floats will be rounded to 3
         decimals, as Empower has problems with too many decimals. The exception is
         value(s) for 'Curve', which is assumed to be integers and will not be rounded.
+
+        The rows are kept when set, and the table is only parsed again when the
+        GradientTable tag is changed in another way, so the table can be read and set
+        many times, e.g. in an optimisation loop, without parsing or writing the xml.
         """
+        row_list = self._set_gradient_rows()
+        if row_list is None:
+            gradient_xml = self["GradientTable"]
+            if (
+                self._parsed_gradient is None
+                or self._parsed_gradient[0] != gradient_xml
+            ):
+                self._parsed_gradient = (
+                    gradient_xml,
+                    self._parse_gradient_table(gradient_xml),
+                )
+            row_list = self._parsed_gradient[1]
+        # Copies, so changing the table doesn't change the method until it is set
+        return [dict(row) for row in row_list]
+
+    @staticmethod
+    def _parse_gradient_table(gradient_xml: str) -> List[Dict[str, str]]:
         gradient_table = []
-        e_tree = ET.fromstring(f"<root>{self['GradientTable']}</root>")
+        e_tree = ET.fromstring(f"<root>{gradient_xml}</root>")
         for gradient_row in e_tree:
             if gradient_row.tag != "GradientRow":
                 raise ValueError(
@@ -273,6 +745,48 @@ class SolventManagerMethod(EmpowerModuleMethod):
             gradient_table.append(row_dict)
         return gradient_table
 
+    def _outside_gradient_table(self, key_set: Set[str]) -> bool:
+        """
+        Whether the tags are outside the gradient table, from the tag index, if the
+        pending changes don't move any tags out of or into the table.
+        """
+        if not key_set:
+            return True
+        if self._tag_index is None or self._current_xml is None:
+            return False
+        for change in self._change_list[self._applied_count :]:
+            if not isinstance(change, _GradientEdit) and (
+                not isinstance(change, TagEdit) or _TAG_PATTERN.search(change.Value)
+            ):
+                return False
+        try:
+            start, end = self._tag_index.span("GradientTable")
+        except (KeyError, ValueError):
+            return False
+        return not any(self._overlaps(key, start, end) for key in key_set)
+
+    def _set_gradient_rows(self) -> Optional[List[Dict[str, str]]]:
+        """
+        The rows of the gradient table, if it was last set with `gradient_table`, and
+        the changes since then don't touch the table.
+        """
+        later_key_set: Set[str] = set()
+        for change in reversed(self._change_list):
+            if isinstance(change, _GradientEdit):
+                if later_key_set & change.tags or not self._outside_gradient_table(
+                    later_key_set
+                ):
+                    return None
+                return change.row_list
+            if (
+                not isinstance(change, TagEdit)
+                or change.Key == "GradientTable"
+                or _TAG_PATTERN.search(change.Value)
+            ):
+                return None
+            later_key_set.add(change.Key)
+        return None
+
     @gradient_table.setter
     def gradient_table(
         self, new_gradient_table: List[Dict[str, Union[str, float, int]]]
@@ -301,23 +815,24 @@ class SolventManagerMethod(EmpowerModuleMethod):
                     f"got {new_gradient_table[0]['Time']}."
                 )
         new_gradient_table[0]["Curve"] = "Initial"
-        xml = ET.Element("GradientTable")
+        row_list = []
         for row in new_gradient_table:
-            row_xml = ET.SubElement(xml, "GradientRow")
-            curve = row.get("Curve", "6")
-            ET.SubElement(row_xml, "Time").text = self._round(row["Time"])
-            ET.SubElement(row_xml, "Flow").text = self._round(row["Flow"])
-            # "6" is linear, which covers 90% of the use cases
+            row_dict = {
+                "Time": self._round(row["Time"]),
+                "Flow": self._round(row["Flow"]),
+            }
             for line in self.solvent_lines:
                 line_name = f"Composition{line}"
-                ET.SubElement(row_xml, line_name).text = self._round(row[line_name])
-            ET.SubElement(row_xml, "Curve").text = str(curve)
+                row_dict[line_name] = self._round(row[line_name])
+            # "6" is linear, which covers 90% of the use cases
+            row_dict["Curve"] = str(row.get("Curve", "6"))
             # Consider validating curve (1-11)
-        gradient_xml = ET.tostring(xml, encoding="unicode")
-        gradient_xml = gradient_xml.replace("<GradientTable>", "").replace(
-            "</GradientTable>", ""
-        )  # Stripping root tag, as it is set by __setitem__()
-        self["GradientTable"] = gradient_xml
+            for value in row_dict.values():
+                self._check_decimals(value)
+            row_list.append(row_dict)
+        self._check_key("GradientTable")
+        # The xml of the rows is made when the method is next needed
+        self._add_tag_edit(_GradientEdit(row_list))
 
 
 class BSMMethod(SolventManagerMethod):
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+
+from .data_types import HplcResult, StatusChange
+from .status_watcher import StatusWatcher
+
+logger = logging.getLogger(__name__)
+
+
+class ExperimentRun:
+    """
+    A sample set run started by `EmpowerHandler.RunExperiment`.
+
+    The run is followed with the shared `StatusWatcher` of its system, so following
+    many runs doesn't need a thread per run. The run is seen as started when the system
+    is not idle and runs the sample set, and as finished when the system is idle again
+    or runs another sample set. Statuses polled before the run was started are
+    ignored, so an earlier run of a sample set with the same name is not taken for
+    this run.
+
+    Call `wait` to wait for the run to finish, or `await` the run with asyncio.
+
+    :ivar sample_set_method: Name of the sample set method that is run.
+    :ivar sample_set_name: Name of the sample set.
+    :ivar node: Name of the node the system is on.
+    :ivar system: Name of the chromatographic system running the sample set.
+    :ivar StartTime: When the run was seen to start. None if it hasn't started yet.
+    :ivar EndTime: When the run was seen to finish. None if it hasn't finished yet.
+    :ivar start_timeout: Seconds to wait for the run to start. None to wait for as long
+        as it takes.
+    """
+
+    def __init__(
+        self,
+        sample_set_method: str,
+        sample_set_name: str,
+        node: str,
+        system: str,
+        watcher: StatusWatcher,
+        since: Optional[datetime] = None,
+        start_timeout: Optional[float] = 600,
+    ) -> None:
+        """
+        Start following a run.
+
+        :param sample_set_method: Name of the sample set method that is run.
+        :param sample_set_name: Name of the sample set.
+        :param node: Name of the node the system is on.
+        :param system: Name of the chromatographic system running the sample set.
+        :param watcher: The watcher of the status of the system.
+        :param since: When the run was started. Statuses polled before are ignored. If
+            not given, now.
+        :param start_timeout: Seconds to wait for the run to start. If it hasn't
+            started by then, the run finishes with a `TimeoutError`, and the system is
+            no longer polled for it, whether the run is waited for or not. None to wait
+            for as long as it takes.
+        """
+        self.sample_set_method = sample_set_method
+        self.sample_set_name = sample_set_name
+        self.node = node
+        self.system = system
+        self.StartTime: Optional[datetime] = None
+        self.EndTime: Optional[datetime] = None
+        self.start_timeout = start_timeout
+        self._since = since or datetime.now()
+        self._start_deadline = (
+            None if start_timeout is None else time.monotonic() + start_timeout
+        )
+        self._idle_states = watcher.idle_states
+        self._error: Optional[Exception] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._done_callbacks: List[Callable[[], None]] = []
+        self._subscription = watcher.subscribe(
+            callback=self._on_change, poll_callback=self._check_start
+        )
+        watcher.wake()  # Polling often from the start, so the start is not missed
+
+    def done(self) -> bool:
+        """Whether the run has finished, or can no longer be followed."""
+        return self._done.is_set()
+
+    def result(self) -> HplcResult:
+        """
+        Get the result of the finished run.
+
+        :raises RuntimeError: If the run has not finished, or the status of the system
+            stopped being watched before it finished.
+        """
+        if not self.done():
+            raise RuntimeError(f"Sample set {self.sample_set_name} has not finished")
+        if self._error is not None:
+            raise self._error
+        return HplcResult(
+            StartTime=self.StartTime,
+            EndTime=self.EndTime,
+            PerformedExperiment=self.sample_set_method,
+            Data=self.sample_set_name,
+        )
+
+    def wait(self, timeout: Optional[float] = None) -> HplcResult:
+        """
+        Wait for the run to finish.
+
+        :param timeout: Seconds to wait. If None, wait until the run finishes, or
+            until the start timeout if it doesn't start.
+
+        :return: The result, with the start and end time of the run.
+        :raises TimeoutError: If the run has not finished before the timeout, or has
+            not started before the start timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._done.wait(self._wait_time(deadline)):
+            self._check_start()
+            if not self.done() and deadline is not None:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError(
+                        f"Sample set {self.sample_set_name} on {self.system} did not "
+                        f"finish within {timeout} seconds"
+                    )
+        return self.result()
+
+    def cancel(self) -> None:
+        """Stop following the run. This does not stop the run in Empower."""
+        self._subscription.close()
+
+    def __await__(self):
+        return self._wait_async().__await__()
+
+    async def _wait_async(self) -> HplcResult:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_done() -> None:
+            if not future.done():
+                future.set_result(None)
+
+        self._add_done_callback(lambda: loop.call_soon_threadsafe(set_done))
+        while not self.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(future), self._wait_time(None))
+            except asyncio.TimeoutError:
+                self._check_start()
+        return self.result()
+
+    def _wait_time(self, deadline: Optional[float]) -> Optional[float]:
+        """Seconds to wait before checking the deadline, or the start deadline."""
+        if self.StartTime is None and self._start_deadline is not None:
+            if deadline is None or self._start_deadline < deadline:
+                deadline = self._start_deadline
+        if deadline is None:
+            return None
+        return max(deadline - time.monotonic(), 0)
+
+    def _check_start(self) -> None:
+        """Finish the run with a `TimeoutError` if it didn't start in time."""
+        if self.StartTime is not None or self._start_deadline is None:
+            return
+        if time.monotonic() >= self._start_deadline:
+            self._finish(
+                TimeoutError(
+                    f"Sample set {self.sample_set_name} on {self.system} did not "
+                    f"start within {self.start_timeout} seconds"
+                )
+            )
+
+    def _add_done_callback(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if not self._done.is_set():
+                self._done_callbacks.append(callback)
+                return
+        callback()
+
+    def _on_change(self, change: Optional[StatusChange]) -> None:
+        """Follow the run from the changes of the status of the system."""
+        if change is None:
+            if not self.done():
+                self._finish(
+                    RuntimeError(
+                        f"Stopped watching {self.system} before sample set "
+                        f"{self.sample_set_name} finished"
+                    )
+                )
+            return
+        if change.Error is not None or change.Time < self._since or self.done():
+            return
+        idle = change.Status.get("SystemState") in self._idle_states
+        running_sample_set = change.Status.get("SampleSetName")
+        if self.StartTime is None:
+            if not idle and running_sample_set == self.sample_set_name:
+                logger.debug("Sample set %s started", self.sample_set_name)
+                self.StartTime = change.Time
+        elif idle or running_sample_set not in (None, self.sample_set_name):
+            logger.debug("Sample set %s finished", self.sample_set_name)
+            self.EndTime = change.Time
+            self._finish()
+
+    def _finish(self, error: Optional[Exception] = None) -> None:
+        with self._lock:
+            if self._done.is_set():
+                return
+            self._error = error
+            self._done.set()
+            callback_list, self._done_callbacks = self._done_callbacks, []
+        for callback in callback_list:
+            callback()
+        self._subscription.close()
+
+    def __repr__(self):
+        return (
+            f"ExperimentRun({self.sample_set_name!r} on {self.system!r}, "
+            f"StartTime={self.StartTime}, EndTime={self.EndTime})"
+        )
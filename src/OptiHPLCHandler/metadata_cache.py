@@ -0,0 +1,115 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_TTLS = {
+    "GetMethodList": 60,
+    "GetSampleSetMethods": 60,
+    "GetNodeNames": 600,
+    "GetSystemNames": 600,
+    "GetPlateTypeNames": 3600,
+}
+"""Default seconds the result of each EmpowerHandler lookup is cached."""
+
+
+class MetadataCache:
+    """
+    Cache of the results of EmpowerHandler lookups, e.g. the list of methods or nodes,
+    so that repeated lookups don't need a request to Empower.
+
+    Each result is cached for the time to live (TTL) of its lookup. When the cache is
+    full, the least recently used result is removed.
+
+    The results are copied when they are returned, so changing a returned list doesn't
+    change the cache.
+
+    :ivar ttls: Seconds the result of each lookup is cached, by the name of the lookup.
+    :ivar default_ttl: Seconds the result of a lookup not in `ttls` is cached.
+    :ivar maxsize: The maximum number of results cached.
+    :ivar hits: The number of lookups answered from the cache.
+    :ivar misses: The number of lookups that were not in the cache.
+    """
+
+    def __init__(
+        self,
+        ttls: Optional[Mapping[str, float]] = None,
+        default_ttl: float = 300,
+        maxsize: int = 256,
+    ) -> None:
+        """
+        Initialize the MetadataCache.
+
+        :param ttls: Seconds the result of each lookup is cached, by the name of the
+            lookup, e.g. `{"GetNodeNames": 3600}`. Lookups not given use the time in
+            `DEFAULT_TTLS`. Set a time to 0 to not cache a lookup.
+        :param default_ttl: Seconds the result of a lookup not in `ttls` or
+            `DEFAULT_TTLS` is cached.
+        :param maxsize: The maximum number of results cached.
+        """
+        self.ttls: Dict[str, float] = {**DEFAULT_TTLS, **(ttls or {})}
+        self.default_ttl = default_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, Hashable], Tuple[float, Any]]" = (
+            OrderedDict()
+        )
+        # Increased by invalidate, so that results loaded before are not cached.
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get_or_load(self, lookup: str, key: Hashable, loader: Callable[[], T]) -> T:
+        """
+        Get a cached result, or load it and cache it if it is not cached.
+
+        :param lookup: The name of the lookup, e.g. `"GetMethodList"`.
+        :param key: The arguments of the lookup, identifying the result.
+        :param loader: Function loading the result from Empower.
+
+        :return: A copy of the result.
+        """
+        ttl = self.ttls.get(lookup, self.default_ttl)
+        cache_key = (lookup, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return copy.copy(entry[1])
+            self.misses += 1
+            generation = self._generation
+        logger.debug("No cached result for %s%s, getting it from Empower", lookup, key)
+        result = loader()
+        with self._lock:
+            if ttl > 0 and generation == self._generation:
+                self._entries[cache_key] = (time.monotonic() + ttl, result)
+                self._entries.move_to_end(cache_key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return copy.copy(result)
+
+    def invalidate(self, lookup: Optional[str] = None) -> None:
+        """
+        Remove cached results, so they are loaded again from Empower.
+
+        :param lookup: The name of the lookup to remove the results of, e.g.
+            `"GetMethodList"`. If None, all results are removed.
+        """
+        with self._lock:
+            self._generation += 1
+            if lookup is None:
+                self._entries.clear()
+            else:
+                for cache_key in [key for key in self._entries if key[0] == lookup]:
+                    del self._entries[cache_key]
+        logger.debug("Invalidated cached results of %s", lookup or "all lookups")
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,297 @@
+import bisect
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Set, Tuple
+
+from .data_types import MethodRecord
+
+logger = logging.getLogger(__name__)
+
+_MethodKey = Tuple[str, str]  # The type and name of a method
+
+
+def parse_method_records(
+    method_type: str, method_list: List[Mapping[str, Any]]
+) -> List[MethodRecord]:
+    """
+    Parse the list of methods returned by Empower, going over the fields of each method
+    once.
+
+    :param method_type: The type of the methods.
+    :param method_list: The methods, each with a list of `fields` with a name and a
+        value.
+
+    :return: The record of each method, in the order given.
+    :raises ValueError: If a method has no name, or more than one name.
+    """
+    record_list = []
+    for method in method_list:
+        field_dict: Dict[str, Any] = {}
+        name_count = 0
+        for field in method["fields"]:
+            if field["name"] == "Name":
+                name_count += 1
+            field_dict[field["name"]] = field["value"]
+        if name_count > 1:
+            logger.error("Multiple names found for a method.")
+            raise ValueError("Multiple names found for a method.")
+        if name_count == 0:
+            logger.error("No name found for a method.")
+            raise ValueError("No name found for a method.")
+        record_list.append(
+            MethodRecord(
+                Name=field_dict["Name"],
+                Type=method_type,
+                Date=field_dict.get("Date"),
+                Version=field_dict.get("Version"),
+                Fields=field_dict,
+            )
+        )
+    return record_list
+
+
+class MethodCatalogue:
+    """
+    Catalogue of the methods of a project, indexed by name, type and date, so that
+    checking if a method exists, or finding the methods starting with a prefix, doesn't
+    need a scan of the list of methods.
+
+    The methods of a type are loaded when the type is first used, and loaded again with
+    `refresh`, or when next used after `invalidate`. Only the methods that were added,
+    changed or removed since the last load are updated in the indexes.
+
+    Empower can give several methods of a type with the same name, e.g. versions of a
+    method. All of them are kept, and are added, changed or removed together by name.
+
+    :ivar method_types: The types of methods that have been loaded.
+    """
+
+    def __init__(self, loader: Callable[[str], List[Mapping[str, Any]]]) -> None:
+        """
+        Initialize the MethodCatalogue.
+
+        :param loader: Function getting the list of methods of a type from Empower,
+            e.g. `"MethodSetMethod"`, each with a list of `fields`.
+        """
+        self._loader = loader
+        # The records of each type, in the order given by Empower
+        self._record_lists: Dict[str, List[MethodRecord]] = {}
+        # The records of each type by name, in the order given by Empower
+        self._by_type: Dict[str, Dict[str, List[MethodRecord]]] = {}
+        # The records of each name, by type
+        self._by_name: Dict[str, Dict[str, List[MethodRecord]]] = {}
+        # The keys of the methods saved on each day, by the date part of their date
+        self._by_date: Dict[str, Set[_MethodKey]] = {}
+        # Sorted names of each type, for prefix queries. Made again when needed after
+        # a change.
+        self._sorted_names: Dict[Optional[str], List[str]] = {}
+        self._stale: Set[str] = set()
+        self._lock = threading.RLock()
+
+    @property
+    def method_types(self) -> List[str]:
+        """The types of methods that have been loaded."""
+        with self._lock:
+            return list(self._by_type)
+
+    def refresh(self, method_type: str) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Load the methods of a type from Empower again, and update the indexes with the
+        methods that were added, changed or removed.
+
+        :param method_type: The type of methods to load, e.g. `"MethodSetMethod"`.
+
+        :return: The names of the methods that were added, changed and removed.
+        """
+        record_list = parse_method_records(method_type, self._loader(method_type))
+        with self._lock:
+            old_dict = self._by_type.get(method_type, {})
+            new_dict: Dict[str, List[MethodRecord]] = {}
+            for record in record_list:
+                new_dict.setdefault(record.Name, []).append(record)
+            added_list, changed_list = [], []
+            for name, new_records in new_dict.items():
+                old_records = old_dict.get(name)
+                if old_records is None:
+                    added_list.append(name)
+                elif old_records != new_records:
+                    changed_list.append(name)
+                    self._unindex(old_records)
+                else:
+                    # Keeping the old records, so unchanged records stay the same
+                    new_dict[name] = old_records
+            removed_list = [name for name in old_dict if name not in new_dict]
+            for name in removed_list:
+                self._unindex(old_dict[name])
+            for name in added_list + changed_list:
+                self._index(new_dict[name])
+            # Keeping the order given by Empower
+            record_iters = {name: iter(records) for name, records in new_dict.items()}
+            self._record_lists[method_type] = [
+                next(record_iters[record.Name]) for record in record_list
+            ]
+            self._by_type[method_type] = new_dict
+            self._stale.discard(method_type)
+            if added_list or removed_list:
+                self._sorted_names.pop(method_type, None)
+                self._sorted_names.pop(None, None)
+        logger.debug(
+            "Refreshed %s: %s added, %s changed, %s removed",
+            method_type,
+            len(added_list),
+            len(changed_list),
+            len(removed_list),
+        )
+        return added_list, changed_list, removed_list
+
+    def invalidate(self, method_type: Optional[str] = None) -> None:
+        """
+        Mark methods as changed in Empower, so they are refreshed when next used.
+
+        :param method_type: The type of methods changed. If None, all loaded types are
+            refreshed when next used.
+        """
+        with self._lock:
+            if method_type is None:
+                self._stale.update(self._by_type)
+            elif method_type in self._by_type:
+                self._stale.add(method_type)
+
+    def names(self, method_type: str) -> List[str]:
+        """
+        The names of the methods of a type, in the order given by Empower. A name is
+        given once for each method with the name.
+
+        :param method_type: The type of methods, e.g. `"MethodSetMethod"`.
+        """
+        self._records(method_type)
+        with self._lock:
+            return [record.Name for record in self._record_lists[method_type]]
+
+    def get(
+        self, name: str, method_type: Optional[str] = None
+    ) -> Optional[MethodRecord]:
+        """
+        Get the record of a method.
+
+        :param name: Name of the method.
+        :param method_type: Type of the method. If not given, the method is looked up in
+            all loaded types, and the first found is returned.
+
+        :return: The record of the method, or None if there is no such method. If
+            there are several methods with the name, the first given by Empower.
+        """
+        record_list = self.get_all(name, method_type)
+        return record_list[0] if record_list else None
+
+    def get_all(
+        self, name: str, method_type: Optional[str] = None
+    ) -> List[MethodRecord]:
+        """
+        Get the records of all methods with a name.
+
+        :param name: Name of the methods.
+        :param method_type: Type of the methods. If not given, the methods are looked
+            up in all loaded types.
+
+        :return: The records of the methods, in the order given by Empower, by type.
+        """
+        if method_type is not None:
+            return list(self._records(method_type).get(name, ()))
+        self._refresh_stale()
+        with self._lock:
+            type_dict = self._by_name.get(name, {})
+            return [record for records in type_dict.values() for record in records]
+
+    def __contains__(self, name: str) -> bool:
+        """Whether a method with the name is in any of the loaded types."""
+        self._refresh_stale()
+        with self._lock:
+            return name in self._by_name
+
+    def with_prefix(self, prefix: str, method_type: Optional[str] = None) -> List[str]:
+        """
+        Find the methods with names starting with a prefix.
+
+        :param prefix: The start of the names.
+        :param method_type: Type of the methods. If not given, the methods of all loaded
+            types are searched.
+
+        :return: The sorted names of the methods.
+        """
+        if method_type is not None:
+            self._records(method_type)
+        else:
+            self._refresh_stale()
+        with self._lock:
+            sorted_names = self._sorted_names.get(method_type)
+            if sorted_names is None:
+                names = self._by_type[method_type] if method_type else self._by_name
+                sorted_names = self._sorted_names[method_type] = sorted(names)
+        start = bisect.bisect_left(sorted_names, prefix)
+        end = start
+        while end < len(sorted_names) and sorted_names[end].startswith(prefix):
+            end += 1
+        return sorted_names[start:end]
+
+    def saved_on(self, date: str) -> List[MethodRecord]:
+        """
+        Find the methods last saved on a day.
+
+        :param date: The day, in the format used by Empower, e.g. `"2024-01-31"`.
+
+        :return: The records of the methods of all loaded types.
+        """
+        self._refresh_stale()
+        with self._lock:
+            return [
+                record
+                for method_type, name in sorted(self._by_date.get(date, ()))
+                for record in self._by_type[method_type][name]
+                if record.Date and str(record.Date)[:10] == date
+            ]
+
+    def _records(self, method_type: str) -> Dict[str, List[MethodRecord]]:
+        """The records of a type, loading them if they have not been loaded."""
+        with self._lock:
+            record_dict = self._by_type.get(method_type)
+            stale = method_type in self._stale
+        if record_dict is None or stale:
+            self.refresh(method_type)
+            with self._lock:
+                record_dict = self._by_type[method_type]
+        return record_dict
+
+    def _refresh_stale(self) -> None:
+        with self._lock:
+            stale_list = list(self._stale)
+        for method_type in stale_list:
+            self.refresh(method_type)
+
+    def _index(self, record_list: List[MethodRecord]) -> None:
+        """Index the records of the methods of a type with the same name."""
+        name, method_type = record_list[0].Name, record_list[0].Type
+        self._by_name.setdefault(name, {})[method_type] = record_list
+        for record in record_list:
+            if record.Date:
+                day = str(record.Date)[:10]
+                self._by_date.setdefault(day, set()).add((method_type, name))
+
+    def _unindex(self, record_list: List[MethodRecord]) -> None:
+        """Remove the records of the methods of a type with the same name."""
+        name, method_type = record_list[0].Name, record_list[0].Type
+        type_dict = self._by_name.get(name, {})
+        type_dict.pop(method_type, None)
+        if not type_dict:
+            self._by_name.pop(name, None)
+        for record in record_list:
+            if record.Date:
+                day = str(record.Date)[:10]
+                key_set = self._by_date.get(day, set())
+                key_set.discard((method_type, name))
+                if not key_set:
+                    self._by_date.pop(day, None)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(record_list) for record_list in self._record_lists.values())
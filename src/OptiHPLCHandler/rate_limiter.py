@@ -0,0 +1,170 @@
+import logging
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Limits the rate of requests to an Empower server, and the number of requests
+    running at the same time.
+
+    The rate is limited with a token bucket: the bucket holds at most `burst` tokens,
+    and is refilled with `requests_per_second` tokens per second. Each request takes a
+    token, and waits for one if the bucket is empty. This allows short bursts of
+    requests, while keeping the average rate below `requests_per_second`.
+
+    Use the limiter as a context manager around each request, e.g.
+    `with rate_limiter: session.get(...)`.
+
+    :ivar requests_per_second: The maximum average number of requests per second. None
+        if the rate is not limited.
+    :ivar burst: The maximum number of requests that can be started at once, if no
+        requests have been made for a while.
+    :ivar max_in_flight: The maximum number of requests running at the same time. None
+        if the number is not limited.
+    :ivar throttle_time: The total time in seconds requests have waited for the limiter.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: Optional[float] = None,
+        max_in_flight: Optional[int] = None,
+        burst: Optional[float] = None,
+    ) -> None:
+        """
+        Initialize the RateLimiter.
+
+        :param requests_per_second: The maximum average number of requests per second.
+            If None, the rate is not limited.
+        :param max_in_flight: The maximum number of requests running at the same time.
+            If None, the number is not limited.
+        :param burst: The maximum number of requests that can be started at once. If
+            None, it is equal to `requests_per_second`, but at least 1.
+        """
+        if requests_per_second is not None and requests_per_second <= 0:
+            raise ValueError("requests_per_second must be positive")
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if burst is None:
+            burst = max(1.0, requests_per_second or 1.0)
+        elif burst < 1:
+            raise ValueError("burst must be at least 1")
+        self.requests_per_second = requests_per_second
+        self.max_in_flight = max_in_flight
+        self.burst = burst
+        self.throttle_time = 0.0
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self._semaphore: Optional[threading.BoundedSemaphore] = None
+        if max_in_flight is not None:
+            self._semaphore = threading.BoundedSemaphore(max_in_flight)
+
+    def acquire(self) -> None:
+        """Wait until a request may be made. Call `release` when it is done."""
+        start_time = time.monotonic()
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+        try:
+            self._take_token()
+        except BaseException:
+            self.release()
+            raise
+        waited = time.monotonic() - start_time
+        if waited > 0.001:
+            logger.debug("Request throttled for %.3f seconds", waited)
+            with self._lock:
+                self.throttle_time += waited
+
+    def release(self) -> None:
+        """Mark a request as done."""
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    def _take_token(self) -> None:
+        if self.requests_per_second is None:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._last_refill) * self.requests_per_second,
+                )
+                self._last_refill = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.requests_per_second
+            time.sleep(wait_time)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+    def __repr__(self):
+        return (
+            f"RateLimiter(requests_per_second={self.requests_per_second}, "
+            f"max_in_flight={self.max_in_flight}, burst={self.burst})"
+        )
+
+
+_unlimited = RateLimiter()
+_rate_limiters: Dict[str, RateLimiter] = {}
+# The rate limiter for each address, shared by all connections in the process.
+_rate_limiters_lock = threading.Lock()
+
+
+def configure_rate_limit(
+    address: str,
+    requests_per_second: Optional[float] = None,
+    max_in_flight: Optional[int] = None,
+    burst: Optional[float] = None,
+) -> RateLimiter:
+    """
+    Limit the requests to an Empower server, for all connections in this process.
+
+    Requests already waiting for the previous limiter of the address are not affected.
+
+    :param address: The address of the Empower server.
+    :param requests_per_second: The maximum average number of requests per second. If
+        None, the rate is not limited.
+    :param max_in_flight: The maximum number of requests running at the same time. If
+        None, the number is not limited.
+    :param burst: The maximum number of requests that can be started at once. If None,
+        it is equal to `requests_per_second`, but at least 1.
+
+    :return: The new rate limiter of the address.
+    """
+    rate_limiter = RateLimiter(
+        requests_per_second=requests_per_second,
+        max_in_flight=max_in_flight,
+        burst=burst,
+    )
+    with _rate_limiters_lock:
+        _rate_limiters[address.rstrip("/")] = rate_limiter
+    logger.debug("Configured %r for %s", rate_limiter, address)
+    return rate_limiter
+
+
+def get_rate_limiter(address: str) -> RateLimiter:
+    """
+    Get the rate limiter of an Empower server. If no limit has been configured for the
+    address, a limiter that doesn't limit anything is returned.
+
+    :param address: The address of the Empower server.
+    """
+    with _rate_limiters_lock:
+        return _rate_limiters.get(address.rstrip("/"), _unlimited)
+
+
+def clear_rate_limits() -> None:
+    """Remove the limits of all Empower servers."""
+    with _rate_limiters_lock:
+        _rate_limiters.clear()
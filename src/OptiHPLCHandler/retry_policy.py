@@ -0,0 +1,149 @@
+import logging
+import random
+import threading
+from typing import Dict, Iterable, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy:
+    """
+    Policy for retrying requests to Empower that failed with a transient error, i.e. a
+    timeout, a connection error, or one of the status codes in `retry_status_codes`.
+
+    The wait before each retry grows exponentially, `backoff_factor * 2 ** (n - 1)`
+    seconds before retry number n, up to `max_backoff` seconds. With jitter, the wait is
+    drawn uniformly between 0 and that value, so that clients that failed at the same
+    time don't retry at the same time.
+
+    Only the methods in `retry_methods` are retried. By default, that is only GET, since
+    retrying a POST that reached Empower before failing could e.g. create a sample set
+    twice.
+
+    :ivar max_attempts: The maximum number of attempts, including the first one.
+    :ivar backoff_factor: The wait in seconds before the first retry, without jitter.
+    :ivar max_backoff: The maximum wait in seconds before a retry.
+    :ivar jitter: Whether to randomise the wait before a retry.
+    :ivar retry_status_codes: The HTTP status codes that are retried.
+    :ivar retry_methods: The HTTP methods that are retried, in lower case.
+    :ivar endpoint_max_attempts: Maximum number of attempts for specific endpoints. The
+        keys are endpoint prefixes, e.g. `acquisition/`, and the longest matching prefix
+        is used.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        backoff_factor: float = 0.5,
+        max_backoff: float = 30,
+        jitter: bool = True,
+        retry_status_codes: Iterable[int] = (502, 503, 504),
+        retry_methods: Iterable[str] = ("get",),
+        endpoint_max_attempts: Optional[Mapping[str, int]] = None,
+    ) -> None:
+        """
+        Initialize the RetryPolicy.
+
+        :param max_attempts: The maximum number of attempts, including the first one.
+            Set to 1 to disable retries.
+        :param backoff_factor: The wait in seconds before the first retry, without
+            jitter. The wait is doubled for each following retry.
+        :param max_backoff: The maximum wait in seconds before a retry.
+        :param jitter: Whether to randomise the wait before a retry.
+        :param retry_status_codes: The HTTP status codes that are retried.
+        :param retry_methods: The HTTP methods that are retried. Add "post" to also
+            retry posts, but only do that if posting twice is harmless.
+        :param endpoint_max_attempts: Maximum number of attempts for specific
+            endpoints, overriding `max_attempts`. The keys are endpoint prefixes, e.g.
+            `{"acquisition/chromatographic-system-status": 5}`.
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_status_codes = frozenset(retry_status_codes)
+        self.retry_methods = frozenset(method.lower() for method in retry_methods)
+        self.endpoint_max_attempts = dict(endpoint_max_attempts or {})
+
+    def max_attempts_for(self, method: str, endpoint: str) -> int:
+        """
+        The maximum number of attempts for a request.
+
+        :param method: The HTTP method of the request.
+        :param endpoint: The endpoint of the request, without the address.
+        """
+        if method.lower() not in self.retry_methods:
+            return 1
+        endpoint = endpoint.lstrip("/")
+        matching_prefix_list = [
+            prefix
+            for prefix in self.endpoint_max_attempts
+            if endpoint.startswith(prefix.lstrip("/"))
+        ]
+        if matching_prefix_list:
+            return self.endpoint_max_attempts[max(matching_prefix_list, key=len)]
+        return self.max_attempts
+
+    def should_retry_status(self, status_code: int) -> bool:
+        """Whether a response with this status code should be retried."""
+        return status_code in self.retry_status_codes
+
+    def backoff(self, retry_number: int, retry_after: Optional[float] = None) -> float:
+        """
+        The wait in seconds before a retry.
+
+        :param retry_number: The number of the retry, starting from 1.
+        :param retry_after: The wait requested by the server in the Retry-After header,
+            if any. The wait is at least this long, but never longer than
+            `max_backoff`.
+        """
+        backoff = min(self.max_backoff, self.backoff_factor * 2 ** (retry_number - 1))
+        if self.jitter:
+            backoff = random.uniform(0, backoff)
+        if retry_after is not None:
+            backoff = max(backoff, retry_after)
+        return min(backoff, self.max_backoff)
+
+
+class RetryStatistics:
+    """
+    Counters for the retries made by a connection, to show how much latency retries
+    add.
+
+    :ivar request_count: The number of requests made, not counting retries.
+    :ivar retry_count: The number of retries made.
+    :ivar retry_wait_time: The total time in seconds spent waiting before retries.
+    :ivar retries_by_endpoint: The number of retries for each endpoint, without query
+        parameters.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Set all counters to zero."""
+        with self._lock:
+            self.request_count = 0
+            self.retry_count = 0
+            self.retry_wait_time = 0.0
+            self.retries_by_endpoint: Dict[str, int] = {}
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.request_count += 1
+
+    def record_retry(self, endpoint: str, wait_time: float) -> None:
+        endpoint = endpoint.lstrip("/").split("?")[0]
+        with self._lock:
+            self.retry_count += 1
+            self.retry_wait_time += wait_time
+            self.retries_by_endpoint[endpoint] = (
+                self.retries_by_endpoint.get(endpoint, 0) + 1
+            )
+
+    def __str__(self):
+        return (
+            f"{self.retry_count} retries for {self.request_count} requests, "
+            f"waiting {self.retry_wait_time:.1f} seconds in total"
+        )
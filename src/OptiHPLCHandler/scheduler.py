@@ -0,0 +1,139 @@
+import heapq
+import logging
+from typing import Any, List, Mapping, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+def sample_run_times(
+    sample_list: Sequence[Mapping[str, Any]], run_time_field: str = "RunTime"
+) -> List[float]:
+    """
+    Get the estimated run time of each sample from its run time field.
+
+    Samples without a run time are estimated to take the mean run time of the other
+    samples, or 1 if no sample has a run time.
+
+    :param sample_list: The samples.
+    :param run_time_field: The name of the field with the run time of a sample.
+
+    :return: The run time of each sample.
+    """
+    run_time_list: List[Optional[float]] = []
+    for sample in sample_list:
+        run_time = sample.get(run_time_field)
+        run_time_list.append(None if run_time in (None, "") else float(run_time))
+    known_list = [run_time for run_time in run_time_list if run_time is not None]
+    default_run_time = sum(known_list) / len(known_list) if known_list else 1.0
+    return [
+        default_run_time if run_time is None else run_time for run_time in run_time_list
+    ]
+
+
+def split_samples(run_times: Sequence[float], chunk_count: int) -> List[List[int]]:
+    """
+    Split the samples into `chunk_count` chunks of consecutive samples, with
+    about the same total run time.
+
+    :param run_times: The run time of each sample.
+    :param chunk_count: The number of chunks. If there are fewer samples, each
+        sample is a chunk.
+
+    :return: The positions of the samples in each chunk.
+    """
+    chunk_count = max(1, min(chunk_count, len(run_times)))
+    total_time = sum(run_times)
+    if total_time <= 0:
+        # Without run times, splitting by the number of samples instead
+        run_times = [1.0] * len(run_times)
+        total_time = float(len(run_times))
+    target_time = total_time / chunk_count
+    chunk_list: List[List[int]] = []
+    chunk: List[int] = []
+    elapsed_time = 0.0
+    for position, run_time in enumerate(run_times):
+        chunk.append(position)
+        elapsed_time += run_time
+        # Cutting where the chunk reaches its share of the total time, so that the
+        # error of one chunk is not carried over to the next, or where the samples
+        # left are needed to fill the other chunks.
+        chunks_left = chunk_count - len(chunk_list) - 1
+        if chunks_left > 0 and (
+            elapsed_time >= (len(chunk_list) + 1) * target_time
+            or len(run_times) - position - 1 <= chunks_left
+        ):
+            chunk_list.append(chunk)
+            chunk = []
+    if chunk:
+        chunk_list.append(chunk)
+    return chunk_list
+
+
+def assign_chunks(
+    chunks: Sequence[Sequence[int]],
+    run_times: Sequence[float],
+    loads: Sequence[float],
+) -> List[List[int]]:
+    """
+    Assign chunks of samples to systems, so that all systems finish as early as
+    possible.
+
+    The longest chunk is assigned first, each to the system that will be done first
+    (longest processing time first scheduling).
+
+    :param chunks: The positions of the samples in each chunk.
+    :param run_times: The run time of each sample.
+    :param loads: The time until each system is free, e.g. 0 for idle systems.
+
+    :return: The positions of the samples assigned to each system, in their original
+        order.
+    """
+    chunk_time_list = [
+        sum(run_times[position] for position in chunk) for chunk in chunks
+    ]
+    heap = [(load, system_num) for system_num, load in enumerate(loads)]
+    heapq.heapify(heap)
+    assigned_list: List[List[int]] = [[] for _ in loads]
+    for chunk_num in sorted(
+        range(len(chunks)), key=lambda num: chunk_time_list[num], reverse=True
+    ):
+        load, system_num = heapq.heappop(heap)
+        assigned_list[system_num].extend(chunks[chunk_num])
+        heapq.heappush(heap, (load + chunk_time_list[chunk_num], system_num))
+    return [sorted(assigned) for assigned in assigned_list]
+
+
+def plan_sample_sets(
+    run_times: Sequence[float],
+    loads: Sequence[float],
+    chunks_per_system: int = 4,
+) -> List[List[int]]:
+    """
+    Plan how to share samples between systems, to finish all of them as early as
+    possible.
+
+    The samples are split into chunks of consecutive samples, a few per system, and the
+    chunks are assigned to the systems with `assign_chunks`. Splitting in more chunks
+    than systems lets the chunks even out the time until each system is free.
+
+    :param run_times: The estimated run time of each sample.
+    :param loads: The time until each system is free, e.g. 0 for idle systems.
+    :param chunks_per_system: The number of chunks to split the samples in per system.
+
+    :return: The positions of the samples to run on each system, in their original
+        order. Systems that get no samples have an empty list.
+    """
+    if not loads:
+        raise ValueError("No systems to run the samples on")
+    chunks = split_samples(run_times, len(loads) * chunks_per_system)
+    assigned_list = assign_chunks(chunks, run_times, loads)
+    logger.debug(
+        "Planned %s samples on %s systems, finishing after %s",
+        len(run_times),
+        len(loads),
+        max(
+            load + sum(run_times[position] for position in assigned)
+            for load, assigned in zip(loads, assigned_list)
+        ),
+    )
+    return assigned_list
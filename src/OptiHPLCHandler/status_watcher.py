@@ -0,0 +1,499 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .data_types import StatusChange
+
+logger = logging.getLogger(__name__)
+
+
+def diff_status(
+    old_status: Dict[str, str], new_status: Dict[str, str]
+) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    Find the entries that differ between two statuses.
+
+    :param old_status: The old status.
+    :param new_status: The new status.
+
+    :return: The old and new value of each entry that was changed, added or removed.
+    """
+    return {
+        key: (old_status.get(key), new_status.get(key))
+        for key in {**old_status, **new_status}
+        if old_status.get(key) != new_status.get(key)
+    }
+
+
+class StatusSubscription:
+    """
+    The changes of the status of a chromatographic system, delivered by a
+    `StatusWatcher`.
+
+    Iterate over the subscription to get the changes as they happen, e.g.
+    `for change in subscription:...`. The iteration ends when the subscription is
+    closed. Close the subscription when done, or use it as a context manager.
+    """
+
+    def __init__(self, watcher: "StatusWatcher") -> None:
+        self.watcher = watcher
+        self._queue: "queue.Queue[Optional[StatusChange]]" = queue.Queue()
+        self.closed = False
+
+    def get(self, timeout: Optional[float] = None) -> StatusChange:
+        """
+        Wait for the next change.
+
+        :param timeout: Seconds to wait for the change. If None, wait until there is a
+            change.
+
+        :raises TimeoutError: If there is no change before the timeout.
+        :raises StopIteration: If the subscription is closed.
+        """
+        try:
+            change = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(
+                f"No change of {self.watcher.system} within {timeout} seconds"
+            ) from None
+        if change is None:
+            self._queue.put(None)  # So later calls also stop
+            raise StopIteration
+        return change
+
+    def close(self) -> None:
+        """Stop receiving changes."""
+        if not self.closed:
+            self.closed = True
+            self.watcher.unsubscribe(self)
+            self._deliver(None)
+
+    def _deliver(self, change: Optional[StatusChange]) -> None:
+        self._queue.put(change)
+
+    def _polled(self) -> None:
+        """Called after each poll of the status, whether it changed or not."""
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> StatusChange:
+        return self.get()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncStatusSubscription(StatusSubscription):
+    """
+    Asyncio version of `StatusSubscription`. Iterate over it with `async for`. It must
+    be created in the event loop it is used in.
+    """
+
+    def __init__(self, watcher: "StatusWatcher") -> None:
+        super().__init__(watcher)
+        self._loop = asyncio.get_running_loop()
+        self._async_queue: "asyncio.Queue[Optional[StatusChange]]" = asyncio.Queue()
+
+    def _deliver(self, change: Optional[StatusChange]) -> None:
+        try:
+            # The changes are delivered from the thread of the watcher.
+            self._loop.call_soon_threadsafe(self._async_queue.put_nowait, change)
+        except RuntimeError:
+            logger.debug("Event loop closed, dropping status change")
+
+    async def get_async(self, timeout: Optional[float] = None) -> StatusChange:
+        """
+        Wait for the next change.
+
+        :param timeout: Seconds to wait for the change. If None, wait until there is a
+            change.
+
+        :raises TimeoutError: If there is no change before the timeout.
+        :raises StopAsyncIteration: If the subscription is closed.
+        """
+        try:
+            change = await asyncio.wait_for(self._async_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(
+                f"No change of {self.watcher.system} within {timeout} seconds"
+            ) from None
+        if change is None:
+            self._async_queue.put_nowait(None)
+            raise StopAsyncIteration
+        return change
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> StatusChange:
+        return await self.get_async()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class CallbackSubscription(StatusSubscription):
+    """
+    Subscription calling a function with each change, instead of queueing it. The
+    function is called in a thread of the `StatusPoller`, so it must be quick, and
+    with None when the subscription is closed. Another function can be called after
+    each poll, e.g. to give up on something that should have happened by then.
+    """
+
+    def __init__(
+        self,
+        watcher: "StatusWatcher",
+        callback: Callable[[Optional[StatusChange]], None],
+        poll_callback: Optional[Callable[[], None]] = None,
+    ) -> None:
+        super().__init__(watcher)
+        self._callback = callback
+        self._poll_callback = poll_callback
+
+    def _deliver(self, change: Optional[StatusChange]) -> None:
+        try:
+            self._callback(change)
+        except Exception:
+            logger.exception("Status change callback failed")
+
+    def _polled(self) -> None:
+        if self._poll_callback is None:
+            return
+        try:
+            self._poll_callback()
+        except Exception:
+            logger.exception("Status poll callback failed")
+
+
+class StatusPoller:
+    """
+    Schedules the polls of many `StatusWatcher`s with one thread, and makes the polls
+    in a small pool of threads, so that watching many systems doesn't need a thread
+    per system.
+
+    The scheduling thread runs while there are polls scheduled. Each `EmpowerHandler`
+    has its own poller, so slow polls of one handler don't hold up the others.
+
+    :ivar max_workers: The maximum number of polls made at the same time.
+    """
+
+    def __init__(self, max_workers: int = 4) -> None:
+        """
+        Initialize the StatusPoller.
+
+        :param max_workers: The maximum number of polls made at the same time.
+        """
+        self.max_workers = max_workers
+        self._heap: List[Tuple[float, int, "StatusWatcher"]] = []
+        self._due: Dict["StatusWatcher", float] = {}
+        # The time each watcher is due to be polled. Entries in the heap with another
+        # time have been rescheduled, and are skipped.
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def schedule(self, watcher: "StatusWatcher", delay: float) -> None:
+        """
+        Schedule a poll of a watcher, replacing any poll already scheduled for it.
+
+        :param watcher: The watcher to poll.
+        :param delay: Seconds until the poll.
+        """
+        due = time.monotonic() + delay
+        with self._condition:
+            self._due[watcher] = due
+            heapq.heappush(self._heap, (due, next(self._counter), watcher))
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="StatusPoller"
+                )
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._schedule_loop, name="StatusPoller", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+
+    def cancel(self, watcher: "StatusWatcher") -> None:
+        """Cancel the poll scheduled for a watcher, if any."""
+        with self._condition:
+            self._due.pop(watcher, None)
+            self._condition.notify()
+
+    def close(self) -> None:
+        """
+        Stop the threads making the polls, once the running polls are done. They are
+        started again if a poll is scheduled.
+        """
+        with self._condition:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def _schedule_loop(self) -> None:
+        while True:
+            watcher = self._next_due()
+            if watcher is None:
+                return
+            with self._condition:
+                executor = self._executor
+            try:
+                if executor is None:
+                    raise RuntimeError("Poller closed")
+                executor.submit(watcher._run_poll)
+            except RuntimeError:  # Closed, or shut down while submitting
+                logger.debug("Poller closed, not polling %s", watcher.system)
+
+    def _next_due(self) -> Optional["StatusWatcher"]:
+        """Wait for the next watcher to be due. None if no polls are scheduled."""
+        with self._condition:
+            while True:
+                if not self._due:
+                    self._heap.clear()
+                    self._thread = None
+                    return None
+                due, _, watcher = self._heap[0]
+                now = time.monotonic()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                heapq.heappop(self._heap)
+                if self._due.get(watcher) == due:
+                    del self._due[watcher]
+                    return watcher
+
+
+_default_poller = StatusPoller()
+
+
+class StatusWatcher:
+    """
+    Watches the status of a chromatographic system by polling it, and delivers the
+    changes to all its subscriptions. However many subscriptions there are, the status
+    is only polled once.
+
+    The polling adapts to the state of the system: while the system is running, the
+    status is polled every `busy_interval` seconds. While it is idle, the interval is
+    multiplied by `backoff_factor` after each poll without changes, up to
+    `idle_interval` seconds.
+
+    The polls are scheduled by a `StatusPoller`, which can be shared by many watchers,
+    while there are subscriptions.
+
+    :ivar node: Name of the node the system is on.
+    :ivar system: Name of the chromatographic system.
+    :ivar busy_interval: Seconds between polls while the system is running.
+    :ivar idle_interval: The maximum number of seconds between polls while the system is
+        idle.
+    :ivar backoff_factor: How much the interval grows after each poll without changes
+        while the system is idle.
+    :ivar idle_states: The values of `SystemState` meaning that the system is idle.
+    :ivar status: The last known status. None if it has not been polled yet.
+    :ivar status_time: When the last known status was polled.
+    """
+
+    def __init__(
+        self,
+        get_status: Callable[[str, str], Dict[str, str]],
+        node: str,
+        system: str,
+        busy_interval: float = 2,
+        idle_interval: float = 60,
+        backoff_factor: float = 2,
+        idle_states: Iterable[str] = ("Idle",),
+        poller: Optional[StatusPoller] = None,
+    ) -> None:
+        """
+        Initialize the StatusWatcher.
+
+        :param get_status: Function getting the status of a system, e.g.
+            `EmpowerHandler.GetStatus`.
+        :param node: Name of the node the system is on.
+        :param system: Name of the chromatographic system.
+        :param busy_interval: Seconds between polls while the system is running.
+        :param idle_interval: The maximum number of seconds between polls while the
+            system is idle.
+        :param backoff_factor: How much the interval grows after each poll without
+            changes while the system is idle.
+        :param idle_states: The values of `SystemState` meaning that the system is
+            idle.
+        :param poller: The poller scheduling the polls. If None, a poller shared by all
+            watchers in the process is used.
+        """
+        self._get_status = get_status
+        self.node = node
+        self.system = system
+        self.busy_interval = busy_interval
+        self.idle_interval = idle_interval
+        self.backoff_factor = backoff_factor
+        self.idle_states = frozenset(idle_states)
+        self.status: Optional[Dict[str, str]] = None
+        self.status_time: Optional[datetime] = None
+        self._poller = poller or _default_poller
+        self._subscriptions: List[StatusSubscription] = []
+        self._lock = threading.Lock()
+        self._interval = busy_interval
+        self._polling = False
+        self._wake_pending = False
+
+    @property
+    def running(self) -> bool:
+        """Whether the watcher is polling, i.e. whether it has subscriptions."""
+        return bool(self._subscriptions)
+
+    def subscribe(
+        self,
+        callback: Optional[Callable[[Optional[StatusChange]], None]] = None,
+        poll_callback: Optional[Callable[[], None]] = None,
+    ) -> StatusSubscription:
+        """
+        Get a subscription to the changes of the status.
+
+        :param callback: If given, this function is called with each change, instead
+            of the changes being queued in the subscription, see
+            `CallbackSubscription`.
+        :param poll_callback: If given with `callback`, this function is called after
+            each poll, whether the status changed or not.
+        """
+        if callback is not None:
+            return self._add_subscription(
+                CallbackSubscription(self, callback, poll_callback)
+            )
+        return self._add_subscription(StatusSubscription(self))
+
+    def subscribe_async(self) -> AsyncStatusSubscription:
+        """Get an asyncio subscription to the changes of the status."""
+        return self._add_subscription(AsyncStatusSubscription(self))
+
+    def _add_subscription(self, subscription):
+        with self._lock:
+            start = not self._subscriptions
+            self._subscriptions.append(subscription)
+            status, status_time = self.status, self.status_time
+            if start:
+                self._interval = self.busy_interval
+        if status is not None:
+            # Giving the new subscription the last known status to start from, with the
+            # time it was polled, so it can tell if the status is too old.
+            subscription._deliver(
+                self._make_change(status, diff_status({}, status), time=status_time)
+            )
+        if start:
+            logger.debug("Started watching %s on %s", self.system, self.node)
+            self._poller.schedule(self, 0)
+        return subscription
+
+    def unsubscribe(self, subscription: StatusSubscription) -> None:
+        """
+        Remove a subscription. When there are no subscriptions left, the polling stops.
+        """
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+            stop = not self._subscriptions
+        if stop:
+            logger.debug("Stopped watching %s on %s", self.system, self.node)
+            self._poller.cancel(self)
+
+    def wake(self) -> None:
+        """Poll at once, and then poll as if the system is running."""
+        with self._lock:
+            if not self._subscriptions:
+                return
+            self._interval = self.busy_interval
+            if self._polling:
+                # Polling again when the current poll is done
+                self._wake_pending = True
+                return
+        self._poller.schedule(self, 0)
+
+    def stop(self) -> None:
+        """Stop polling, and close all subscriptions."""
+        with self._lock:
+            subscription_list = list(self._subscriptions)
+        for subscription in subscription_list:
+            subscription.close()
+
+    def _run_poll(self) -> None:
+        """Poll the status, and schedule the next poll. Called by the poller."""
+        with self._lock:
+            if not self._subscriptions or self._polling:
+                return
+            self._polling = True
+        changed, idle = False, True
+        try:
+            changed, idle = self._poll()
+            with self._lock:
+                subscription_list = list(self._subscriptions)
+            for subscription in subscription_list:
+                subscription._polled()
+        finally:
+            with self._lock:
+                self._polling = False
+                if changed or not idle:
+                    self._interval = self.busy_interval
+                else:
+                    self._interval = min(
+                        self.idle_interval, self._interval * self.backoff_factor
+                    )
+                delay = 0 if self._wake_pending else self._interval
+                self._wake_pending = False
+                active = bool(self._subscriptions)
+        if active:
+            self._poller.schedule(self, delay)
+
+    def _poll(self) -> Tuple[bool, bool]:
+        """
+        Poll the status, and deliver the change, if any.
+
+        :return: Whether the status changed, and whether the system is idle.
+        """
+        try:
+            new_status = self._get_status(self.node, self.system)
+        except Exception as e:
+            logger.warning("Getting status of %s failed: %s", self.system, e)
+            self._publish(self._make_change(self.status or {}, {}, e))
+            return False, True  # Backing off, in case Empower is struggling
+        changes = diff_status(self.status or {}, new_status)
+        self.status = new_status
+        self.status_time = datetime.now()
+        if changes:
+            self._publish(self._make_change(new_status, changes, time=self.status_time))
+        return bool(changes), new_status.get("SystemState") in self.idle_states
+
+    def _make_change(
+        self,
+        status: Dict[str, str],
+        changes: Dict[str, Tuple[Optional[str], Optional[str]]],
+        error: Optional[Exception] = None,
+        time: Optional[datetime] = None,
+    ) -> StatusChange:
+        return StatusChange(
+            Node=self.node,
+            System=self.system,
+            Time=time or datetime.now(),
+            Status=dict(status),
+            Changes=changes,
+            Error=error,
+        )
+
+    def _publish(self, change: StatusChange) -> None:
+        with self._lock:
+            subscription_list = list(self._subscriptions)
+        for subscription in subscription_list:
+            subscription._deliver(change)
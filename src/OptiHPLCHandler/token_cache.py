@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCache:
+    """
+    File based cache of Empower session tokens, shared between processes.
+
+    A process that logs into Empower stores its token in the cache, and later processes
+    logging in with the same address, service, project and username reuse the token
+    instead of logging in again, as long as the token has not expired.
+
+    The cache file is only readable and writable by its owner, and is locked while it
+    is read or written, so several processes can use it at the same time.
+
+    :ivar path: The path of the cache file.
+    :ivar default_lifetime: How many seconds a token is assumed to be valid, if the
+        expiry time is not known.
+    :ivar lock_timeout: How many seconds to wait for the lock on the cache file.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        default_lifetime: float = 3600,
+        lock_timeout: float = 10,
+    ) -> None:
+        """
+        Initialize the TokenCache.
+
+        :param path: The path of the cache file. If None, the file `token_cache.json` in
+            the folder `.optihplchandler` in the home folder of the user is used.
+        :param default_lifetime: How many seconds a token is assumed to be valid, if the
+            expiry time can't be read from the token.
+        :param lock_timeout: How many seconds to wait for the lock on the cache file. A
+            lock older than this is assumed to be left by a process that crashed, and
+            is removed.
+        """
+        if path is None:
+            path = os.path.join(
+                os.path.expanduser("~"), ".optihplchandler", "token_cache.json"
+            )
+        self.path = path
+        self.default_lifetime = default_lifetime
+        self.lock_timeout = lock_timeout
+
+    @staticmethod
+    def make_key(
+        address: str, service: str, project: Optional[str], username: str
+    ) -> str:
+        """Make the key a token is stored under."""
+        return "|".join([address, service, project or "", username])
+
+    def get(self, key: str, margin: float = 0) -> Optional[Dict[str, str]]:
+        """
+        Get a cached token.
+
+        :param key: The key the token is stored under, see `make_key`.
+        :param margin: How many seconds the token must be valid for at least.
+
+        :return: A dict with the keys `token`, `session_id` and `expiry`, or None if no
+            valid token is cached.
+        """
+        with self._lock():
+            entry = self._read().get(key)
+        if entry is None:
+            logger.debug("No cached token found")
+            return None
+        if entry["expiry"] - margin <= time.time():
+            logger.debug("Cached token has expired")
+            return None
+        logger.debug("Found cached token")
+        return entry
+
+    def set(
+        self, key: str, token: str, session_id: str, expiry: Optional[float] = None
+    ) -> None:
+        """
+        Store a token in the cache.
+
+        :param key: The key to store the token under, see `make_key`.
+        :param token: The token.
+        :param session_id: The session ID of the token.
+        :param expiry: When the token expires, as a POSIX timestamp. If None, the token
+            is assumed to be valid for `default_lifetime` seconds.
+        """
+        if expiry is None:
+            expiry = time.time() + self.default_lifetime
+        with self._lock():
+            cache = self._read()
+            now = time.time()
+            cache = {
+                cache_key: entry
+                for cache_key, entry in cache.items()
+                if entry["expiry"] > now
+            }  # Removing the expired tokens, so the file doesn't keep growing.
+            cache[key] = {"token": token, "session_id": session_id, "expiry": expiry}
+            self._write(cache)
+        logger.debug("Stored token in cache")
+
+    def invalidate(self, key: str, token: Optional[str] = None) -> None:
+        """
+        Remove a token from the cache.
+
+        :param key: The key the token is stored under, see `make_key`.
+        :param token: If given, the cached token is only removed if it is this token.
+            This keeps a newer token stored by another process.
+        """
+        with self._lock():
+            cache = self._read()
+            if key not in cache:
+                return
+            if token is not None and cache[key]["token"] != token:
+                logger.debug("Cached token has already been replaced")
+                return
+            del cache[key]
+            self._write(cache)
+        logger.debug("Removed token from cache")
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, encoding="utf-8") as cache_file:
+                return json.load(cache_file)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            logger.warning("Token cache %s is corrupt, ignoring it", self.path)
+            return {}
+
+    def _write(self, cache: dict) -> None:
+        """Write the cache to a temporary file, and then replace the cache file."""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        file_descriptor, temporary_path = tempfile.mkstemp(dir=folder)
+        # mkstemp creates the file so that only the owner can read and write it.
+        try:
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as cache_file:
+                json.dump(cache, cache_file)
+            os.replace(temporary_path, self.path)
+        except BaseException:
+            os.remove(temporary_path)
+            raise
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        """
+        Lock the cache file by creating a lock file next to it. Creating a file that
+        doesn't exist is atomic on all platforms, so only one process gets the lock.
+        """
+        lock_path = self.path + ".lock"
+        os.makedirs(
+            os.path.dirname(os.path.abspath(lock_path)), mode=0o700, exist_ok=True
+        )
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                file_descriptor = os.open(
+                    lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600
+                )
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    self._remove_stale_lock(lock_path)
+                    deadline = time.monotonic() + self.lock_timeout
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(file_descriptor)
+            os.remove(lock_path)
+
+    def _remove_stale_lock(self, lock_path: str) -> None:
+        try:
+            lock_age = time.time() - os.path.getmtime(lock_path)
+        except FileNotFoundError:
+            return
+        if lock_age > self.lock_timeout:
+            logger.warning("Removing stale lock on token cache %s", self.path)
+            try:
+                os.remove(lock_path)
+            except FileNotFoundError:
+                pass
+        else:
+            raise TimeoutError(f"Could not lock token cache {self.path}")
@@ -0,0 +1,232 @@
+import asyncio
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+from OptiHPLCHandler import (
+    AsyncEmpowerConnection,
+    AsyncEmpowerHandler,
+    ExperimentJob,
+    ExperimentRun,
+)
+from OptiHPLCHandler.empower_api_core_async import DEFAULT_MAX_WORKERS
+
+
+class TestAsyncEmpowerConnection(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.mock_connection = MagicMock()
+        self.mock_connection.pool_maxsize = 4
+        self.connection = AsyncEmpowerConnection(self.mock_connection)
+
+    async def asyncTearDown(self) -> None:
+        await self.connection.close()
+
+    def test_max_workers(self):
+        # Not limited by the pool size of the wrapped connection
+        assert self.connection.max_workers == DEFAULT_MAX_WORKERS
+        assert AsyncEmpowerConnection(self.mock_connection, 2).max_workers == 2
+
+    async def test_requests_beyond_pool_size(self):
+        running = threading.Semaphore(0)
+        release = threading.Event()
+
+        def get(endpoint, timeout):
+            running.release()
+            release.wait(5)
+            return ([endpoint], None)
+
+        self.mock_connection.get.side_effect = get
+        task = asyncio.gather(*[self.connection.get(f"url_{num}") for num in range(8)])
+        # All 8 requests run at the same time, though 4 connections are kept open
+        for _ in range(8):
+            assert await asyncio.get_running_loop().run_in_executor(
+                None, running.acquire, True, 5
+            )
+        release.set()
+        assert len(await task) == 8
+
+    async def test_get(self):
+        self.mock_connection.get.return_value = (["test_result"], None)
+        response = await self.connection.get("test_url", timeout=5)
+        assert response == (["test_result"], None)
+        assert self.mock_connection.get.call_args[1] == {
+            "endpoint": "test_url",
+            "timeout": 5,
+        }
+
+    async def test_post(self):
+        self.mock_connection.post.return_value = (None, "test_message")
+        response = await self.connection.post("test_url", body={"test": "body"})
+        assert response == (None, "test_message")
+        assert self.mock_connection.post.call_args[1]["body"] == {"test": "body"}
+
+    async def test_login_logout(self):
+        await self.connection.login(username="test_user", password="test_password")
+        assert self.mock_connection.login.call_args[1] == {
+            "username": "test_user",
+            "password": "test_password",
+        }
+        await self.connection.logout()
+        assert self.mock_connection.logout.called
+
+    async def test_concurrent_requests(self):
+        # Verify that the requests are running at the same time, by making each request
+        # wait for all the others to start.
+        barrier = threading.Barrier(4, timeout=5)
+
+        def wait_for_others(endpoint, timeout):
+            barrier.wait()
+            return ([endpoint], None)
+
+        self.mock_connection.get.side_effect = wait_for_others
+        responses = await asyncio.gather(
+            *[self.connection.get(f"test_url_{num}") for num in range(4)]
+        )
+        assert [response[0] for response in responses] == [
+            [f"test_url_{num}"] for num in range(4)
+        ]
+
+    async def test_close(self):
+        await self.connection.get("test_url")
+        await self.connection.close()
+        assert self.mock_connection.close.called
+
+
+class TestAsyncEmpowerHandler(unittest.IsolatedAsyncioTestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, mock_connection) -> None:
+        mock_response = MagicMock()
+        mock_response.address = "https://test_address"
+        mock_response.username = "test_username"
+        mock_response.project = "test_project"
+        mock_response.pool_maxsize = 10
+        mock_connection.return_value = mock_response
+
+        self.handler = AsyncEmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.mock_connection = mock_response
+
+    def test_initialisation(self):
+        assert self.handler.project == "test_project"
+        assert self.handler.username == "test_username"
+        assert self.handler.address == "https://test_address"
+        assert self.handler.auto_login is True
+
+    async def test_context_management(self):
+        async with self.handler as handler:
+            assert handler is self.handler
+        assert self.mock_connection.login.call_count == 1
+        assert self.mock_connection.logout.call_count == 1
+        assert self.mock_connection.close.call_count == 1
+
+    async def test_no_autologin(self):
+        self.handler.auto_login = False
+        async with self.handler:
+            pass
+        assert self.mock_connection.login.call_count == 0
+
+    async def test_login_without_context(self):
+        with self.assertRaises(RuntimeError):
+            await self.handler.login()
+
+    async def test_get_node_names(self):
+        self.mock_connection.get.return_value = (["test_node_1"], None)
+        async with self.handler:
+            node_names = await self.handler.GetNodeNames()
+        assert node_names == ["test_node_1"]
+        assert self.mock_connection.get.call_args[1]["endpoint"] == "acquisition/nodes"
+
+    async def test_get_status(self):
+        self.mock_connection.get.return_value = (
+            [{"name": "SystemState", "value": "Idle"}],
+            None,
+        )
+        async with self.handler:
+            status_list = await asyncio.gather(
+                self.handler.GetStatus("test_node", "test_system_1"),
+                self.handler.GetStatus("test_node", "test_system_2"),
+            )
+        assert status_list == [{"SystemState": "Idle"}, {"SystemState": "Idle"}]
+
+    async def test_run_experiment(self):
+        async with self.handler:
+            await self.handler.RunExperiment(
+                sample_set_method="test_sample_set_method",
+                node="test_node",
+                system="test_system",
+            )
+        assert (
+            self.mock_connection.post.call_args[1]["endpoint"]
+            == "acquisition/run-sample-set-method"
+        )
+        assert (
+            self.mock_connection.post.call_args[1]["body"]["systemName"]
+            == "test_system"
+        )
+
+    async def test_get_fleet_status(self):
+        def fake_get(endpoint, timeout=None):
+            if endpoint == "acquisition/nodes":
+                return (["test_node"], None)
+            if endpoint.startswith("acquisition/chromatographic-systems"):
+                return (["test_system"], None)
+            return ([{"name": "SystemState", "value": "Idle"}], None)
+
+        self.mock_connection.get.side_effect = fake_get
+        async with self.handler:
+            status_list = await self.handler.GetFleetStatus(max_workers=2)
+        assert status_list[0].System == "test_system"
+        assert status_list[0].Status == {"SystemState": "Idle"}
+
+    async def test_run_experiments(self):
+        self.mock_connection.get.return_value = (
+            [{"name": "SystemState", "value": "Idle"}],
+            None,
+        )
+        job = ExperimentJob(
+            SampleSetName="test_sample_set",
+            SampleList=[],
+            Plates={},
+            Node="test_node",
+            System="test_system",
+        )
+        async with self.handler:
+            outcome_list = await self.handler.RunExperiments([job], max_workers=2)
+        assert outcome_list[0].Error is None
+        assert isinstance(outcome_list[0].Run, ExperimentRun)
+        assert (
+            self.mock_connection.post.call_args[1]["endpoint"]
+            == "acquisition/run-sample-set-method"
+        )
+
+    async def test_get_instrument_methods(self):
+        def fake_get(endpoint):
+            method_name = endpoint.split("name=")[1]
+            if method_name == "missing_method":
+                raise ValueError("Method not found")
+            module = {"name": "test", "nativeXml": "<test>1</test>"}
+            return ([{"methodName": method_name, "modules": [module]}], None)
+
+        self.mock_connection.get.side_effect = fake_get
+        async with self.handler:
+            result_dict = {
+                result.Name: result
+                async for result in self.handler.GetInstrumentMethods(
+                    ["method_1", "missing_method"]
+                )
+            }
+        assert result_dict["method_1"].Method.method_name == "method_1"
+        assert isinstance(result_dict["missing_method"].Error, ValueError)
+
+    async def test_watch_status(self):
+        self.mock_connection.get.return_value = (
+            [{"name": "SystemState", "value": "Idle"}],
+            None,
+        )
+        async with self.handler:
+            async with self.handler.WatchStatus("test_node", "test_system") as changes:
+                async for change in changes:
+                    assert change.Status == {"SystemState": "Idle"}
+                    break
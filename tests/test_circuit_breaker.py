@@ -0,0 +1,95 @@
+import unittest
+from unittest.mock import patch
+
+import requests
+
+from OptiHPLCHandler import CircuitBreaker, CircuitOpenError
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self) -> None:
+        self.circuit_breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+    def test_family(self):
+        assert (
+            self.circuit_breaker.family(
+                "acquisition/chromatographic-system-status?nodeName=node&systemName=s"
+            )
+            == "acquisition:node"
+        )
+        assert self.circuit_breaker.family("acquisition/nodes") == "acquisition"
+        assert (
+            self.circuit_breaker.family("acquisition/run-sample-set-method", "node")
+            == "acquisition:node"
+        )
+        assert (
+            self.circuit_breaker.family("/project/methods/instrument-method?name=m")
+            == "project/methods"
+        )
+        assert self.circuit_breaker.family("project/fields") == "project"
+        assert self.circuit_breaker.family("projects/list") == "projects"
+
+    def test_open_after_failures(self):
+        endpoint = "acquisition/nodes"
+        self.circuit_breaker.record_failure(endpoint)
+        self.circuit_breaker.before_request(endpoint)
+        self.circuit_breaker.record_failure(endpoint)
+        assert self.circuit_breaker.state(endpoint) == "open"
+        with self.assertRaises(CircuitOpenError) as context:
+            self.circuit_breaker.before_request("acquisition/run-sample-set-method")
+        assert context.exception.family == "acquisition"
+        assert isinstance(context.exception, requests.exceptions.ConnectionError)
+        # Other families are not affected
+        self.circuit_breaker.before_request("project/methods/method-set-method")
+
+    def test_node_circuits(self):
+        endpoint = "acquisition/chromatographic-system-status?nodeName=node_1"
+        self.circuit_breaker.record_failure(endpoint)
+        self.circuit_breaker.record_failure(endpoint)
+        with self.assertRaises(CircuitOpenError):
+            self.circuit_breaker.before_request("acquisition/x", node="node_1")
+        self.circuit_breaker.before_request(
+            "acquisition/chromatographic-system-status?nodeName=node_2"
+        )
+        self.circuit_breaker.before_request("acquisition/nodes")
+
+    def test_success_resets_count(self):
+        endpoint = "acquisition/nodes"
+        self.circuit_breaker.record_failure(endpoint)
+        self.circuit_breaker.record_success(endpoint)
+        self.circuit_breaker.record_failure(endpoint)
+        assert self.circuit_breaker.state(endpoint) == "closed"
+
+    @patch("OptiHPLCHandler.circuit_breaker.time.monotonic")
+    def test_half_open(self, mock_monotonic):
+        endpoint = "acquisition/nodes"
+        mock_monotonic.return_value = 100
+        self.circuit_breaker.record_failure(endpoint)
+        self.circuit_breaker.record_failure(endpoint)
+        mock_monotonic.return_value = 111
+        self.circuit_breaker.before_request(endpoint)  # The probe
+        assert self.circuit_breaker.state(endpoint) == "half-open"
+        with self.assertRaises(CircuitOpenError):
+            # Only one probe at a time
+            self.circuit_breaker.before_request(endpoint)
+        self.circuit_breaker.record_failure(endpoint)
+        assert self.circuit_breaker.state(endpoint) == "open"
+        mock_monotonic.return_value = 122
+        self.circuit_breaker.before_request(endpoint)
+        self.circuit_breaker.record_success(endpoint)
+        assert self.circuit_breaker.state(endpoint) == "closed"
+        self.circuit_breaker.before_request(endpoint)
+
+    def test_reset(self):
+        for endpoint in ["acquisition/nodes", "project/fields"]:
+            self.circuit_breaker.record_failure(endpoint)
+            self.circuit_breaker.record_failure(endpoint)
+        self.circuit_breaker.reset("acquisition")
+        assert self.circuit_breaker.state("acquisition/nodes") == "closed"
+        assert self.circuit_breaker.state("project/fields") == "open"
+        self.circuit_breaker.reset()
+        assert self.circuit_breaker.state("project/fields") == "closed"
+
+    def test_invalid_threshold(self):
+        with self.assertRaises(ValueError):
+            CircuitBreaker(failure_threshold=0)
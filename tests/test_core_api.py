@@ -1,21 +1,51 @@
+import base64
+import json
+import threading
+import time
 import unittest
 import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from unittest.mock import MagicMock, patch
 
 import requests
 
-from OptiHPLCHandler import EmpowerConnection
+from OptiHPLCHandler import (
+    CircuitBreaker,
+    CircuitOpenError,
+    EmpowerConnection,
+    RetryPolicy,
+)
+from OptiHPLCHandler.empower_api_core import clear_service_list_cache
+
+LOGIN_BODY = {"results": [{"token": "test_token", "id": "test_id"}]}
+
+
+def make_response(body: Optional[dict] = None, status_code: int = 200) -> MagicMock:
+    """Make a mock of a response from Empower with the given JSON body."""
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = b"" if body is None else json.dumps(body).encode()
+    response.headers = {}
+    return response
+
+
+def make_token(expiry: float) -> str:
+    """Make a JSON web token with the given expiry time."""
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": expiry}).encode())
+    return "header." + payload.decode().rstrip("=") + ".signature"
 
 
 class TestEmpowerConnection(unittest.TestCase):
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def setUp(self, mock_requests) -> None:
+        clear_service_list_cache()
         mock_response = MagicMock()
-        mock_response.json.return_value = {
-            "results": [{"token": "test_token", "id": "test_id"}]
-        }
+        mock_response.content = json.dumps(
+            {"results": [{"token": "test_token", "id": "test_id"}]}
+        ).encode()
         mock_response.status_code = 200
-        mock_requests.post.return_value = mock_response
+        mock_requests.Session.return_value.post.return_value = mock_response
         # Since we log in, we need to mock that connection.
 
         mock_password = MagicMock()
@@ -29,22 +59,83 @@ class TestEmpowerConnection(unittest.TestCase):
             service="test_service",
         )
         self.connection.login(username="test_username", password="test_password")
+        self.connection.close()
+        # Closing the session, so that each test opens a new one from its own mock.
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_auto_service(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         mock_response_service = MagicMock()
-        mock_response_service.json.return_value = {
-            "results": [{"netServiceName": "auto_test_service"}]
-        }
+        mock_response_service.content = json.dumps(
+            {"results": [{"netServiceName": "auto_test_service"}]}
+        ).encode()
         # Service name is automatically requested, so we need to mock that response
         mock_response_service.status_code = 200
-        mock_requests.get.return_value = mock_response_service
+        mock_session.get.return_value = mock_response_service
         connection = EmpowerConnection(
             project="test_project",
             address="http://test_address/",
         )
         assert connection.service == "auto_test_service"
 
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_lazy_service(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
+        mock_session.get.return_value = make_response(
+            {"results": [{"netServiceName": "auto_test_service"}]}
+        )
+        connection = EmpowerConnection(address="http://test_address/")
+        assert not mock_session.get.called
+        # The service is not looked up until it is needed
+        assert connection.service == "auto_test_service"
+        assert connection.service == "auto_test_service"
+        assert mock_session.get.call_count == 1
+
+    @patch("OptiHPLCHandler.empower_api_core.time.monotonic")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_service_list_cache(self, mock_requests, mock_monotonic):
+        mock_session = mock_requests.Session.return_value
+        mock_session.get.return_value = make_response(
+            {"results": [{"netServiceName": "auto_test_service"}]}
+        )
+        mock_monotonic.return_value = 1000
+        first = EmpowerConnection(address="http://test_address/")
+        second = EmpowerConnection(address="http://test_address/")
+        other = EmpowerConnection(address="http://other_address/")
+        assert first.service == second.service == other.service
+        assert mock_session.get.call_count == 2
+        # The list is shared between connections to the same address
+        mock_monotonic.return_value = 1000 + 301
+        EmpowerConnection(address="http://test_address/").service
+        assert mock_session.get.call_count == 3
+        # The list is retrieved again when the cached list is too old
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_service_list_other_address(self, mock_requests):
+        # A slow server doesn't hold up getting the services of another server
+        slow_started = threading.Event()
+        release = threading.Event()
+
+        def get(url, timeout):
+            if "slow_address" in url:
+                slow_started.set()
+                release.wait(5)
+            return make_response({"results": [{"netServiceName": "test_service"}]})
+
+        mock_requests.Session.return_value.get.side_effect = get
+        slow = EmpowerConnection(address="http://slow_address/")
+        thread = threading.Thread(target=slow.get_service_list)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(release.set)
+        assert slow_started.wait(5)
+        fast = EmpowerConnection(address="http://fast_address/")
+        fast_thread = threading.Thread(target=fast.get_service_list)
+        fast_thread.start()
+        fast_thread.join(2)
+        assert not fast_thread.is_alive()
+        assert thread.is_alive()  # The slow server is still answering
+
     def test_set_values(self):
         assert self.connection.project == "test_project"
         assert self.connection.address == "https://test_address"
@@ -55,19 +146,21 @@ class TestEmpowerConnection(unittest.TestCase):
 
     def test_login_timeout(self):
         # test that the call to login times out if the server is not available
-        with patch("OptiHPLCHandler.empower_api_core.requests.post") as mock_post:
+        with patch("OptiHPLCHandler.empower_api_core.requests.Session") as mock_session:
+            mock_session.return_value.post.return_value = make_response(LOGIN_BODY)
             self.connection.login(username="test_username", password="test_password")
-            assert "timeout" in mock_post.call_args[1]
+            assert "timeout" in mock_session.return_value.post.call_args[1]
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_automatic_service_name(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         mock_response_service = MagicMock()
-        mock_response_service.json.return_value = {
-            "results": [{"netServiceName": "auto_test_service"}]
-        }
+        mock_response_service.content = json.dumps(
+            {"results": [{"netServiceName": "auto_test_service"}]}
+        ).encode()
         # Service name is automatically requested, so we need to mock that response
         mock_response_service.status_code = 200
-        mock_requests.get.return_value = mock_response_service
+        mock_session.get.return_value = mock_response_service
         connection = EmpowerConnection(
             address="http://test_address/",
             project="test_project",
@@ -76,100 +169,520 @@ class TestEmpowerConnection(unittest.TestCase):
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_get(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_response.json.return_value = {
-            "results": [{"test_key": "test_value"}],
-            "message": "test_message",
-        }
-        mock_requests.request.return_value = mock_response
+        mock_response.content = json.dumps(
+            {
+                "results": [{"test_key": "test_value"}],
+                "message": "test_message",
+            }
+        ).encode()
+        mock_session.request.return_value = mock_response
         result_list = self.connection.get("test_url")[0]
         message = self.connection.get("test_url")[1]
         # Testing that the get method is called with the correct url
-        assert mock_requests.request.call_args[0][0] == "get"
-        assert mock_requests.request.call_args[0][1] == "https://test_address/test_url"
+        assert mock_session.request.call_args[0][0] == "get"
+        assert mock_session.request.call_args[0][1] == "https://test_address/test_url"
         assert "test_key" in result_list[0]
         assert result_list[0]["test_key"] == "test_value"
         assert message == "test_message"
         self.connection.get("/test_url")
         # Testing that the get method is called with the correct url when endpoint
         # starts with a slash
-        assert mock_requests.request.call_args[0][1] == "https://test_address/test_url"
+        assert mock_session.request.call_args[0][1] == "https://test_address/test_url"
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_session_reused(self, mock_requests):
+        mock_requests.Session.return_value.request.return_value = make_response({})
+        self.connection.get("test_url")
+        self.connection.post("test_url", body={})
+        assert mock_requests.Session.call_count == 1
+        # Both requests should go through the same session
+        assert mock_requests.Session.return_value.request.call_count == 2
+        assert (
+            mock_requests.adapters.HTTPAdapter.call_args[1]["pool_maxsize"]
+            == self.connection.pool_maxsize
+        )
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_close(self, mock_requests):
+        mock_requests.Session.return_value.request.return_value = make_response({})
+        self.connection.get("test_url")
+        self.connection.close()
+        assert mock_requests.Session.return_value.close.called
+        self.connection.close()  # Closing twice should not fail
+        self.connection.get("test_url")
+        assert mock_requests.Session.call_count == 2
+        # A new session is opened when needed after closing
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_get_http_error(self, mock_requests):
-        mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_requests.get.return_value = mock_response
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response({}, status_code=400)
         self.connection.get("test_url")
-        assert mock_requests.request.return_value.raise_for_status.called
+        assert mock_session.request.return_value.raise_for_status.called
 
     @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_relogin_get(self, mock_requests, mock_getpass):
         # Verify that the handler logs in again if the token is invalid on get.
+        mock_session = mock_requests.Session.return_value
         mock_response = MagicMock()
-        mock_response.json.return_value = {"results": [{"token": "test_token"}]}
+        mock_response.content = json.dumps(
+            {"results": [{"token": "test_token"}]}
+        ).encode()
         mock_response.status_code = 401
-        mock_requests.request.return_value = mock_response
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_requests.post.return_value = mock_response
+        mock_session.request.return_value = mock_response
+        mock_session.post.return_value = make_response(LOGIN_BODY)
         mock_getpass.return_value = self.mock_password
         self.connection.get("test_url")
-        assert mock_requests.method_calls[1].args == (
+        assert mock_session.method_calls[3].args == (
             "https://test_address/authentication/login",
         )
-        # The second call should be to log in
+        # The second call after mounting the connection pool should be to log in
 
+    @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
     @patch("OptiHPLCHandler.empower_api_core.requests")
-    def test_post(self, mock_requests):
+    def test_single_relogin_concurrent(self, mock_requests, mock_getpass):
+        # Verify that only one login is made when several threads find the token
+        # expired at the same time, and that they all retry with the new token.
+        mock_session = mock_requests.Session.return_value
+        self.connection.token = "expired_token"
+        barrier = threading.Barrier(5, timeout=5)
+
+        def request(method, endpoint, headers, **kwargs):
+            if headers["Authorization"] == "Bearer expired_token":
+                barrier.wait()  # All threads get a 401 before any of them logs in
+                return make_response(status_code=401)
+            return make_response({"results": [headers]})
+
+        def login(endpoint, **kwargs):
+            time.sleep(0.1)  # Giving the other threads time to wait for the login
+            return make_response({"results": [{"token": "new_token", "id": "new_id"}]})
+
+        mock_session.request.side_effect = request
+        mock_session.post.side_effect = login
+        mock_getpass.return_value = self.mock_password
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            result_list = list(
+                executor.map(lambda _: self.connection.get("test_url"), range(5))
+            )
+        assert mock_session.post.call_count == 1
+        assert all(
+            result[0] == [{"Authorization": "Bearer new_token"}]
+            for result in result_list
+        )
+
+    def test_token_expiry(self):
+        assert self.connection.token_expiry is None
+        # The test token is not a JSON web token, so the expiry time is unknown
+        assert self.connection.token_expires_soon is False
+        expiry = time.time() + 3600
+        assert EmpowerConnection._read_token_expiry(make_token(expiry)) == expiry
+        assert EmpowerConnection._read_token_expiry("not.a.token") is None
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_renewal_scheduled_on_login(self, mock_requests):
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.content = json.dumps(
+            {"results": [{"token": make_token(time.time() + 3600), "id": "test_id"}]}
+        ).encode()
+        mock_requests.Session.return_value.post.return_value = mock_response
+        self.connection.login(password="test_password")
+        assert self.connection.token_expires_soon is False
+        timer = self.connection._renewal_timer
+        assert timer.is_alive()
+        self.connection.logout()
+        assert self.connection._renewal_timer is None
+        assert self.connection.token_expiry is None
+        timer.join(timeout=1)
+        assert not timer.is_alive()  # The renewal is cancelled on logout
+
+    @patch("OptiHPLCHandler.empower_api_core.keyring.get_password")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_background_renewal(self, mock_requests, mock_get_password):
+        mock_session = mock_requests.Session.return_value
+        mock_session.post.return_value = make_response(LOGIN_BODY)
+        mock_session.post.return_value = make_response(
+            {"results": [{"token": "new_token", "id": "new_id"}]}
+        )
+        mock_session.delete.return_value = make_response()
+        mock_get_password.return_value = "keyring_password"
+        self.connection._renew_token()
+        assert mock_session.post.call_args[1]["json"]["password"] == "keyring_password"
+        assert self.connection.session_id == "new_id"
+        # The replaced session is logged out
+        assert mock_session.delete.call_count == 1
+        assert mock_session.delete.call_args[0][0].endswith("sessionInfoID=test_id")
+        mock_session.post.reset_mock()
+        mock_get_password.return_value = None
+        self.connection._renew_token()
+        # Without a password in the keyring, the user would have to be asked, so the
+        # token is not renewed in the background.
+        assert not mock_session.post.called
+
+    @patch("OptiHPLCHandler.empower_api_core.keyring.get_password")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_background_renewal_with_token_cache(
+        self, mock_requests, mock_get_password
+    ):
+        mock_session = mock_requests.Session.return_value
+        mock_session.post.return_value = make_response(
+            {"results": [{"token": "new_token", "id": "new_id"}]}
+        )
+        mock_get_password.return_value = "keyring_password"
+        token_cache = MagicMock()
+        token_cache.get.return_value = None
+        self.connection.token_cache = token_cache
+        self.connection._renew_token()
+        assert self.connection.session_id == "new_id"
+        # Other processes may still use the replaced session from the cache
+        assert not mock_session.delete.called
+
+    @patch("OptiHPLCHandler.empower_api_core.keyring.get_password")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_no_renewal_after_logout(self, mock_requests, mock_get_password):
+        mock_session = mock_requests.Session.return_value
+        mock_session.delete.return_value = make_response()
+        mock_get_password.return_value = "keyring_password"
+        token = self.connection.token
+        self.connection.logout()
+        # A renewal that started before the logout doesn't log in again
+        self.connection._renew_token()
+        self.connection._refresh_token(token, renewal=True)
+        assert not mock_session.post.called
+        assert self.connection.session_id is None
+        assert self.connection._renewal_timer is None
+
+    @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_renewal_before_request(self, mock_requests, mock_getpass):
+        # Verify that a token about to expire is renewed before the request, instead of
+        # sending the request and getting a 401.
+        mock_session = mock_requests.Session.return_value
+        mock_getpass.return_value = self.mock_password
+        self.connection.token_expiry = time.time() + 10
         mock_response = MagicMock()
         mock_response.status_code = 200
-        mock_requests.request.return_value = mock_response
+        mock_response.content = json.dumps(
+            {"results": [{"token": "new_token", "id": "new_id"}]}
+        ).encode()
+        mock_session.post.return_value = mock_response
+        mock_session.request.return_value = mock_response
+        self.connection.post("test_url", body={})
+        assert mock_session.post.called
+        assert mock_session.request.call_count == 1
+        assert mock_session.request.call_args[1]["headers"] == {
+            "Authorization": "Bearer new_token"
+        }
+        # The replaced session is logged out with its own token
+        assert mock_session.delete.call_args[0] == (
+            "https://test_address/authentication/logout?sessionInfoID=test_id",
+        )
+        assert mock_session.delete.call_args[1]["headers"] == {
+            "Authorization": "Bearer test_token"
+        }
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_token_cache(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
+        mock_session.post.return_value = make_response(LOGIN_BODY)
+        token_cache = MagicMock()
+        token_cache.get.return_value = None
+        self.connection.token_cache = token_cache
+        self.connection.login(password="test_password")
+        assert mock_session.post.called
+        assert token_cache.set.call_args[0][:3] == (
+            "https://test_address|test_service|test_project|test_username",
+            "test_token",
+            "test_id",
+        )  # The new token is stored in the cache
+        mock_session.post.reset_mock()
+        token_cache.get.return_value = {
+            "token": "cached_token",
+            "session_id": "cached_id",
+            "expiry": time.time() + 3600,
+        }
+        self.connection.login(password="test_password")
+        assert not mock_session.post.called  # The cached token is used instead
+        assert self.connection.token == "cached_token"
+        assert self.connection.session_id == "cached_id"
+        self.connection.logout()
+        assert token_cache.invalidate.call_args[1]["token"] == "cached_token"
+
+    @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_token_cache_refresh(self, mock_requests, mock_getpass):
+        # Verify that an expired cached token is removed before logging in again, so
+        # that the login doesn't reuse it.
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response(status_code=401)
+        mock_session.post.return_value = make_response(LOGIN_BODY)
+        mock_getpass.return_value = self.mock_password
+        token_cache = MagicMock()
+        token_cache.get.return_value = None
+        self.connection.token_cache = token_cache
+        self.connection.get("test_url")
+        assert token_cache.invalidate.call_args[1]["token"] == "test_token"
+        assert token_cache.method_calls[0][0] == "invalidate"
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_delete_with_token_cache(self, mock_requests):
+        self.connection.token_cache = MagicMock()
+        del self.connection
+        assert not mock_requests.Session.return_value.delete.called
+        # The session is kept for other processes using the token cache
+
+    @patch("OptiHPLCHandler.empower_api_core.get_rate_limiter")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_rate_limiter(self, mock_requests, mock_get_rate_limiter):
+        mock_rate_limiter = mock_get_rate_limiter.return_value
+        mock_session = mock_requests.Session.return_value
+
+        def check_limited(*args, **kwargs):
+            # The request is made while the limiter is held. Comparing the counts, as
+            # connections of other tests may log out when garbage collected.
+            assert (
+                mock_rate_limiter.__enter__.call_count
+                == mock_rate_limiter.__exit__.call_count + 1
+            )
+            return make_response({})
+
+        mock_session.request.side_effect = check_limited
+        self.connection.get("test_url")
+        mock_get_rate_limiter.assert_any_call("https://test_address")
+        assert mock_session.request.called
+        assert (
+            mock_rate_limiter.__exit__.call_count
+            == mock_rate_limiter.__enter__.call_count
+        )
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_retry_transient_error(self, mock_requests, mock_sleep):
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.side_effect = [
+            make_response(status_code=503),
+            make_response(status_code=504),
+            make_response({"results": ["test_result"]}),
+        ]
+        assert self.connection.get("test_url")[0] == ["test_result"]
+        assert mock_session.request.call_count == 3
+        assert mock_sleep.call_count == 2
+        assert self.connection.retry_statistics.retry_count == 2
+        assert self.connection.retry_statistics.retries_by_endpoint == {"test_url": 2}
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_retry_gives_up(self, mock_requests, mock_sleep):
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response(status_code=503)
+        self.connection.get("test_url")
+        assert mock_session.request.call_count == 3
+        assert mock_session.request.return_value.raise_for_status.called
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_retry_timeout(self, mock_requests, mock_sleep):
+        mock_requests.exceptions = requests.exceptions
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.side_effect = [
+            requests.exceptions.ConnectionError(),
+            make_response({"results": ["test_result"]}),
+        ]
+        assert self.connection.get("test_url")[0] == ["test_result"]
+        mock_session.request.side_effect = requests.exceptions.Timeout()
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.connection.get("test_url")
+        assert mock_session.request.call_count == 5
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_no_retry(self, mock_requests, mock_sleep):
+        mock_requests.exceptions = requests.exceptions
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.side_effect = requests.exceptions.Timeout()
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.connection.get("test_url", retry=False)
+        assert mock_session.request.call_count == 1
+        assert not mock_sleep.called
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_circuit_breaker(self, mock_requests, mock_sleep):
+        mock_requests.exceptions = requests.exceptions
+        mock_session = mock_requests.Session.return_value
+        self.connection.circuit_breaker = CircuitBreaker()
+        endpoint = "acquisition/chromatographic-system-status?nodeName=node_1"
+        mock_session.request.side_effect = requests.exceptions.Timeout()
+        with self.assertRaises(requests.exceptions.Timeout):
+            self.connection.get(endpoint)
+        # The retries of a request count as one failure
+        assert self.connection.circuit_breaker.state(endpoint) == "closed"
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.Timeout):
+                self.connection.get(endpoint)
+        assert mock_session.request.call_count == 9
+        # After three failed requests, requests to the node fail without being made
+        with self.assertRaises(CircuitOpenError):
+            self.connection.get(endpoint)
+        with self.assertRaises(CircuitOpenError):
+            self.connection.post(
+                "acquisition/run-sample-set-method", body={"nodeName": "node_1"}
+            )
+        assert mock_session.request.call_count == 9
+        # Other nodes, and the rest of Empower, are not affected
+        mock_session.request.side_effect = None
+        mock_session.request.return_value = make_response({"results": []})
+        assert (
+            self.connection.get(
+                "acquisition/chromatographic-system-status?nodeName=node_2"
+            )[0]
+            == []
+        )
+        assert self.connection.get("acquisition/nodes")[0] == []
+        assert self.connection.get("project/methods/method-set-method")[0] == []
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_no_circuit_breaker(self, mock_requests, mock_sleep):
+        mock_requests.exceptions = requests.exceptions
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.side_effect = requests.exceptions.Timeout()
+        assert self.connection.circuit_breaker is None
+        for _ in range(5):
+            with self.assertRaises(requests.exceptions.Timeout):
+                self.connection.get("acquisition/nodes")
+        assert mock_session.request.call_count == 15
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_post_stream(self, mock_requests, mock_sleep):
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response({"results": ["ok"]})
+        chunks = iter([b'{"name": ', b'"test"}'])
+        assert self.connection.post_stream("test_url", chunks)[0] == ["ok"]
+        call_kwargs = mock_session.request.call_args[1]
+        assert call_kwargs["data"] is chunks
+        assert "json" not in call_kwargs
+        assert call_kwargs["headers"]["Content-Type"] == "application/json"
+        assert call_kwargs["headers"]["Authorization"] == "Bearer test_token"
+        assert call_kwargs["timeout"] == self.connection.default_post_timeout
+
+    @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_post_stream_not_sent_twice(self, mock_requests, mock_sleep, mock_getpass):
+        mock_session = mock_requests.Session.return_value
+        mock_getpass.return_value = "test_password"
+        self.connection.retry_policy = RetryPolicy(retry_methods=["get", "post"])
+        mock_session.request.return_value = make_response(status_code=503)
+        self.connection.post_stream("test_url", iter([b"{}"]))
+        assert mock_session.request.call_count == 1
+        # The token is renewed on 401, but the stream has been used up
+        mock_requests.exceptions = requests.exceptions
+        mock_session.request.return_value = make_response(status_code=401)
+        mock_session.post.return_value = make_response(
+            {"results": [{"token": "new_token", "id": "new_id"}]}
+        )
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.connection.post_stream("test_url", iter([b"{}"]))
+        assert mock_session.request.call_count == 2
+        assert mock_session.post.call_count == 1
+        assert self.connection.token == "new_token"
+
+    @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_post_stream_sent_again(self, mock_requests, mock_sleep, mock_getpass):
+        mock_session = mock_requests.Session.return_value
+        mock_getpass.return_value = "test_password"
+        mock_session.request.side_effect = [
+            make_response(status_code=401),
+            make_response({"results": ["ok"]}),
+        ]
+        mock_session.post.return_value = make_response(
+            {"results": [{"token": "new_token", "id": "new_id"}]}
+        )
+        assert self.connection.post_stream("test_url", lambda: iter([b"{}"]))[0] == [
+            "ok"
+        ]
+        assert mock_session.request.call_count == 2
+        call_kwargs = mock_session.request.call_args[1]
+        assert call_kwargs["headers"]["Authorization"] == "Bearer new_token"
+        assert list(call_kwargs["data"]) == [b"{}"]
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_no_retry_post(self, mock_requests, mock_sleep):
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response(status_code=503)
+        self.connection.post("test_url", body={})
+        assert mock_session.request.call_count == 1
+        # Posts are not retried by default, since posting twice might not be harmless
+        assert not mock_sleep.called
+
+    @patch("OptiHPLCHandler.empower_api_core.time.sleep")
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_retry_after(self, mock_requests, mock_sleep):
+        mock_session = mock_requests.Session.return_value
+        mock_response = make_response(status_code=503)
+        mock_response.headers = {"Retry-After": "7"}
+        mock_session.request.side_effect = [mock_response, make_response({})]
+        self.connection.get("test_url")
+        assert mock_sleep.call_args[0][0] == 7
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_post(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response({})
         # The last call should be to log in, since this should casue an exception.
         self.connection.post("test_url", body={})
         # Testing that the post method is called with the correct url
-        assert mock_requests.request.call_args[0][0] == "post"
-        assert mock_requests.request.call_args[0][1] == "https://test_address/test_url"
+        assert mock_session.request.call_args[0][0] == "post"
+        assert mock_session.request.call_args[0][1] == "https://test_address/test_url"
         self.connection.post("/test_url", body={})
         # Testing that the get method is called with the correct url when endpoint
         # starts with a slash
-        assert mock_requests.request.call_args[0][1] == "https://test_address/test_url"
+        assert mock_session.request.call_args[0][1] == "https://test_address/test_url"
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_post_http_error(self, mock_requests):
-        mock_response = MagicMock()
-        mock_response.status_code = 400
-        mock_requests.post.return_value = mock_response
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response({}, status_code=400)
         self.connection.post("test_url", body="test_body")
-        assert mock_requests.request.return_value.raise_for_status.called
+        assert mock_session.request.return_value.raise_for_status.called
 
     @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_relogin_post(self, mock_requests, mock_getpass):
         # Verify that the handler logs in again if the token is invalid on put.
+        mock_session = mock_requests.Session.return_value
         mock_response = MagicMock()
-        mock_response.json.return_value = {
-            "results": [{"token": "test_token", "id": "test_id"}]
-        }
+        mock_response.content = json.dumps(
+            {"results": [{"token": "test_token", "id": "test_id"}]}
+        ).encode()
         mock_response.status_code = 401
-        mock_requests.request.return_value = mock_response
+        mock_session.request.return_value = mock_response
+        mock_session.post.return_value = make_response(LOGIN_BODY)
         mock_getpass.return_value = self.mock_password
         self.connection.post("test_url", body="test_body")
-        assert mock_requests.method_calls[1].args == (
+        assert mock_session.method_calls[3].args == (
             "https://test_address/authentication/login",
         )
-        # The second call should be to log in
+        # The second call after mounting the connection pool should be to log in
 
     @patch("OptiHPLCHandler.empower_api_core.getpass.getpass")
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_http_warning(self, mock_requests, mock_getpass):
         # Verify that the handler warns if the connection is not https.
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_requests.post.return_value = mock_response
-        mock_requests.get.return_value = mock_response
+        mock_session = mock_requests.Session.return_value
+        mock_session.post.return_value = make_response(LOGIN_BODY)
+        mock_session.get.return_value = make_response(
+            {"results": [{"netServiceName": "test_service"}]}
+        )
         mock_getpass.return_value = self.mock_password
         self.connection.address = "http://test_address/"
         with self.assertWarns(Warning):
@@ -179,10 +692,11 @@ class TestEmpowerConnection(unittest.TestCase):
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_no_warning_https(self, mock_request, mock_getpass):
         # Verify that the handler does not warn if the connection is https.
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_request.post.return_value = mock_response
-        mock_request.get.return_value = mock_response
+        mock_session = mock_request.Session.return_value
+        mock_session.post.return_value = make_response(LOGIN_BODY)
+        mock_session.get.return_value = make_response(
+            {"results": [{"netServiceName": "test_service"}]}
+        )
         mock_getpass.return_value = self.mock_password
         connection = EmpowerConnection(
             address="https://test_address/",
@@ -196,28 +710,31 @@ class TestEmpowerConnection(unittest.TestCase):
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_info_in_login_message(self, mock_request, mock_getpass):
         # Verify that the handler prints the correct info in the login message.
-        mock_response = MagicMock()
-        mock_response.status_code = 200
-        mock_request.post.return_value = mock_response
-        mock_request.get.return_value = mock_response
+        mock_session = mock_request.Session.return_value
+        mock_session.post.return_value = make_response(LOGIN_BODY)
+        mock_session.get.return_value = make_response(
+            {"results": [{"netServiceName": "test_service"}]}
+        )
         mock_getpass.return_value = self.mock_password
         self.connection.login(username="test_username")
         assert "test_username" in mock_getpass.call_args[0][0]
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_logout(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         self.connection.logout()
-        assert mock_requests.delete.call_args[0][0] == (
+        assert mock_session.delete.call_args[0][0] == (
             "https://test_address/authentication/logout?sessionInfoID=test_id"
         )
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_logout_404(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         mock_response = MagicMock()
         mock_response.status_code = 404
-        mock_requests.delete.return_value = mock_response
+        mock_session.delete.return_value = mock_response
         self.connection.logout()
-        assert mock_requests.delete.call_args[0][0] == (
+        assert mock_session.delete.call_args[0][0] == (
             "https://test_address/authentication/logout?sessionInfoID=test_id"
         )
         assert mock_response.raise_for_status.called is False
@@ -227,32 +744,37 @@ class TestEmpowerConnection(unittest.TestCase):
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_logout_http_error(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         mock_response = MagicMock()
         mock_response.status_code = 400
-        mock_requests.delete.return_value = mock_response
+        mock_session.delete.return_value = mock_response
         self.connection.logout()
-        assert mock_requests.delete.return_value.raise_for_status.called
+        assert mock_session.delete.return_value.raise_for_status.called
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_delete(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         del self.connection
-        assert mock_requests.delete.call_args[0][0] == (
+        assert mock_session.delete.call_args[0][0] == (
             "https://test_address/authentication/logout?sessionInfoID=test_id"
         )
 
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_http_error(self, mock_requests):
+        mock_session = mock_requests.Session.return_value
         mock_response = MagicMock()
         mock_response.ok = False
         mock_response.status_code = 400
-        mock_response.json.return_value = {
-            "message": "test_message",
-            "id": "test_id",
-        }
+        mock_response.content = json.dumps(
+            {
+                "message": "test_message",
+                "id": "test_id",
+            }
+        ).encode()
         mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(
             response=mock_response
         )
-        mock_requests.request.return_value = mock_response
+        mock_session.request.return_value = mock_response
         mock_requests.exceptions.HTTPError = requests.exceptions.HTTPError
         with self.assertRaises(requests.exceptions.HTTPError) as context:
             self.connection.get("test_url")
@@ -260,16 +782,51 @@ class TestEmpowerConnection(unittest.TestCase):
         assert "message 'test_message'" in str(context.exception)
         assert "ID test_id" in str(context.exception)
 
+    @patch("OptiHPLCHandler.empower_api_core.json_loads", wraps=json.loads)
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_body_decoded_once(self, mock_requests, mock_json_loads):
+        mock_session = mock_requests.Session.return_value
+        mock_session.request.return_value = make_response(
+            {"results": ["test_result"], "message": "test_message"}
+        )
+        assert self.connection.get("test_url") == (["test_result"], "test_message")
+        assert mock_json_loads.call_count == 1
+        mock_json_loads.reset_mock()
+        mock_response = make_response(
+            {"message": "test_message", "id": "test_id"}, status_code=400
+        )
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            response=mock_response
+        )
+        mock_session.request.return_value = mock_response
+        mock_requests.exceptions.HTTPError = requests.exceptions.HTTPError
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.connection.get("test_url")
+        assert mock_json_loads.call_count == 1
+
+    @patch("OptiHPLCHandler.empower_api_core.requests")
+    def test_http_error_not_json(self, mock_requests):
+        mock_response = make_response(status_code=500)
+        mock_response.content = b"<html>Internal server error</html>"
+        mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError(
+            "500 Internal server error", response=mock_response
+        )
+        mock_requests.Session.return_value.request.return_value = mock_response
+        mock_requests.exceptions.HTTPError = requests.exceptions.HTTPError
+        with self.assertRaises(requests.exceptions.HTTPError) as context:
+            self.connection.get("test_url")
+        assert "500" in str(context.exception)
+
     @patch("OptiHPLCHandler.empower_api_core.requests")
     def test_incomplete_json(self, mock_requests):
-        mock_response = MagicMock()
-        mock_response.json.return_value = {}
-        mock_requests.request.return_value = mock_response
+        mock_session = mock_requests.Session.return_value
+        mock_response = make_response({})
+        mock_session.request.return_value = mock_response
         response = self.connection.get("test_url")
         assert response == (None, None)
-        mock_response.json.return_value = {"results": []}
+        mock_response.content = json.dumps({"results": []}).encode()
         response = self.connection.get("test_url")
         assert response == ([], None)
-        mock_response.json.return_value = {"message": "test_message"}
+        mock_response.content = json.dumps({"message": "test_message"}).encode()
         response = self.connection.get("test_url")
         assert response == (None, "test_message")
@@ -0,0 +1,217 @@
+import threading
+import unittest
+
+from OptiHPLCHandler import ExperimentRun, StatusPoller, StatusWatcher
+
+
+class FakeSystem:
+    """A system whose status is set by the test."""
+
+    def __init__(self, status):
+        self.status = status
+
+    def get_status(self, node, system):
+        return dict(self.status)
+
+
+class TestExperimentRun(unittest.TestCase):
+    def setUp(self) -> None:
+        self.system = FakeSystem({"SystemState": "Idle", "SampleSetName": "old"})
+        self.watcher = StatusWatcher(
+            self.system.get_status,
+            "test_node",
+            "test_system",
+            busy_interval=0.01,
+            idle_interval=0.01,
+        )
+        self.addCleanup(self.watcher.stop)
+
+    def make_run(self):
+        return ExperimentRun(
+            sample_set_method="test_method",
+            sample_set_name="test_sample_set",
+            node="test_node",
+            system="test_system",
+            watcher=self.watcher,
+        )
+
+    def test_wait(self):
+        run = self.make_run()
+        with self.assertRaises(TimeoutError):
+            run.wait(timeout=0.1)  # Not started yet
+        assert run.StartTime is None
+        self.system.status = {
+            "SystemState": "Running",
+            "SampleSetName": "test_sample_set",
+        }
+        with self.assertRaises(TimeoutError):
+            run.wait(timeout=0.1)
+        assert run.StartTime is not None
+        self.system.status = {"SystemState": "Idle", "SampleSetName": "test_sample_set"}
+        result = run.wait(timeout=5)
+        assert run.done()
+        assert result.StartTime == run.StartTime
+        assert result.EndTime >= result.StartTime
+        assert result.PerformedExperiment == "test_method"
+        assert result.Data == "test_sample_set"
+        assert not self.watcher.running  # The run stopped watching
+
+    def test_other_sample_set(self):
+        run = self.make_run()
+        self.system.status = {"SystemState": "Running", "SampleSetName": "other"}
+        with self.assertRaises(TimeoutError):
+            run.wait(timeout=0.1)  # Another sample set running is not our start
+        self.system.status = {
+            "SystemState": "Running",
+            "SampleSetName": "test_sample_set",
+        }
+        while run.StartTime is None:
+            threading.Event().wait(0.01)
+        self.system.status = {"SystemState": "Running", "SampleSetName": "next"}
+        assert run.wait(timeout=5).EndTime is not None
+
+    def test_earlier_run_ignored(self):
+        # The status of an earlier run of the same sample set, polled before this run
+        self.system.status = {
+            "SystemState": "Running",
+            "SampleSetName": "test_sample_set",
+        }
+        subscription = self.watcher.subscribe()
+        subscription.get(timeout=5)
+        self.system.status = {"SystemState": "Idle", "SampleSetName": "test_sample_set"}
+        subscription.get(timeout=5)
+        self.system.status = {
+            "SystemState": "Running",
+            "SampleSetName": "test_sample_set",
+        }
+        subscription.get(timeout=5)
+        run = self.make_run()  # The running status is given again when subscribing
+        subscription.close()
+        with self.assertRaises(TimeoutError):
+            run.wait(timeout=0.1)
+        assert run.StartTime is None
+        run.cancel()
+
+    def test_status_without_name(self):
+        run = self.make_run()
+        self.system.status = {"SystemState": "Running"}
+        with self.assertRaises(TimeoutError):
+            run.wait(timeout=0.1)  # Can't tell if it is our sample set running
+        assert run.StartTime is None
+        run.cancel()
+
+    def test_start_timeout(self):
+        run = ExperimentRun(
+            sample_set_method="test_method",
+            sample_set_name="test_sample_set",
+            node="test_node",
+            system="test_system",
+            watcher=self.watcher,
+            start_timeout=0.1,
+        )
+        with self.assertRaises(TimeoutError):
+            run.wait()
+        assert run.done()
+        assert run.StartTime is None
+        assert not self.watcher.running
+
+    def test_start_timeout_without_waiting(self):
+        run = ExperimentRun(
+            sample_set_method="test_method",
+            sample_set_name="test_sample_set",
+            node="test_node",
+            system="test_system",
+            watcher=self.watcher,
+            start_timeout=0.05,
+        )
+        # The start timeout is checked when the status is polled, so a run that never
+        # starts stops being followed even if it is never waited for.
+        for _ in range(500):
+            if run.done():
+                break
+            threading.Event().wait(0.01)
+        assert run.done()
+        assert not self.watcher.running
+        with self.assertRaises(TimeoutError):
+            run.result()
+
+    def test_stopped_watching(self):
+        run = self.make_run()
+        self.watcher.stop()
+        assert run.done()
+        with self.assertRaises(RuntimeError):
+            run.wait(timeout=1)
+
+    def test_result_not_done(self):
+        run = self.make_run()
+        with self.assertRaises(RuntimeError):
+            run.result()
+        run.cancel()
+
+    def test_shared_watcher(self):
+        run_list = [self.make_run() for _ in range(20)]
+        assert len(self.watcher._subscriptions) == 20
+        self.system.status = {
+            "SystemState": "Running",
+            "SampleSetName": "test_sample_set",
+        }
+        threading.Event().wait(0.1)
+        self.system.status = {"SystemState": "Idle"}
+        for run in run_list:
+            run.wait(timeout=5)
+
+
+class TestAsyncExperimentRun(unittest.IsolatedAsyncioTestCase):
+    async def test_await(self):
+        system = FakeSystem({"SystemState": "Running", "SampleSetName": "test_set"})
+        watcher = StatusWatcher(
+            system.get_status, "test_node", "test_system", busy_interval=0.01
+        )
+        run = ExperimentRun(
+            "test_method", "test_set", "test_node", "test_system", watcher
+        )
+        threading.Timer(0.1, system.status.update, [{"SystemState": "Idle"}]).start()
+        result = await run
+        assert result.EndTime is not None
+        assert (await run) == result  # Awaiting a finished run returns at once
+
+    async def test_await_start_timeout(self):
+        system = FakeSystem({"SystemState": "Idle"})
+        watcher = StatusWatcher(
+            system.get_status, "test_node", "test_system", idle_interval=0.01
+        )
+        run = ExperimentRun(
+            "test_method",
+            "test_set",
+            "test_node",
+            "test_system",
+            watcher,
+            start_timeout=0.1,
+        )
+        with self.assertRaises(TimeoutError):
+            await run
+
+
+class TestStatusPoller(unittest.TestCase):
+    def test_many_watchers(self):
+        poller = StatusPoller(max_workers=2)
+        poll_threads = set()
+        lock = threading.Lock()
+
+        def get_status(node, system):
+            with lock:
+                poll_threads.add(threading.current_thread().name)
+            return {"SystemState": "Running"}
+
+        watcher_list = [
+            StatusWatcher(get_status, "node", f"system_{num}", poller=poller)
+            for num in range(50)
+        ]
+        subscription_list = [watcher.subscribe() for watcher in watcher_list]
+        for subscription in subscription_list:
+            assert subscription.get(timeout=5).Status == {"SystemState": "Running"}
+        for subscription in subscription_list:
+            subscription.close()
+        # All 50 systems were polled by the 2 threads of the poller
+        assert len(poll_threads) <= 2
+        assert all(name.startswith("StatusPoller") for name in poll_threads)
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from OptiHPLCHandler import MetadataCache
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = MetadataCache(maxsize=2)
+        self.loader = MagicMock(return_value=["test_node"])
+
+    def test_cached(self):
+        assert self.cache.get_or_load("GetNodeNames", (), self.loader) == ["test_node"]
+        assert self.cache.get_or_load("GetNodeNames", (), self.loader) == ["test_node"]
+        assert self.loader.call_count == 1
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+        self.cache.get_or_load("GetNodeNames", ("other",), self.loader)
+        assert self.loader.call_count == 2  # Different arguments
+
+    def test_result_copied(self):
+        self.cache.get_or_load("GetNodeNames", (), self.loader).append("changed")
+        assert self.cache.get_or_load("GetNodeNames", (), self.loader) == ["test_node"]
+
+    @patch("OptiHPLCHandler.metadata_cache.time.monotonic")
+    def test_ttl(self, mock_monotonic):
+        cache = MetadataCache(ttls={"GetNodeNames": 10, "GetMethodList": 0})
+        mock_monotonic.return_value = 100
+        cache.get_or_load("GetNodeNames", (), self.loader)
+        mock_monotonic.return_value = 109
+        cache.get_or_load("GetNodeNames", (), self.loader)
+        assert self.loader.call_count == 1
+        mock_monotonic.return_value = 111
+        cache.get_or_load("GetNodeNames", (), self.loader)
+        assert self.loader.call_count == 2
+        cache.get_or_load("GetMethodList", (), self.loader)
+        cache.get_or_load("GetMethodList", (), self.loader)
+        assert self.loader.call_count == 4  # Not cached
+        assert cache.ttls["GetPlateTypeNames"] == 3600  # Default kept
+
+    def test_lru_eviction(self):
+        self.cache.get_or_load("GetSystemNames", ("node_1",), self.loader)
+        self.cache.get_or_load("GetSystemNames", ("node_2",), self.loader)
+        self.cache.get_or_load("GetSystemNames", ("node_1",), self.loader)
+        self.cache.get_or_load("GetSystemNames", ("node_3",), self.loader)
+        assert len(self.cache) == 2
+        self.loader.reset_mock()
+        self.cache.get_or_load("GetSystemNames", ("node_1",), self.loader)
+        assert self.loader.call_count == 0  # Recently used, so kept
+        self.cache.get_or_load("GetSystemNames", ("node_2",), self.loader)
+        assert self.loader.call_count == 1
+
+    def test_invalidate(self):
+        self.cache.get_or_load("GetMethodList", (), self.loader)
+        self.cache.get_or_load("GetNodeNames", (), self.loader)
+        self.cache.invalidate("GetMethodList")
+        assert len(self.cache) == 1
+        self.cache.invalidate()
+        assert len(self.cache) == 0
+
+    def test_invalidate_while_loading(self):
+        def load():
+            # E.g. a method posted by another thread while the list is loaded
+            self.cache.invalidate("GetMethodList")
+            return ["old_method"]
+
+        self.cache.get_or_load("GetMethodList", (), load)
+        assert len(self.cache) == 0
@@ -0,0 +1,169 @@
+import unittest
+
+from OptiHPLCHandler import MethodCatalogue
+from OptiHPLCHandler.method_catalogue import parse_method_records
+
+
+def make_method(name, date=None, version=None):
+    field_list = [{"name": "Name", "value": name}]
+    if date is not None:
+        field_list.append({"name": "Date", "value": date})
+    if version is not None:
+        field_list.append({"name": "Version", "value": version})
+    return {"fields": field_list}
+
+
+class TestParseMethodRecords(unittest.TestCase):
+    def test_parse(self):
+        record_list = parse_method_records(
+            "InstrumentMethod",
+            [make_method("method_1", "2024-01-31T10:00:00", "3")],
+        )
+        assert record_list[0].Name == "method_1"
+        assert record_list[0].Type == "InstrumentMethod"
+        assert record_list[0].Date == "2024-01-31T10:00:00"
+        assert record_list[0].Version == "3"
+        assert record_list[0].Fields["Name"] == "method_1"
+
+    def test_no_name(self):
+        with self.assertRaises(ValueError):
+            parse_method_records("InstrumentMethod", [{"fields": []}])
+
+    def test_two_names(self):
+        method = make_method("method_1")
+        method["fields"].append({"name": "Name", "value": "method_2"})
+        with self.assertRaises(ValueError):
+            parse_method_records("InstrumentMethod", [method])
+
+
+class TestMethodCatalogue(unittest.TestCase):
+    def setUp(self) -> None:
+        self.method_dict = {
+            "InstrumentMethod": [
+                make_method("gradient_fast", "2024-01-31T10:00:00", "1"),
+                make_method("gradient_slow", "2024-02-01T10:00:00", "1"),
+                make_method("isocratic", "2024-01-31T12:00:00", "2"),
+            ],
+            "MethodSetMethod": [make_method("gradient_fast")],
+        }
+        self.load_list = []
+        self.catalogue = MethodCatalogue(self.load)
+
+    def load(self, method_type):
+        self.load_list.append(method_type)
+        return self.method_dict[method_type]
+
+    def test_names(self):
+        assert self.catalogue.names("InstrumentMethod") == [
+            "gradient_fast",
+            "gradient_slow",
+            "isocratic",
+        ]
+        assert len(self.catalogue) == 3
+        # Loaded once, when first used
+        self.catalogue.names("InstrumentMethod")
+        assert self.load_list == ["InstrumentMethod"]
+
+    def test_contains(self):
+        self.catalogue.names("InstrumentMethod")
+        assert "isocratic" in self.catalogue
+        assert "missing" not in self.catalogue
+
+    def test_get(self):
+        self.catalogue.names("MethodSetMethod")
+        record = self.catalogue.get("gradient_fast", "InstrumentMethod")
+        assert record.Type == "InstrumentMethod"
+        assert record.Version == "1"
+        assert self.catalogue.get("isocratic").Date == "2024-01-31T12:00:00"
+        assert self.catalogue.get("missing") is None
+        assert self.catalogue.get("gradient_slow", "MethodSetMethod") is None
+
+    def test_with_prefix(self):
+        assert self.catalogue.with_prefix("gradient", "InstrumentMethod") == [
+            "gradient_fast",
+            "gradient_slow",
+        ]
+        assert self.catalogue.with_prefix("gradient_f", "InstrumentMethod") == [
+            "gradient_fast"
+        ]
+        assert self.catalogue.with_prefix("x", "InstrumentMethod") == []
+        assert self.catalogue.with_prefix("") == [
+            "gradient_fast",
+            "gradient_slow",
+            "isocratic",
+        ]
+
+    def test_saved_on(self):
+        self.catalogue.names("InstrumentMethod")
+        record_list = self.catalogue.saved_on("2024-01-31")
+        assert [record.Name for record in record_list] == [
+            "gradient_fast",
+            "isocratic",
+        ]
+        assert self.catalogue.saved_on("2023-01-01") == []
+
+    def test_refresh(self):
+        self.catalogue.names("InstrumentMethod")
+        unchanged_record = self.catalogue.get("isocratic")
+        self.method_dict["InstrumentMethod"] = [
+            make_method("gradient_fast", "2024-02-02T10:00:00", "2"),
+            make_method("isocratic", "2024-01-31T12:00:00", "2"),
+            make_method("gradient_new", "2024-02-02T11:00:00", "1"),
+        ]
+        added, changed, removed = self.catalogue.refresh("InstrumentMethod")
+        assert added == ["gradient_new"]
+        assert changed == ["gradient_fast"]
+        assert removed == ["gradient_slow"]
+        assert self.catalogue.get("isocratic") is unchanged_record
+        assert "gradient_slow" not in self.catalogue
+        assert self.catalogue.with_prefix("gradient", "InstrumentMethod") == [
+            "gradient_fast",
+            "gradient_new",
+        ]
+        assert [record.Name for record in self.catalogue.saved_on("2024-02-02")] == [
+            "gradient_fast",
+            "gradient_new",
+        ]
+        assert [record.Name for record in self.catalogue.saved_on("2024-01-31")] == [
+            "isocratic"
+        ]
+        assert self.catalogue.saved_on("2024-02-01") == []
+
+    def test_same_name(self):
+        self.method_dict["InstrumentMethod"] = [
+            make_method("gradient_fast", "2024-01-30T10:00:00", "1"),
+            make_method("isocratic", "2024-01-31T12:00:00", "2"),
+            make_method("gradient_fast", "2024-01-31T10:00:00", "2"),
+        ]
+        assert self.catalogue.names("InstrumentMethod") == [
+            "gradient_fast",
+            "isocratic",
+            "gradient_fast",
+        ]
+        assert len(self.catalogue) == 3
+        assert self.catalogue.get("gradient_fast").Version == "1"
+        record_list = self.catalogue.get_all("gradient_fast", "InstrumentMethod")
+        assert [record.Version for record in record_list] == ["1", "2"]
+        assert [record.Version for record in self.catalogue.saved_on("2024-01-31")] == [
+            "2",
+            "2",
+        ]
+        # Removing one of the methods with the name changes the name
+        self.method_dict["InstrumentMethod"].pop()
+        added, changed, removed = self.catalogue.refresh("InstrumentMethod")
+        assert (added, changed, removed) == ([], ["gradient_fast"], [])
+        assert self.catalogue.names("InstrumentMethod") == [
+            "gradient_fast",
+            "isocratic",
+        ]
+        assert [record.Name for record in self.catalogue.saved_on("2024-01-31")] == [
+            "isocratic"
+        ]
+
+    def test_invalidate(self):
+        self.catalogue.names("InstrumentMethod")
+        self.method_dict["InstrumentMethod"].append(make_method("new_method"))
+        assert "new_method" not in self.catalogue
+        self.catalogue.invalidate()
+        assert "new_method" in self.catalogue
+        assert self.load_list == ["InstrumentMethod", "InstrumentMethod"]
@@ -1,8 +1,12 @@
 import json
 import os
+import random
 import unittest
 import warnings
+from unittest.mock import patch
+from xml.etree import ElementTree as ET
 
+from OptiHPLCHandler.data_types import TagEdit
 from OptiHPLCHandler.empower_module_method import (
     BSMMethod,
     ColumnManagerMethod,
@@ -10,6 +14,7 @@ from OptiHPLCHandler.empower_module_method import (
     EmpowerModuleMethod,
     QSMMethod,
     SampleManagerMethod,
+    _TagIndex,
     module_method_factory,
 )
 
@@ -172,6 +177,246 @@ class TestModuleMethod(unittest.TestCase):
         )
         assert module_method["StartWavelength"] == "211"
 
+    def test_changes_applied_once(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>0</a><b>x</b>"}
+        module_method = module_method_factory(minimal_definition)
+        with patch.object(
+            EmpowerModuleMethod,
+            "_write_spans",
+            autospec=True,
+            side_effect=EmpowerModuleMethod._write_spans,
+        ) as mock_apply_change:
+            for value in range(1, 101):
+                module_method["a"] = str(value)
+                assert module_method["a"] == str(value)
+            assert module_method.current_method["nativeXml"] == "<a>100</a><b>x</b>"
+            # Each change is applied once, not once per read
+            assert mock_apply_change.call_count == 100
+
+    def test_undo_after_reads(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>0</a><b>x</b>"}
+        module_method = module_method_factory(minimal_definition)
+        module_method["a"] = "1"
+        module_method["b"] = "y"
+        assert module_method["b"] == "y"
+        module_method.undo()
+        assert module_method["b"] == "x"
+        assert module_method["a"] == "1"
+        module_method["b"] = "z"
+        assert module_method.current_method["nativeXml"] == "<a>1</a><b>z</b>"
+        module_method.undo()
+        module_method.undo()
+        assert module_method.current_method["nativeXml"] == "<a>0</a><b>x</b>"
+
+    def test_tag_index(self):
+        minimal_definition = {
+            "name": "test",
+            "nativeXml": "<a>1</a><t><r><c>1</c></r><r><c>2</c></r></t><d>x</d>",
+        }
+        module_method = module_method_factory(minimal_definition)
+        # The values are found with the tag index, without searching the xml
+        with patch.object(EmpowerModuleMethod, "find_value") as mock_search:
+            assert module_method["a"] == "1"
+            assert module_method["d"] == "x"
+            with self.assertRaises(ValueError):
+                module_method["c"]
+            with self.assertRaises(KeyError):
+                module_method["missing"]
+            module_method["t"] = "<r><c>3</c></r>"
+            assert module_method["c"] == "3"
+            assert module_method["d"] == "x"
+            module_method["a"] = "22"
+            assert module_method["d"] == "x"
+            assert module_method["c"] == "3"
+            mock_search.assert_not_called()
+        assert (
+            module_method.current_method["nativeXml"]
+            == "<a>22</a><t><r><c>3</c></r></t><d>x</d>"
+        )
+
+    def test_tag_index_after_replace(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>1</a><b>1</b>"}
+        module_method = module_method_factory(minimal_definition)
+        assert module_method["b"] == "1"
+        module_method.replace(">1<", ">10<")  # Free text, changing both values
+        assert module_method["a"] == "10"
+        assert module_method["b"] == "10"
+        module_method.replace("<b>10</b>", "<b>2</b><b>3</b>")
+        with self.assertRaises(ValueError):
+            module_method["b"]
+        module_method.undo()
+        assert module_method["b"] == "10"
+
+    def test_tag_edits(self):
+        minimal_definition = {
+            "name": "test",
+            "nativeXml": "<a>1</a><b>1</b><t><c>1</c></t>",
+        }
+        module_method = module_method_factory(minimal_definition)
+        assert module_method["a"] == "1"
+        with patch.object(
+            EmpowerModuleMethod,
+            "_write_spans",
+            autospec=True,
+            side_effect=EmpowerModuleMethod._write_spans,
+        ) as mock_write_spans:
+            module_method["b"] = "2"
+            module_method["a"] = "3"
+            module_method["c"] = "4"
+            assert (
+                module_method.current_method["nativeXml"]
+                == "<a>3</a><b>2</b><t><c>4</c></t>"
+            )
+            # All values are written in one pass, and only the tag is changed, even
+            # though the value is also in other tags
+            assert mock_write_spans.call_count == 1
+        assert module_method._change_list[-1] == TagEdit("c", "4")
+
+    def test_tag_edits_same_tag(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>1</a><t><c>1</c></t>"}
+        module_method = module_method_factory(minimal_definition)
+        module_method["a"] = "2"
+        module_method["a"] = "3"
+        module_method["t"] = "<c>5</c><d>6</d>"
+        module_method["d"] = "7"
+        module_method["c"] = "8"
+        assert (
+            module_method.current_method["nativeXml"]
+            == "<a>3</a><t><c>8</c><d>7</d></t>"
+        )
+        module_method.undo()
+        assert module_method["c"] == "5"
+
+    def test_tag_edits_with_replace(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>1</a><b>1</b>"}
+        module_method = module_method_factory(minimal_definition)
+        module_method["a"] = "2"
+        module_method.replace("<b>1</b>", "<c>1</c>")
+        module_method["c"] = "3"
+        assert module_method.current_method["nativeXml"] == "<a>2</a><c>3</c>"
+        with self.assertRaises(KeyError):
+            module_method["b"] = "4"
+
+    def test_coalesce_writes(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>0</a><b>0</b>"}
+        module_method = module_method_factory(minimal_definition)
+        for value in range(1, 501):
+            module_method["a"] = str(value)
+            module_method["b"] = str(-value)
+            if value % 7 == 0:
+                assert module_method["a"] == str(value)
+        assert module_method._change_list == [TagEdit("a", "500"), TagEdit("b", "-500")]
+        assert module_method.current_method["nativeXml"] == "<a>500</a><b>-500</b>"
+        module_method.undo()
+        assert module_method.current_method["nativeXml"] == "<a>500</a><b>-499</b>"
+        module_method.undo()
+        assert module_method.current_method["nativeXml"] == "<a>499</a><b>-499</b>"
+        assert len(module_method._change_list) == 2
+
+    def test_undo_limit(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>0</a>"}
+        module_method = module_method_factory(minimal_definition)
+        for value in range(1, 301):
+            module_method["a"] = str(value)
+        assert len(module_method._undo_stack) == EmpowerModuleMethod.undo_limit
+        with patch.object(EmpowerModuleMethod, "undo_limit", 3):
+            module_method = module_method_factory(minimal_definition)
+        for value in range(1, 6):
+            module_method["a"] = str(value)
+        for _ in range(3):
+            module_method.undo()
+        assert module_method["a"] == "2"
+        with self.assertRaises(IndexError):
+            module_method.undo()
+        assert module_method["a"] == "2"
+
+    def test_no_coalesce_nested(self):
+        minimal_definition = {"name": "test", "nativeXml": "<t><c>1</c></t><a>1</a>"}
+        module_method = module_method_factory(minimal_definition)
+        module_method["t"] = "<c>2</c>"
+        module_method["c"] = "3"
+        module_method["t"] = "<c>4</c>"
+        assert module_method.current_method["nativeXml"] == "<t><c>4</c></t><a>1</a>"
+        module_method["a"] = "2"
+        module_method["c"] = "5"
+        module_method["a"] = "3"
+        assert module_method.current_method["nativeXml"] == "<t><c>5</c></t><a>3</a>"
+        module_method.replace("<a>3</a>", "<a>6</a>")
+        module_method["a"] = "7"
+        assert len(module_method._change_list) == 7
+        module_method.undo()
+        module_method.undo()
+        module_method.undo()
+        assert module_method.current_method["nativeXml"] == "<t><c>5</c></t><a>2</a>"
+
+    def test_tag_edits_same_empty_tag(self):
+        module_method = module_method_factory(
+            {"name": "test", "nativeXml": "<s></s><r>1</r>"}
+        )
+        module_method["s"] = "0"
+        module_method["r"] = "3"
+        module_method["s"] = "<r>5</r>"
+        assert module_method.current_method["nativeXml"] == "<s><r>5</r></s><r>3</r>"
+
+    def test_tag_edits_found_after_earlier_edit(self):
+        module_method = module_method_factory(
+            {"name": "test", "nativeXml": "<p><f>1</f></p><q><f>1</f></q><r>1</r>"}
+        )
+        module_method["p"] = "<g>0.5</g>"
+        module_method["f"] = "7"
+        module_method["r"] = "2"
+        module_method.undo()
+        # The changes are applied again, and f is only found once after setting p
+        assert (
+            module_method.current_method["nativeXml"]
+            == "<p><g>0.5</g></p><q><f>7</f></q><r>1</r>"
+        )
+
+    def test_tag_edits_same_as_one_by_one(self):
+        original_xml = "<a></a><b>1</b><c><d>1</d></c><e><d>2</d></e>"
+        key_list = ["a", "b", "c", "d", "e"]
+        value_list = ["", "1", "<b>2</b>", "<d>3</d>", "<c>4</c>", "<a></a>"]
+        random_generator = random.Random(42)
+        for _ in range(300):
+            module_method = module_method_factory(
+                {"name": "test", "nativeXml": original_xml}
+            )
+            # The xml after each change, applying the changes one by one
+            xml_list = [original_xml]
+            for _ in range(8):
+                if xml_list[1:] and random_generator.random() < 0.2:
+                    module_method.undo()
+                    xml_list.pop()
+                    continue
+                key = random_generator.choice(key_list)
+                value = random_generator.choice(value_list)
+                try:
+                    start, end = _TagIndex(xml_list[-1]).span(key)
+                except (KeyError, ValueError):
+                    with self.assertRaises((KeyError, ValueError)):
+                        module_method[key] = value
+                    continue
+                module_method[key] = value
+                xml_list.append(xml_list[-1][:start] + value + xml_list[-1][end:])
+                if random_generator.random() < 0.5:
+                    assert module_method.current_method["nativeXml"] == xml_list[-1]
+            assert module_method.current_method["nativeXml"] == xml_list[-1]
+
+    def test_alter_method_tag_edits(self):
+        method = EmpowerModuleMethod.alter_method(
+            {"name": "test", "nativeXml": "<a>1</a><b>1</b>"},
+            [TagEdit("b", "2"), ("<a>1</a>", "<a>3</a>")],
+        )
+        assert method["nativeXml"] == "<a>3</a><b>2</b>"
+
+    def test_current_method_copy(self):
+        minimal_definition = {"name": "test", "nativeXml": "<a>0</a>"}
+        module_method = module_method_factory(minimal_definition)
+        module_method["a"] = "1"
+        current_method = module_method.current_method
+        current_method["nativeXml"] = "<a>2</a>"
+        assert module_method["a"] == "1"
+
     def test_warning_too_many_decimals(self):
         # Empower sometimes gives the wrong values is more than 10 decimals are given.
         minimal_definition = {"name": "test", "nativeXml": "<a>value</a>"}
@@ -939,6 +1184,70 @@ class testBSMMethod(unittest.TestCase):
         assert module_method.gradient_table[0]["CompositionB"] == "50.0"
         assert str(module_method.gradient_table[0]["Curve"]) == "Initial"
 
+    def test_repeated_gradient_table_setter(self):
+        module_method = BSMMethod(self.medium_definition)
+        for step in range(200):
+            gradient_table = module_method.gradient_table
+            gradient_table[1]["Flow"] = 0.3 + step / 1000
+            module_method.gradient_table = gradient_table
+            module_method.valve_position = ["A1", f"B{step % 2 + 1}"]
+        # One change per tag, however often it is set
+        assert len(module_method._change_list) == 3
+        assert module_method.gradient_table[1]["Flow"] == "0.499"
+        assert module_method.valve_position == ["A1", "B2"]
+        module_method.undo()
+        module_method.undo()
+        assert module_method.valve_position == ["A1", "B1"]
+
+    def test_gradient_table_parsed_once(self):
+        module_method = BSMMethod(self.medium_definition)
+        with patch.object(
+            BSMMethod,
+            "_parse_gradient_table",
+            side_effect=BSMMethod._parse_gradient_table,
+        ) as mock_parse:
+            gradient_table = module_method.gradient_table
+            assert module_method.gradient_table == gradient_table
+            assert mock_parse.call_count == 1
+            gradient_table[1]["Flow"] = 0.4
+            module_method.gradient_table = gradient_table
+            module_method.valve_position = "A2"
+            assert module_method.gradient_table[1]["Flow"] == "0.4"
+            module_method.undo()
+            module_method.undo()
+            assert module_method.gradient_table[1]["Flow"] == "0.500"
+            assert mock_parse.call_count == 1
+            # Changing the table in another way parses it again
+            module_method["GradientTable"] = module_method["GradientTable"].replace(
+                "<Flow>0.500</Flow>", "<Flow>0.450</Flow>"
+            )
+            assert module_method.gradient_table[1]["Flow"] == "0.450"
+            assert mock_parse.call_count == 2
+
+    def test_gradient_table_written_once(self):
+        module_method = BSMMethod(self.medium_definition)
+        with patch(
+            "xml.etree.ElementTree.tostring", side_effect=ET.tostring
+        ) as mock_tostring:
+            for step in range(10):
+                gradient_table = module_method.gradient_table
+                gradient_table[1]["Flow"] = f"{0.3 + step / 100:.3f}"
+                module_method.gradient_table = gradient_table
+                module_method.valve_position = ["A1", f"B{step % 2 + 1}"]
+                assert (
+                    module_method.gradient_table[1]["Flow"] == f"{0.3 + step / 100:.3f}"
+                )
+            assert mock_tostring.call_count == 0
+            xml = module_method.current_method["nativeXml"]
+            assert mock_tostring.call_count == 1
+        assert "<Flow>0.390</Flow>" in xml
+        assert module_method["FlowSourceB"] == "2"
+        assert module_method.gradient_table[1]["Flow"] == "0.390"
+        # The same xml as setting the GradientTable tag directly
+        gradient_xml = module_method["GradientTable"]
+        module_method["GradientTable"] = gradient_xml
+        assert module_method.current_method["nativeXml"] == xml
+
     def test_gradient_table_setter_default(self):
         module_method = BSMMethod(self.minimal_definition)
         module_method.gradient_table = [
@@ -1,7 +1,19 @@
+import json
+import threading
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
-from OptiHPLCHandler import EmpowerHandler, EmpowerInstrumentMethod, EmpowerModuleMethod
+import requests
+
+from OptiHPLCHandler import (
+    EmpowerHandler,
+    EmpowerInstrumentMethod,
+    EmpowerModuleMethod,
+    ExperimentJob,
+    ExperimentRun,
+    MetadataCache,
+)
 
 
 class TestEmpowerHandler(unittest.TestCase):
@@ -78,6 +90,33 @@ class TestEmpowerHandler(unittest.TestCase):
         assert (
             self.handler.connection.post.call_args[1]["body"]["sampleSetName"]
         ) == "test_sample_set_name"  # Check that the correct sample set name is given
+        self.handler.stop_status_watchers()
+
+    def test_run_experiment_wait(self):
+        self.handler.connection.get.return_value = (
+            [
+                {"name": "SystemState", "value": "Running"},
+                {"name": "SampleSetName", "value": "test_sample_set_name"},
+            ],
+            None,
+        )
+        run = self.handler.RunExperiment(
+            sample_set_method="test_sample_set_method",
+            node="test_node",
+            system="test_hplc",
+            sample_set_name="test_sample_set_name",
+        )
+        assert isinstance(run, ExperimentRun)
+        self.handler.status_watcher("test_node", "test_hplc").busy_interval = 0.01
+        while run.StartTime is None:
+            time.sleep(0.01)
+        self.handler.connection.get.return_value = (
+            [{"name": "SystemState", "value": "Idle"}],
+            None,
+        )
+        result = run.wait(timeout=5)
+        assert result.StartTime <= result.EndTime
+        assert result.Data == "test_sample_set_name"
 
     def test_get_node_name_list(self):
         self.handler.connection.get.return_value = (["test_node_name_1"], None)
@@ -205,6 +244,156 @@ class TestSampleList(unittest.TestCase):
         assert all([dict_type == "Enumerator" for dict_type in dict_type_list])
         # Testing that all dictionary values are strings
 
+    def post_and_get_lines(self, sample_list):
+        self.handler.PostExperiment(
+            sample_set_method_name="test_sampleset_name",
+            sample_list=sample_list,
+            plates={},
+        )
+        return self.handler.connection.post.call_args[1]["body"]["sampleSetLines"]
+
+    def test_post_sample_columns(self):
+        row_list = [
+            {
+                "Method": f"test_method_{num}",
+                "SamplePos": f"1:A,{num}",
+                "SampleName": f"test_sample_name_{num}",
+                "InjectionVolume": num,
+                "test_field": 2.5,
+            }
+            for num in range(3)
+        ]
+        column_dict = {key: [row[key] for row in row_list] for key in row_list[0]}
+        # The same lines as for the list of samples
+        assert self.post_and_get_lines(column_dict) == self.post_and_get_lines(row_list)
+
+    def test_post_sample_columns_with_function(self):
+        sample_set_lines = self.post_and_get_lines(
+            {
+                "Function": [{"member": "Equilibrate"}],
+                "Method": ["test_method"],
+            }
+        )
+        assert sample_set_lines[0]["fields"] == [
+            {
+                "name": "Function",
+                "value": {"member": "Equilibrate"},
+                "dataType": "Enumerator",
+            },
+            {
+                "name": "MethodSetOrReportMethod",
+                "value": "test_method",
+                "dataType": "String",
+            },
+        ]
+
+    def test_post_array_and_dataframe_columns(self):
+        class FakeArray:
+            """Like a NumPy array or pandas Series, converted with tolist."""
+
+            def __init__(self, values):
+                self.values = values
+
+            def tolist(self):
+                return list(self.values)
+
+        class FakeDataFrame:
+            def __init__(self, column_dict):
+                self.column_dict = column_dict
+                self.columns = list(column_dict)
+
+            def __getitem__(self, name):
+                return FakeArray(self.column_dict[name])
+
+        column_dict = {"SampleName": ["a", "b"], "InjectionVolume": [1.5, 2.5]}
+        expected_lines = self.post_and_get_lines(column_dict)
+        assert (
+            self.post_and_get_lines(
+                {key: FakeArray(values) for key, values in column_dict.items()}
+            )
+            == expected_lines
+        )
+        assert self.post_and_get_lines(FakeDataFrame(column_dict)) == expected_lines
+        assert expected_lines[1]["fields"][2] == {
+            "name": "InjVol",
+            "value": 2.5,
+            "dataType": "Double",
+        }
+
+    def test_post_sample_columns_mixed_types(self):
+        sample_set_lines = self.post_and_get_lines({"test_field": [1, "text", 2.0]})
+        assert [line["fields"][1]["dataType"] for line in sample_set_lines] == [
+            "Double",
+            "String",
+            "Double",
+        ]
+        with self.assertRaises(ValueError):
+            self.post_and_get_lines({"test_field": [1, None]})
+
+    def test_post_sample_columns_different_lengths(self):
+        with self.assertRaises(ValueError):
+            self.post_and_get_lines({"SampleName": ["a", "b"], "InjVol": [1]})
+
+    def test_post_sample_columns_not_shared(self):
+        sample_set_lines = self.post_and_get_lines({"SampleName": ["a", "b"]})
+        sample_set_lines[0]["fields"][0]["value"] = {"member": "Changed"}
+        sample_set_lines[0]["fields"][-1]["value"] = {"member": "Changed"}
+        # Changing a line doesn't change the other lines
+        assert sample_set_lines[1]["fields"][0]["value"] == {"member": "Normal"}
+        assert sample_set_lines[1]["fields"][-1]["value"] == {
+            "member": "Inject Samples"
+        }
+
+    def test_post_sample_columns_not_sequence(self):
+        for column in ["ab", b"ab", {"a": 1}, 1]:
+            with self.assertRaises(ValueError):
+                self.post_and_get_lines({"SampleName": column})
+        self.handler.connection.post.assert_not_called()
+
+    def test_post_sample_generator(self):
+        row_list = [
+            {
+                "Method": "test_method",
+                "SamplePos": f"1:A,{num}",
+                "SampleName": f"test_sample_name_{num}",
+                "InjectionVolume": num,
+            }
+            for num in range(50)
+        ]
+        expected_body = {
+            "plates": [{"plateTypeName": "test_plate", "plateLayoutPosition": "1"}],
+            "name": "test_sampleset_name",
+            "sampleSetLines": [
+                dict(line)
+                for line in self.post_and_get_lines([dict(row) for row in row_list])
+            ],
+        }
+        with patch("OptiHPLCHandler.empower_handler.STREAM_CHUNK_SIZE", 1000):
+            self.handler.PostExperiment(
+                sample_set_method_name="test_sampleset_name",
+                sample_list=(dict(row) for row in row_list),
+                plates={"1": "test_plate"},
+            )
+            call_kwargs = self.handler.connection.post_stream.call_args[1]
+            assert call_kwargs["endpoint"] == "project/methods/sample-set-method"
+            chunk_list = list(call_kwargs["chunks"])
+        assert len(chunk_list) > 1  # Sent in several chunks
+        assert all(isinstance(chunk, bytes) for chunk in chunk_list)
+        assert json.loads(b"".join(chunk_list)) == expected_body
+
+    def test_post_empty_sample_generator(self):
+        self.handler.PostExperiment(
+            sample_set_method_name="test_sampleset_name",
+            sample_list=iter([]),
+            plates={},
+        )
+        chunks = self.handler.connection.post_stream.call_args[1]["chunks"]
+        assert json.loads(b"".join(chunks)) == {
+            "plates": [],
+            "name": "test_sampleset_name",
+            "sampleSetLines": [],
+        }
+
     def test_post_sample_list_with_empower_names(self):
         sample_list = [
             {
@@ -329,6 +518,32 @@ class TestGetMethods(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.handler.GetMethodList()
 
+    def test_method_catalogue(self):
+        self.handler.connection.get.return_value = (
+            [
+                {
+                    "fields": [
+                        {"name": "Name", "value": "test_method_name_1"},
+                        {"name": "Date", "value": "2024-01-31T10:00:00"},
+                    ]
+                },
+            ],
+            None,
+        )
+        self.handler.GetMethodList(method_type="Instrument")
+        assert "test_method_name_1" in self.handler.method_catalogue
+        record = self.handler.method_catalogue.get("test_method_name_1")
+        assert record.Type == "InstrumentMethod"
+        assert record.Date == "2024-01-31T10:00:00"
+        assert self.handler.connection.get.call_count == 1
+        # Posting a method refreshes the catalogue when it is next used
+        self.handler.PostMethodSetMethod({"name": "test_method_name_2"})
+        self.handler.connection.get.return_value[0].append(
+            {"fields": [{"name": "Name", "value": "test_method_name_2"}]}
+        )
+        assert "test_method_name_2" in self.handler.method_catalogue
+        assert self.handler.connection.get.call_count == 2
+
     def test_get_sample_set_method_list(self):
         self.handler.connection.get.return_value = (["test_samplesetmethod_1"], None)
         samplesetmethod_list = self.handler.GetSampleSetMethods()
@@ -423,6 +638,16 @@ class TestLogin(unittest.TestCase):
         # Check that the login method is called when entering the context manager
         assert self.handler.connection.logout.call_count == 1
         # Check that the logout method is called when exiting the context manager
+        assert self.handler.connection.close.call_count == 1
+        # Check that the connections to Empower are closed as well
+
+    def test_context_management_keep_session(self):
+        self.handler.keep_session = True
+        with self.handler:
+            pass
+        assert self.handler.connection.logout.call_count == 0
+        # With a token cache, the session is kept for other processes
+        assert self.handler.connection.close.call_count == 1
 
     def test_no_autologin(self):
         self.handler.auto_login = False
@@ -511,6 +736,42 @@ class TestInstrumentMethodInteraction(unittest.TestCase):
         assert isinstance(method.module_method_list[0], EmpowerModuleMethod)
         assert method.module_method_list[0].original_method == minimal_module
 
+    def test_get_methods(self):
+        release = threading.Event()
+
+        def fake_get(endpoint):
+            method_name = endpoint.split("name=")[1]
+            if method_name == "slow_method":
+                release.wait(5)
+            if method_name == "missing_method":
+                raise ValueError("Method not found")
+            module = {"name": "test", "nativeXml": f"<name>{method_name}</name>"}
+            return ([{"methodName": method_name, "modules": [module]}], None)
+
+        self.handler.connection.get.side_effect = fake_get
+        result_iterator = self.handler.GetInstrumentMethods(
+            ["slow_method", "missing_method", "method_1", "method_2"], max_workers=2
+        )
+        result_list = [next(result_iterator) for _ in range(3)]
+        # The slow method does not hold up the others
+        assert {result.Name for result in result_list} == {
+            "missing_method",
+            "method_1",
+            "method_2",
+        }
+        release.set()
+        result_list.extend(result_iterator)
+        result_dict = {result.Name: result for result in result_list}
+        assert len(result_dict) == 4
+        assert isinstance(result_dict["missing_method"].Error, ValueError)
+        assert result_dict["missing_method"].Method is None
+        for method_name in ["slow_method", "method_1", "method_2"]:
+            result = result_dict[method_name]
+            assert result.Error is None
+            assert isinstance(result.Method, EmpowerInstrumentMethod)
+            assert result.Method.method_name == method_name
+            assert result.Latency >= 0
+
     def test_post_method(self):
         minimal_module = {
             "name": "test",
@@ -568,6 +829,56 @@ class TestMethodSetMethodInteraction(unittest.TestCase):
         )
 
 
+class TestMetadataCache(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+            metadata_cache=MetadataCache(),
+        )
+        self.handler.connection.get.return_value = (
+            [{"fields": [{"name": "Name", "value": "test_method_name"}]}],
+            None,
+        )
+
+    def test_lookups_cached(self):
+        for _ in range(3):
+            assert self.handler.GetMethodList() == ["test_method_name"]
+        assert self.handler.connection.get.call_count == 1
+        self.handler.GetMethodList("InstrumentMethod")
+        assert self.handler.connection.get.call_count == 2
+        self.handler.connection.get.return_value = (["test_name"], None)
+        for _ in range(2):
+            self.handler.GetNodeNames()
+            self.handler.GetSystemNames("test_node")
+            self.handler.GetPlateTypeNames()
+            self.handler.GetSampleSetMethods()
+        assert self.handler.connection.get.call_count == 6
+
+    def test_invalidated_by_post(self):
+        self.handler.GetMethodList()
+        self.handler.PostMethodSetMethod({"name": "test_method_name"})
+        self.handler.GetMethodList()
+        assert self.handler.connection.get.call_count == 2
+        self.handler.PostInstrumentMethod(MagicMock())
+        self.handler.GetMethodList()
+        assert self.handler.connection.get.call_count == 3
+        self.handler.connection.post.side_effect = ValueError()
+        with self.assertRaises(ValueError):
+            self.handler.PostExperiment("test_sample_set_method", [], {})
+        self.handler.GetMethodList()
+        assert self.handler.connection.get.call_count == 4
+
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def test_no_cache(self, _):
+        handler = EmpowerHandler(project="test_project", address="https://test_address")
+        handler.connection.get.return_value = (["test_node"], None)
+        handler.GetNodeNames()
+        handler.GetNodeNames()
+        assert handler.connection.get.call_count == 2
+
+
 class TestStatus(unittest.TestCase):
     @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
     def setUp(self, _) -> None:
@@ -589,3 +900,361 @@ class TestStatus(unittest.TestCase):
             "?nodeName=test_node&systemName=test_system"
         )
         assert result == {"FirstKey": "FirstValue", "SecondKey": "SecondValue"}
+
+
+class TestFleetStatus(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.pool_maxsize = 4
+        self.system_dict = {
+            "node_1": ["system_1", "system_2"],
+            "node_2": ["system_3"],
+        }
+        self.release = threading.Event()
+        self.release.set()
+        self.handler.connection.get.side_effect = self.fake_get
+
+    def tearDown(self) -> None:
+        self.release.set()
+
+    def fake_get(self, endpoint, timeout=None):
+        if endpoint == "acquisition/nodes":
+            return (list(self.system_dict), None)
+        if endpoint.startswith("acquisition/chromatographic-systems"):
+            node = endpoint.split("nodeName=")[1]
+            if node == "broken_node":
+                raise requests.exceptions.ConnectionError("Node is down")
+            return (self.system_dict[node], None)
+        system = endpoint.split("systemName=")[1]
+        if system == "broken_system":
+            raise requests.exceptions.Timeout("Timed out")
+        if system == "slow_system":
+            self.release.wait(5)
+        return ([{"name": "SystemState", "value": f"Idle {system}"}], None)
+
+    def test_fleet_status(self):
+        status_list = self.handler.GetFleetStatus()
+        assert [(status.Node, status.System) for status in status_list] == [
+            ("node_1", "system_1"),
+            ("node_1", "system_2"),
+            ("node_2", "system_3"),
+        ]
+        assert status_list[1].Status == {"SystemState": "Idle system_2"}
+        assert all(status.Error is None for status in status_list)
+        assert all(status.Latency >= 0 for status in status_list)
+
+    def test_partial_results(self):
+        self.system_dict["node_1"] = ["broken_system", "system_2"]
+        status_list = self.handler.GetFleetStatus(
+            nodes=["node_1", "broken_node"], max_workers=2
+        )
+        assert len(status_list) == 3
+        assert isinstance(status_list[0].Error, requests.exceptions.Timeout)
+        assert status_list[0].Status is None
+        assert status_list[1].Status == {"SystemState": "Idle system_2"}
+        assert status_list[2].System is None
+        assert isinstance(status_list[2].Error, requests.exceptions.ConnectionError)
+
+    def test_deadline(self):
+        self.release.clear()
+        self.system_dict["node_2"] = ["slow_system"]
+        start_time = time.monotonic()
+        status_list = self.handler.GetFleetStatus(deadline=0.2)
+        assert time.monotonic() - start_time < 2
+        assert status_list[0].Error is None
+        assert status_list[2].System == "slow_system"
+        assert isinstance(status_list[2].Error, TimeoutError)
+
+
+class TestRunExperiments(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.pool_maxsize = 4
+        self.handler.connection.get.return_value = (
+            [{"name": "SystemState", "value": "Idle"}],
+            None,
+        )
+        self.handler.connection.post.side_effect = self.fake_post
+        self.lock = threading.Lock()
+        self.call_list = []
+        self.line_dict = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def tearDown(self) -> None:
+        self.handler.stop_status_watchers()
+
+    def fake_post(self, endpoint, body, timeout=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.lock:
+            self.in_flight -= 1
+            if endpoint.startswith("project/methods/sample-set-method"):
+                name = body["name"]
+                self.call_list.append(("post", name))
+                self.line_dict[name] = body["sampleSetLines"]
+                if name == "broken_post":
+                    raise requests.exceptions.HTTPError("Invalid sample set")
+            else:
+                name = body["sampleSetMethodName"]
+                self.call_list.append(("run", name))
+                if body["systemName"] == "broken_system":
+                    raise requests.exceptions.HTTPError("System is busy")
+        return (None, None)
+
+    def make_job(self, name, system):
+        return ExperimentJob(
+            SampleSetName=name,
+            SampleList=[
+                {
+                    "Method": "test_method",
+                    "SamplePos": "1:A,1",
+                    "SampleName": "test_sample",
+                    "InjectionVolume": 1,
+                }
+            ],
+            Plates={"1": "test_plate"},
+            Node="test_node",
+            System=system,
+        )
+
+    def test_run_experiments(self):
+        job_list = [
+            self.make_job(f"campaign_{num}", f"system_{num}") for num in range(6)
+        ]
+        outcome_list = self.handler.RunExperiments(job_list, max_workers=3)
+        assert [outcome.Job for outcome in outcome_list] == job_list
+        assert all(outcome.Error is None for outcome in outcome_list)
+        assert all(isinstance(outcome.Run, ExperimentRun) for outcome in outcome_list)
+        assert outcome_list[2].Run.system == "system_2"
+        assert all(outcome.PostTime > 0 for outcome in outcome_list)
+        assert all(outcome.RunTime > 0 for outcome in outcome_list)
+        assert 1 < self.max_in_flight <= 3
+        for num in range(6):
+            # Each sample set is posted before it is run
+            assert self.call_list.index(
+                ("post", f"campaign_{num}")
+            ) < self.call_list.index(("run", f"campaign_{num}"))
+
+    def test_shared_sample_list(self):
+        # The same campaign on many systems, with one list of samples
+        sample_list = self.make_job("campaign", "system").SampleList
+        sample_copy = [dict(sample) for sample in sample_list]
+        job_list = [
+            ExperimentJob(
+                SampleSetName=f"campaign_{num}",
+                SampleList=sample_list,
+                Plates={"1": "test_plate"},
+                Node="test_node",
+                System=f"system_{num}",
+            )
+            for num in range(4)
+        ]
+        outcome_list = self.handler.RunExperiments(job_list)
+        assert all(outcome.Error is None for outcome in outcome_list)
+        assert sample_list == sample_copy  # The samples are not changed
+        first_lines = self.line_dict["campaign_0"]
+        assert first_lines[0]["fields"][0]["name"] == "Processing"
+        assert first_lines[0]["fields"][-1]["name"] == "Function"
+        for num in range(1, 4):
+            assert self.line_dict[f"campaign_{num}"] == first_lines
+
+    def test_same_system_in_order(self):
+        job_list = [self.make_job(f"campaign_{num}", "system_1") for num in range(3)]
+        self.handler.RunExperiments(job_list)
+        assert self.call_list == [
+            (action, f"campaign_{num}")
+            for num in range(3)
+            for action in ("post", "run")
+        ]
+        assert self.max_in_flight == 1
+
+    def test_failing_jobs(self):
+        job_list = [
+            self.make_job("broken_post", "system_1"),
+            self.make_job("campaign_1", "broken_system"),
+            self.make_job("campaign_2", "system_1"),
+        ]
+        outcome_list = self.handler.RunExperiments(job_list)
+        assert isinstance(outcome_list[0].Error, requests.exceptions.HTTPError)
+        assert outcome_list[0].Run is None
+        assert outcome_list[0].RunTime is None
+        assert ("run", "broken_post") not in self.call_list
+        assert isinstance(outcome_list[1].Error, requests.exceptions.HTTPError)
+        assert outcome_list[1].Run is None
+        assert outcome_list[1].RunTime is not None
+        assert outcome_list[2].Error is None
+        assert isinstance(outcome_list[2].Run, ExperimentRun)
+
+
+class TestScheduleExperiment(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.pool_maxsize = 4
+        self.state_dict = {
+            "system_1": "Idle",
+            "system_2": "Running",
+            "system_3": "Idle",
+        }
+        self.handler.connection.get.side_effect = self.fake_get
+        self.handler.connection.post.return_value = (None, None)
+        self.sample_list = [
+            {
+                "Method": "test_method",
+                "SamplePos": f"1:A,{num}",
+                "SampleName": f"sample_{num}",
+                "InjectionVolume": 1,
+                "RunTime": 10,
+            }
+            for num in range(12)
+        ]
+
+    def tearDown(self) -> None:
+        self.handler.stop_status_watchers()
+
+    def fake_get(self, endpoint, timeout=None, retry=True):
+        if endpoint == "acquisition/nodes":
+            return (["node_1"], None)
+        if endpoint.startswith("acquisition/chromatographic-systems"):
+            return (list(self.state_dict), None)
+        system = endpoint.split("systemName=")[1]
+        return ([{"name": "SystemState", "value": self.state_dict[system]}], None)
+
+    def posted_sample_sets(self):
+        sample_set_dict = {}
+        for call in self.handler.connection.post.call_args_list:
+            if call[1]["endpoint"] == "project/methods/sample-set-method":
+                body = call[1]["body"]
+                sample_set_dict[body["name"]] = [
+                    next(
+                        field["value"]
+                        for field in line["fields"]
+                        if field["name"] == "SampleName"
+                    )
+                    for line in body["sampleSetLines"]
+                ]
+        return sample_set_dict
+
+    def test_idle_systems(self):
+        outcome_list = self.handler.ScheduleExperiment(
+            "campaign", self.sample_list, plates={"1": "test_plate"}
+        )
+        assert [outcome.Job.System for outcome in outcome_list] == [
+            "system_1",
+            "system_3",
+        ]
+        assert all(outcome.Error is None for outcome in outcome_list)
+        sample_set_dict = self.posted_sample_sets()
+        assert set(sample_set_dict) == {"campaign_system_1", "campaign_system_3"}
+        assert len(sample_set_dict["campaign_system_1"]) == 6
+        assert len(sample_set_dict["campaign_system_3"]) == 6
+        assert sorted(
+            sample_set_dict["campaign_system_1"] + sample_set_dict["campaign_system_3"]
+        ) == sorted(sample["SampleName"] for sample in self.sample_list)
+
+    def test_sample_columns(self):
+        column_dict = {
+            key: [sample[key] for sample in self.sample_list]
+            for key in self.sample_list[0]
+        }
+        outcome_list = self.handler.ScheduleExperiment(
+            "campaign", column_dict, plates={"1": "test_plate"}
+        )
+        assert all(outcome.Error is None for outcome in outcome_list)
+        # The same sample sets as for the list of samples
+        expected_list = self.handler.ScheduleExperiment(
+            "campaign", self.sample_list, plates={"1": "test_plate"}
+        )
+        assert [outcome.Job.SampleList for outcome in outcome_list] == [
+            outcome.Job.SampleList for outcome in expected_list
+        ]
+        assert len(outcome_list) == 2
+
+    def test_busy_time(self):
+        outcome_list = self.handler.ScheduleExperiment(
+            "campaign", self.sample_list, plates={}, busy_time=40
+        )
+        job_dict = {outcome.Job.System: outcome.Job for outcome in outcome_list}
+        assert len(job_dict["system_2"].SampleList) < len(
+            job_dict["system_1"].SampleList
+        )
+        assert sum(len(job.SampleList) for job in job_dict.values()) == 12
+
+    def test_eligible_systems(self):
+        outcome_list = self.handler.ScheduleExperiment(
+            "campaign",
+            self.sample_list,
+            plates={},
+            systems=[("node_1", "system_3")],
+        )
+        assert len(outcome_list) == 1
+        assert outcome_list[0].Job.System == "system_3"
+        assert len(outcome_list[0].Job.SampleList) == 12
+
+    def test_no_systems_available(self):
+        with self.assertRaises(ValueError):
+            self.handler.ScheduleExperiment(
+                "campaign",
+                self.sample_list,
+                plates={},
+                systems=[("node_1", "system_2")],
+            )
+
+
+class TestWatchStatus(unittest.TestCase):
+    @patch("OptiHPLCHandler.empower_handler.EmpowerConnection")
+    def setUp(self, _) -> None:
+        self.handler = EmpowerHandler(
+            project="test_project",
+            address="https://test_address/",
+        )
+        self.handler.connection.get.return_value = (
+            [{"name": "SystemState", "value": "Idle"}],
+            None,
+        )
+
+    def test_watch_status(self):
+        with self.handler:
+            subscription = self.handler.WatchStatus("test_node", "test_system")
+            other_subscription = self.handler.WatchStatus("test_node", "test_system")
+            assert subscription.watcher is other_subscription.watcher
+            assert self.handler.status_watcher(
+                "test_node", "other_system"
+            ) is not self.handler.status_watcher("test_node", "test_system")
+            change = subscription.get(timeout=5)
+            assert change.Status == {"SystemState": "Idle"}
+            assert self.handler.connection.get.call_args[1] == {
+                "endpoint": (
+                    "acquisition/chromatographic-system-status"
+                    "?nodeName=test_node&systemName=test_system"
+                ),
+                "retry": False,  # Polled again soon anyway
+            }
+        # Leaving the context manager closes the subscriptions
+        assert subscription.closed and other_subscription.closed
+
+    def test_own_poller(self):
+        # The watchers of a handler are polled by the threads of the handler, so slow
+        # systems of one handler don't hold up the watchers of another.
+        poller = self.handler.status_watcher("test_node", "test_system")._poller
+        assert poller is self.handler._status_poller
+        assert poller.max_workers == 10
+        with patch("OptiHPLCHandler.empower_handler.EmpowerConnection"):
+            other_handler = EmpowerHandler(
+                project="test_project", address="https://test_address/"
+            )
+        assert other_handler._status_poller is not poller
@@ -0,0 +1,88 @@
+import threading
+import time
+import unittest
+
+from OptiHPLCHandler import RateLimiter, configure_rate_limit
+from OptiHPLCHandler.rate_limiter import clear_rate_limits, get_rate_limiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_unlimited(self):
+        rate_limiter = RateLimiter()
+        start_time = time.monotonic()
+        for _ in range(100):
+            with rate_limiter:
+                pass
+        assert time.monotonic() - start_time < 0.5
+
+    def test_rate(self):
+        rate_limiter = RateLimiter(requests_per_second=50, burst=5)
+        start_time = time.monotonic()
+        for _ in range(15):
+            with rate_limiter:
+                pass
+        # The first 5 requests are a burst, the next 10 have to wait 1/50 s each
+        assert time.monotonic() - start_time >= 0.18
+        assert rate_limiter.throttle_time > 0
+
+    def test_default_burst(self):
+        assert RateLimiter(requests_per_second=20).burst == 20
+        assert RateLimiter(requests_per_second=0.5).burst == 1
+
+    def test_max_in_flight(self):
+        rate_limiter = RateLimiter(max_in_flight=2)
+        lock = threading.Lock()
+        in_flight = []
+        max_seen = []
+
+        def request():
+            with rate_limiter:
+                with lock:
+                    in_flight.append(1)
+                    max_seen.append(len(in_flight))
+                time.sleep(0.02)
+                with lock:
+                    in_flight.pop()
+
+        thread_list = [threading.Thread(target=request) for _ in range(8)]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+        assert max(max_seen) == 2
+
+    def test_release_on_error(self):
+        rate_limiter = RateLimiter(max_in_flight=1)
+        with self.assertRaises(KeyError):
+            with rate_limiter:
+                raise KeyError()
+        assert rate_limiter._semaphore.acquire(blocking=False)
+
+    def test_invalid_limits(self):
+        with self.assertRaises(ValueError):
+            RateLimiter(requests_per_second=0)
+        with self.assertRaises(ValueError):
+            RateLimiter(max_in_flight=0)
+        with self.assertRaises(ValueError):
+            RateLimiter(requests_per_second=1, burst=0.5)
+
+
+class TestConfigureRateLimit(unittest.TestCase):
+    def tearDown(self) -> None:
+        clear_rate_limits()
+
+    def test_configure(self):
+        rate_limiter = configure_rate_limit(
+            "https://test_address/", requests_per_second=10, max_in_flight=4
+        )
+        # Shared by everything using the same address
+        assert get_rate_limiter("https://test_address") is rate_limiter
+        assert rate_limiter.max_in_flight == 4
+        unlimited = get_rate_limiter("https://other_address")
+        assert unlimited.requests_per_second is None
+        assert unlimited.max_in_flight is None
+
+    def test_clear(self):
+        configure_rate_limit("https://test_address", requests_per_second=10)
+        clear_rate_limits()
+        assert get_rate_limiter("https://test_address").requests_per_second is None
@@ -0,0 +1,67 @@
+import unittest
+from unittest.mock import patch
+
+from OptiHPLCHandler.retry_policy import RetryPolicy, RetryStatistics
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def test_only_get_by_default(self):
+        policy = RetryPolicy()
+        assert policy.max_attempts_for("get", "test_url") == 3
+        assert policy.max_attempts_for("GET", "test_url") == 3
+        assert policy.max_attempts_for("post", "test_url") == 1
+        policy = RetryPolicy(retry_methods=["get", "POST"])
+        assert policy.max_attempts_for("post", "test_url") == 3
+
+    def test_endpoint_max_attempts(self):
+        policy = RetryPolicy(
+            endpoint_max_attempts={
+                "acquisition/": 2,
+                "/acquisition/chromatographic-system-status": 5,
+            }
+        )
+        assert policy.max_attempts_for("get", "acquisition/nodes") == 2
+        assert (
+            policy.max_attempts_for(
+                "get", "acquisition/chromatographic-system-status?nodeName=node"
+            )
+            == 5
+        )  # The longest matching prefix is used
+        assert policy.max_attempts_for("get", "project/methods") == 3
+
+    def test_retry_status(self):
+        policy = RetryPolicy()
+        assert policy.should_retry_status(503)
+        assert not policy.should_retry_status(400)
+        assert not policy.should_retry_status(500)
+
+    def test_backoff(self):
+        policy = RetryPolicy(backoff_factor=1, max_backoff=5, jitter=False)
+        assert [policy.backoff(num) for num in range(1, 5)] == [1, 2, 4, 5]
+        assert policy.backoff(1, retry_after=3) == 3
+        assert policy.backoff(1, retry_after=60) == 5
+
+    @patch("OptiHPLCHandler.retry_policy.random.uniform")
+    def test_jitter(self, mock_uniform):
+        mock_uniform.return_value = 0.3
+        policy = RetryPolicy(backoff_factor=1)
+        assert policy.backoff(3) == 0.3
+        assert mock_uniform.call_args[0] == (0, 4)
+
+
+class TestRetryStatistics(unittest.TestCase):
+    def test_counters(self):
+        statistics = RetryStatistics()
+        statistics.record_request()
+        statistics.record_retry("/acquisition/nodes", 0.5)
+        statistics.record_retry("acquisition/nodes?filter=test", 1.0)
+        assert statistics.request_count == 1
+        assert statistics.retry_count == 2
+        assert statistics.retry_wait_time == 1.5
+        assert statistics.retries_by_endpoint == {"acquisition/nodes": 2}
+        assert str(statistics) == (
+            "2 retries for 1 requests, waiting 1.5 seconds in total"
+        )
+        statistics.reset()
+        assert statistics.retry_count == 0
+        assert statistics.retries_by_endpoint == {}
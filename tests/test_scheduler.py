@@ -0,0 +1,82 @@
+import unittest
+
+from OptiHPLCHandler.scheduler import (
+    assign_chunks,
+    plan_sample_sets,
+    sample_run_times,
+    split_samples,
+)
+
+
+class TestSampleRunTimes(unittest.TestCase):
+    def test_run_times(self):
+        sample_list = [{"RunTime": 10}, {"RunTime": "20.5"}, {"SampleName": "test"}]
+        assert sample_run_times(sample_list) == [10.0, 20.5, 15.25]
+
+    def test_no_run_times(self):
+        assert sample_run_times([{}, {"RunTime": ""}]) == [1.0, 1.0]
+
+    def test_run_time_field(self):
+        assert sample_run_times([{"Minutes": 3}], run_time_field="Minutes") == [3.0]
+
+
+class TestSplitSamples(unittest.TestCase):
+    def test_even_split(self):
+        assert split_samples([1] * 6, 3) == [[0, 1], [2, 3], [4, 5]]
+
+    def test_split_by_time(self):
+        chunk_list = split_samples([4, 1, 1, 1, 1], 2)
+        assert chunk_list == [[0], [1, 2, 3, 4]]
+
+    def test_consecutive(self):
+        run_times = [3, 1, 4, 1, 5, 9, 2, 6, 5, 3, 5, 8, 9, 7]
+        chunk_list = split_samples(run_times, 4)
+        assert len(chunk_list) == 4
+        assert [position for chunk in chunk_list for position in chunk] == list(
+            range(len(run_times))
+        )
+
+    def test_more_chunks_than_samples(self):
+        assert split_samples([1, 2], 10) == [[0], [1]]
+
+    def test_zero_run_times(self):
+        assert split_samples([0, 0, 0, 0], 2) == [[0, 1], [2, 3]]
+
+    def test_no_samples(self):
+        assert split_samples([], 3) == []
+
+
+class TestAssignChunks(unittest.TestCase):
+    def test_longest_first(self):
+        run_times = [5, 3, 3, 2, 2, 2]
+        chunks = [[0], [1], [2], [3], [4], [5]]
+        assigned_list = assign_chunks(chunks, run_times, [0, 0])
+        finish_times = [
+            sum(run_times[position] for position in assigned)
+            for assigned in assigned_list
+        ]
+        assert sorted(finish_times) == [8, 9]
+        assert all(assigned == sorted(assigned) for assigned in assigned_list)
+
+    def test_busy_system(self):
+        assigned_list = assign_chunks([[0], [1]], [1, 1], [0, 10])
+        assert assigned_list == [[0, 1], []]
+
+
+class TestPlanSampleSets(unittest.TestCase):
+    def test_all_samples_planned(self):
+        run_times = [float(num % 7 + 1) for num in range(100)]
+        assigned_list = plan_sample_sets(run_times, [0, 0, 0])
+        assert sorted(
+            position for assigned in assigned_list for position in assigned
+        ) == list(range(100))
+        finish_times = [
+            sum(run_times[position] for position in assigned)
+            for assigned in assigned_list
+        ]
+        # Close to a third of the total time on each system
+        assert max(finish_times) - min(finish_times) <= max(run_times) * 4
+
+    def test_no_systems(self):
+        with self.assertRaises(ValueError):
+            plan_sample_sets([1, 2], [])
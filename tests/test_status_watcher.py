@@ -0,0 +1,200 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from OptiHPLCHandler import StatusPoller, StatusWatcher
+from OptiHPLCHandler.status_watcher import diff_status
+
+
+class FakeSystem:
+    """Returns the statuses in turn, repeating the last one."""
+
+    def __init__(self, status_list):
+        self.status_list = list(status_list)
+        self.poll_count = 0
+        self.lock = threading.Lock()
+
+    def get_status(self, node, system):
+        with self.lock:
+            self.poll_count += 1
+            if len(self.status_list) > 1:
+                status = self.status_list.pop(0)
+            else:
+                status = self.status_list[0]
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+
+class TestDiffStatus(unittest.TestCase):
+    def test_diff(self):
+        assert diff_status(
+            {"SystemState": "Running", "RunTime": "1", "Removed": "x"},
+            {"SystemState": "Idle", "RunTime": "1", "Added": "y"},
+        ) == {
+            "SystemState": ("Running", "Idle"),
+            "Removed": ("x", None),
+            "Added": (None, "y"),
+        }
+        assert diff_status({"SystemState": "Idle"}, {"SystemState": "Idle"}) == {}
+
+
+class TestStatusWatcher(unittest.TestCase):
+    def make_watcher(self, status_list, **kwargs):
+        self.system = FakeSystem(status_list)
+        watcher = StatusWatcher(
+            self.system.get_status,
+            "test_node",
+            "test_system",
+            busy_interval=0.01,
+            **kwargs,
+        )
+        self.addCleanup(watcher.stop)
+        return watcher
+
+    def test_changes(self):
+        watcher = self.make_watcher(
+            [
+                {"SystemState": "Running", "RunTime": "1"},
+                {"SystemState": "Running", "RunTime": "1"},
+                {"SystemState": "Running", "RunTime": "2"},
+                {"SystemState": "Idle", "RunTime": "2"},
+            ]
+        )
+        with watcher.subscribe() as subscription:
+            first = subscription.get(timeout=5)
+            assert first.Status == {"SystemState": "Running", "RunTime": "1"}
+            assert first.Changes == {
+                "SystemState": (None, "Running"),
+                "RunTime": (None, "1"),
+            }
+            assert subscription.get(timeout=5).Changes == {"RunTime": ("1", "2")}
+            last = subscription.get(timeout=5)
+            assert last.Changes == {"SystemState": ("Running", "Idle")}
+            assert (last.Node, last.System) == ("test_node", "test_system")
+            with self.assertRaises(TimeoutError):
+                subscription.get(timeout=0.1)  # No more changes
+        assert watcher.status == {"SystemState": "Idle", "RunTime": "2"}
+
+    def test_shared_polling(self):
+        watcher = self.make_watcher([{"SystemState": "Running"}])
+        watcher.busy_interval = 60
+        subscription_list = [watcher.subscribe() for _ in range(5)]
+        for subscription in subscription_list:
+            assert subscription.get(timeout=5).Status == {"SystemState": "Running"}
+        late_subscription = watcher.subscribe()
+        # A late subscription starts from the current status
+        assert late_subscription.get(timeout=5).Changes == {
+            "SystemState": (None, "Running")
+        }
+        assert self.system.poll_count == 1  # One poll for all subscriptions
+        for subscription in subscription_list + [late_subscription]:
+            subscription.close()
+
+    def test_idle_backoff(self):
+        watcher = self.make_watcher(
+            [{"SystemState": "Idle"}], idle_interval=0.08, backoff_factor=2
+        )
+        with watcher.subscribe() as subscription:
+            subscription.get(timeout=5)
+            threading.Event().wait(0.3)
+        # Polled at 0, 0.02, 0.06, 0.14, 0.22 instead of every 0.01 seconds
+        assert self.system.poll_count <= 8
+
+    def test_wake(self):
+        watcher = self.make_watcher(
+            [
+                {"SystemState": "Idle"},
+                {"SystemState": "Idle"},
+                {"SystemState": "Running"},
+            ],
+            idle_interval=60,
+            backoff_factor=6000,
+        )
+        with watcher.subscribe() as subscription:
+            subscription.get(timeout=5)
+            with self.assertRaises(TimeoutError):
+                subscription.get(timeout=0.1)
+            watcher.wake()
+            assert subscription.get(timeout=5).Status == {"SystemState": "Running"}
+
+    def test_error(self):
+        error = ValueError("Empower is down")
+        watcher = self.make_watcher([{"SystemState": "Running"}, error])
+        with watcher.subscribe() as subscription:
+            subscription.get(timeout=5)
+            change = subscription.get(timeout=5)
+            assert change.Error is error
+            assert change.Status == {"SystemState": "Running"}
+
+    def test_poll_callback(self):
+        watcher = self.make_watcher([{"SystemState": "Running"}])
+        poll_event = threading.Event()
+        change_list = []
+        subscription = watcher.subscribe(
+            callback=change_list.append, poll_callback=poll_event.set
+        )
+        for _ in range(3):
+            # Called after each poll, though the status doesn't change
+            assert poll_event.wait(5)
+            poll_event.clear()
+        subscription.close()
+        assert [change.Status for change in change_list[:1]] == [
+            {"SystemState": "Running"}
+        ]
+        assert change_list[1:] == [None]
+
+    def test_poller_close(self):
+        poller = StatusPoller(max_workers=2)
+        watcher = self.make_watcher([{"SystemState": "Running"}], poller=poller)
+        with watcher.subscribe() as subscription:
+            subscription.get(timeout=5)
+        poller.close()
+        assert poller._executor is None
+        # The threads are started again when needed
+        with watcher.subscribe() as subscription:
+            assert poller._executor is not None
+            subscription.get(timeout=5)
+        poller.close()
+
+    def test_stop(self):
+        watcher = self.make_watcher([{"SystemState": "Running"}])
+        subscription = watcher.subscribe()
+        assert watcher.running
+        subscription.get(timeout=5)
+        watcher.stop()
+        assert list(subscription) == []  # The iteration ends
+        for _ in range(100):
+            if not watcher.running:
+                break
+            threading.Event().wait(0.01)
+        assert not watcher.running
+        # Subscribing again restarts the polling
+        with watcher.subscribe() as subscription:
+            assert watcher.running
+            subscription.get(timeout=5)
+
+
+class TestAsyncStatusWatcher(unittest.IsolatedAsyncioTestCase):
+    async def test_async_iteration(self):
+        system = FakeSystem([{"SystemState": "Running"}, {"SystemState": "Idle"}])
+        watcher = StatusWatcher(
+            system.get_status, "test_node", "test_system", busy_interval=0.01
+        )
+        state_list = []
+        async with watcher.subscribe_async() as subscription:
+            async for change in subscription:
+                state_list.append(change.Status["SystemState"])
+                if change.Status["SystemState"] == "Idle":
+                    break
+        assert state_list == ["Running", "Idle"]
+
+    async def test_timeout(self):
+        watcher = StatusWatcher(
+            MagicMock(side_effect=lambda node, system: threading.Event().wait(1)),
+            "test_node",
+            "test_system",
+        )
+        async with watcher.subscribe_async() as subscription:
+            with self.assertRaises(TimeoutError):
+                await subscription.get_async(timeout=0.01)
@@ -0,0 +1,104 @@
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+
+from OptiHPLCHandler import TokenCache
+
+
+class TestTokenCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, "cache", "token_cache.json")
+        self.cache = TokenCache(path=self.path)
+        self.key = TokenCache.make_key(
+            "https://test_address", "test_service", "test_project", "test_username"
+        )
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_key(self):
+        assert (
+            self.key == "https://test_address|test_service|test_project|test_username"
+        )
+        assert TokenCache.make_key("address", "service", None, "username") == (
+            "address|service||username"
+        )
+
+    def test_set_get(self):
+        assert self.cache.get(self.key) is None
+        expiry = time.time() + 100
+        self.cache.set(self.key, "test_token", "test_id", expiry)
+        entry = self.cache.get(self.key)
+        assert entry == {
+            "token": "test_token",
+            "session_id": "test_id",
+            "expiry": expiry,
+        }
+        # Another cache object using the same file, e.g. in another process
+        assert TokenCache(path=self.path).get(self.key) == entry
+
+    def test_expiry(self):
+        self.cache.set(self.key, "test_token", "test_id", time.time() + 100)
+        assert self.cache.get(self.key, margin=200) is None
+        # The token is not valid for long enough
+        self.cache.set(self.key, "test_token", "test_id", time.time() - 1)
+        assert self.cache.get(self.key) is None
+
+    def test_default_lifetime(self):
+        cache = TokenCache(path=self.path, default_lifetime=50)
+        cache.set(self.key, "test_token", "test_id")
+        assert 0 < cache.get(self.key)["expiry"] - time.time() <= 50
+
+    def test_invalidate(self):
+        self.cache.set(self.key, "test_token", "test_id")
+        self.cache.invalidate(self.key, token="other_token")
+        assert self.cache.get(self.key) is not None
+        # A token stored by another process is not removed
+        self.cache.invalidate(self.key, token="test_token")
+        assert self.cache.get(self.key) is None
+        self.cache.invalidate(self.key)  # Invalidating a missing key does nothing
+
+    def test_expired_tokens_removed(self):
+        self.cache.set("old_key", "old_token", "old_id", time.time() - 1)
+        self.cache.set(self.key, "test_token", "test_id")
+        with open(self.path) as cache_file:
+            assert "old_key" not in cache_file.read()
+
+    @unittest.skipIf(os.name == "nt", "File permissions are handled by Windows ACLs")
+    def test_permissions(self):
+        self.cache.set(self.key, "test_token", "test_id")
+        assert stat.S_IMODE(os.stat(self.path).st_mode) == 0o600
+
+    def test_corrupt_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "w") as cache_file:
+            cache_file.write("not json")
+        with self.assertLogs("OptiHPLCHandler.token_cache", level="WARNING"):
+            assert self.cache.get(self.key) is None
+
+    def test_concurrent_writes(self):
+        def store(num):
+            TokenCache(path=self.path).set(f"key_{num}", f"token_{num}", "id")
+
+        thread_list = [threading.Thread(target=store, args=(num,)) for num in range(10)]
+        for thread in thread_list:
+            thread.start()
+        for thread in thread_list:
+            thread.join()
+        for num in range(10):
+            assert self.cache.get(f"key_{num}")["token"] == f"token_{num}"
+        assert not os.path.exists(self.path + ".lock")
+
+    def test_stale_lock(self):
+        cache = TokenCache(path=self.path, lock_timeout=0.1)
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path + ".lock", "w"):
+            pass
+        old_time = time.time() - 10
+        os.utime(self.path + ".lock", (old_time, old_time))
+        cache.set(self.key, "test_token", "test_id")
+        assert cache.get(self.key)["token"] == "test_token"